@@ -3,11 +3,16 @@ from aiohttp import web
 import os
 import folder_paths
 from .nodes import *
-from .constants import FORCE_HTTPS, SEPERATE_USERS, MATCH_HEADERS
+from time import perf_counter
+from .constants import (
+    FORCE_HTTPS, SEPERATE_USERS, MATCH_HEADERS, FUSED_MIDDLEWARE, METRICS_ENABLED,
+    NSFW_WARMUP, NSFW_LOADING_POLICY, NSFW_LOADING_WAIT_SECONDS,
+)
 from .globals import (
-    app, ip_filter, sanitizer, timeout, jwt_auth, access_control,
-    instance, current_username_var
+    app, ip_filter, sanitizer, timeout, jwt_auth, access_control, rate_limiter,
+    metrics, instance, current_username_var
 )
+from .utils.metrics import NSFW_CHECK_SECONDS, BLOCKED_TOTAL
 from .utils import watcher
 from .utils.bootstrap import ensure_groups_config
 from .routes import static, auth, admin, user, workflow_routes
@@ -15,6 +20,10 @@ from .utils.sfw_intercept.reactor_sfw_intercept import _load_reactor_module
 from .utils.sfw_intercept.nsfw_guard import (
     should_block_image_for_current_user,
     set_latest_prompt_user,
+    start_model_warmup,
+    wait_for_nsfw_model_async,
+    NSFWModelLoading,
+    LOADING_WAIT,
 )
 from .utils.sfw_intercept.node_interceptor import install_node_interceptor
 
@@ -31,10 +40,38 @@ except ImportError:
 
 ensure_groups_config()
 
+_view_nsfw_seconds = metrics.histogram(NSFW_CHECK_SECONDS, route="view")
+_gallery_nsfw_seconds = metrics.histogram(NSFW_CHECK_SECONDS, route="static_gallery")
+_nsfw_blocked = metrics.counter(BLOCKED_TOTAL, stage="nsfw")
+
+
+async def _check_nsfw(img_path, hist):
+    """403 if the image must be hidden from the current user, 503 while the model loads, else None."""
+    start = perf_counter()
+    try:
+        try:
+            blocked = should_block_image_for_current_user(img_path, loading_policy=NSFW_LOADING_POLICY)
+        except NSFWModelLoading:
+            ready = NSFW_LOADING_POLICY == LOADING_WAIT and await wait_for_nsfw_model_async(NSFW_LOADING_WAIT_SECONDS)
+            if not ready:
+                return web.Response(
+                    status=503,
+                    text="NSFW classifier is loading, try again shortly",
+                    headers={"Retry-After": "5"},
+                )
+            blocked = should_block_image_for_current_user(img_path)
+    finally:
+        hist.observe(perf_counter() - start)
+
+    if blocked:
+        _nsfw_blocked.inc()
+        return web.Response(status=403, text="NSFW Blocked")
+    return None
+
 
 # --- WORKFLOW + GLOBAL SFW INTERCEPTION MIDDLEWARE ---
-@web.middleware
-async def workflow_interceptor_middleware(request, handler):
+async def intercept_workflow_request(request):
+    """Returns the response for intercepted/blocked requests, None to continue."""
     path = request.path
     method = request.method
     
@@ -44,15 +81,10 @@ async def workflow_interceptor_middleware(request, handler):
     if isinstance(response, web.StreamResponse):
         return response
 
-    # 2. User Resolution
+    # 2. User Resolution (shared request identity, resolved at most once)
     username = None
     try:
-        # If jwt_auth middleware already attached a user dict
-        if hasattr(request, "user") and request.user:
-            username = request.user.get("username")
-        else:
-            # Fallback to whatever your workflow_routes helper does
-            username = workflow_routes.get_current_user(request)
+        username = jwt_auth.get_request_identity(request).username or "guest"
     except Exception:
         username = None
 
@@ -80,50 +112,102 @@ async def workflow_interceptor_middleware(request, handler):
             img_path = os.path.join(target_dir, filename)
 
             if os.path.isfile(img_path):
-                if should_block_image_for_current_user(img_path):
-                    return web.Response(status=403, text="NSFW Blocked")
+                response = await _check_nsfw(img_path, _view_nsfw_seconds)
+                if response is not None:
+                    return response
 
     # --- Case B: /static_gallery ---
     if path.startswith("/static_gallery/") and method == "GET":
         rel = path[len("/static_gallery/") :].lstrip("/\\")
         out_dir = folder_paths.get_output_directory()
         img_path = os.path.join(out_dir, rel)
-        if os.path.isfile(img_path) and should_block_image_for_current_user(img_path):
-            return web.Response(status=403, text="NSFW Blocked")
+        if os.path.isfile(img_path):
+            response = await _check_nsfw(img_path, _gallery_nsfw_seconds)
+            if response is not None:
+                return response
 
+    return None
+
+@web.middleware
+async def workflow_interceptor_middleware(request, handler):
+    response = await intercept_workflow_request(request)
+    if response is not None:
+        return response
     return await handler(request)
 
 # ---------------- Core middlewares ----------------
-if FORCE_HTTPS:
-    from .utils.force_https import create_https_middleware
-    app.middlewares.append(create_https_middleware(MATCH_HEADERS))
-
-app.middlewares.append(ip_filter.create_ip_filter_middleware())
-app.middlewares.append(sanitizer.create_sanitizer_middleware())
-app.middlewares.append(
-    timeout.create_time_out_middleware(limited=("/login", "/register"))
-)
-
-# IMPORTANT: run JWT auth BEFORE we try to read request.user in workflow_interceptor
-app.middlewares.append(jwt_auth.create_jwt_middleware(
-    public=("/login", "/logout", "/register"),
-    public_prefixes=("/usgromana", "/usgromana-gallery", "/assets", "/static"),
-))
-
-# Now that jwt_auth can populate request.user, we can safely
-# resolve usernames inside workflow_interceptor_middleware.
-app.middlewares.append(workflow_interceptor_middleware)
-
-if SEPERATE_USERS:
-    app.middlewares.append(access_control.create_folder_access_control_middleware())
-    access_control.patch_folder_paths()
-    access_control.patch_prompt_queue()
-
-app.middlewares.append(access_control.create_usgromana_middleware())
-watcher.register(app)
+TIMEOUT_LIMITED = ("/login", "/register")
+JWT_PUBLIC = ("/login", "/logout", "/register")
+JWT_PUBLIC_PREFIXES = ("/usgromana", "/usgromana-gallery", "/assets", "/static")
+
+
+def add_middleware(stage, middleware):
+    """Append a middleware, timed under `stage` when metrics are enabled."""
+    if METRICS_ENABLED:
+        middleware = metrics.timed_middleware(stage, middleware)
+    app.middlewares.append(middleware)
+
+
+if FUSED_MIDDLEWARE:
+    # Same stages and order as below, in a single middleware
+    from .utils.pipeline import create_fused_middleware
+    app.middlewares.append(create_fused_middleware(
+        ip_filter=ip_filter,
+        sanitizer=sanitizer,
+        timeout=timeout,
+        jwt_auth=jwt_auth,
+        rate_limiter=rate_limiter,
+        access_control=access_control,
+        intercept=intercept_workflow_request,
+        limited=TIMEOUT_LIMITED,
+        public=JWT_PUBLIC,
+        public_prefixes=JWT_PUBLIC_PREFIXES,
+        https_headers=MATCH_HEADERS if FORCE_HTTPS else None,
+        metrics=metrics if METRICS_ENABLED else None,
+    ))
+
+    if SEPERATE_USERS:
+        access_control.patch_folder_paths()
+        access_control.patch_prompt_queue()
+else:
+    if FORCE_HTTPS:
+        from .utils.force_https import create_https_middleware
+        add_middleware("https", create_https_middleware(MATCH_HEADERS))
+
+    add_middleware("ip_filter", ip_filter.create_ip_filter_middleware())
+    add_middleware("sanitizer", sanitizer.create_sanitizer_middleware())
+    add_middleware(
+        "timeout", timeout.create_time_out_middleware(limited=TIMEOUT_LIMITED)
+    )
+
+    # IMPORTANT: run JWT auth BEFORE we try to read request.user in workflow_interceptor
+    add_middleware("jwt", jwt_auth.create_jwt_middleware(
+        public=JWT_PUBLIC,
+        public_prefixes=JWT_PUBLIC_PREFIXES,
+    ))
+
+    # Per-user / per-group rate limits. Runs before the workflow interceptor,
+    # which answers /api/userdata/workflows requests itself.
+    add_middleware("rate_limit", rate_limiter.create_rate_limit_middleware(jwt_auth.get_request_identity))
+
+    # Now that jwt_auth can populate request.user, we can safely
+    # resolve usernames inside workflow_interceptor_middleware.
+    add_middleware("workflow_interceptor", workflow_interceptor_middleware)
+
+    if SEPERATE_USERS:
+        add_middleware("folder_access", access_control.create_folder_access_control_middleware())
+        access_control.patch_folder_paths()
+        access_control.patch_prompt_queue()
+
+    add_middleware("access_control", access_control.create_usgromana_middleware())
+    # Same as watcher.register(app), timed
+    add_middleware("watcher", watcher.create_error_watcher_middleware())
 
 install_node_interceptor()
 
+if NSFW_WARMUP:
+    start_model_warmup()
+
 # Ensure routes are added to the app
 # In ComfyUI, instance.routes should be automatically added by PromptServer,
 # but we'll explicitly add them to ensure they're registered
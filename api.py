@@ -68,6 +68,8 @@ _get_nsfw_tag = None
 _clear_nsfw_tag = None
 _clear_all_nsfw_tags = None
 _set_nsfw_tag_manual = None
+_get_nsfw_model_status = None
+_classify_tensor_results = None
 
 def _try_imports():
     """Try multiple import strategies to load internal functions."""
@@ -82,6 +84,8 @@ def _try_imports():
     global _clear_nsfw_tag
     global _clear_all_nsfw_tags
     global _set_nsfw_tag_manual
+    global _get_nsfw_model_status
+    global _classify_tensor_results
     
     import sys
     import os
@@ -97,6 +101,8 @@ def _try_imports():
             clear_nsfw_tag,
             clear_all_nsfw_tags,
             set_nsfw_tag_manual,
+            get_nsfw_model_status,
+            classify_tensor_results,
         )
         from .globals import users_db, current_username_var
         _is_sfw_enforced_for_current_session = is_sfw_enforced_for_current_session
@@ -109,6 +115,8 @@ def _try_imports():
         _clear_nsfw_tag = clear_nsfw_tag
         _clear_all_nsfw_tags = clear_all_nsfw_tags
         _set_nsfw_tag_manual = set_nsfw_tag_manual
+        _get_nsfw_model_status = get_nsfw_model_status
+        _classify_tensor_results = classify_tensor_results
         _NSFW_GUARD_AVAILABLE = True
         return True
     except (ImportError, ValueError, SystemError, AttributeError) as e:
@@ -129,6 +137,8 @@ def _try_imports():
             clear_nsfw_tag,
             clear_all_nsfw_tags,
             set_nsfw_tag_manual,
+            get_nsfw_model_status,
+            classify_tensor_results,
         )
         from globals import users_db, current_username_var
         _is_sfw_enforced_for_current_session = is_sfw_enforced_for_current_session
@@ -141,6 +151,8 @@ def _try_imports():
         _clear_nsfw_tag = clear_nsfw_tag
         _clear_all_nsfw_tags = clear_all_nsfw_tags
         _set_nsfw_tag_manual = set_nsfw_tag_manual
+        _get_nsfw_model_status = get_nsfw_model_status
+        _classify_tensor_results = classify_tensor_results
         _NSFW_GUARD_AVAILABLE = True
         return True
     except (ImportError, AttributeError) as e:
@@ -167,6 +179,8 @@ def _try_imports():
                         _clear_nsfw_tag = getattr(nsfw_mod, 'clear_nsfw_tag', None)
                         _clear_all_nsfw_tags = getattr(nsfw_mod, 'clear_all_nsfw_tags', None)
                         _set_nsfw_tag_manual = getattr(nsfw_mod, 'set_nsfw_tag_manual', None)
+                        _get_nsfw_model_status = getattr(nsfw_mod, 'get_nsfw_model_status', None)
+                        _classify_tensor_results = getattr(nsfw_mod, 'classify_tensor_results', None)
                         _NSFW_GUARD_AVAILABLE = True
                         return True
                 except (AttributeError, ImportError):
@@ -200,6 +214,8 @@ def _try_imports():
                     _get_nsfw_pipeline = nsfw_mod._get_nsfw_pipeline
                     _users_db = globals_mod.users_db
                     _current_username_var = globals_mod.current_username_var
+                    _get_nsfw_model_status = getattr(nsfw_mod, 'get_nsfw_model_status', None)
+                    _classify_tensor_results = getattr(nsfw_mod, 'classify_tensor_results', None)
                     _NSFW_GUARD_AVAILABLE = True
                     return True
     except Exception as e:
@@ -221,6 +237,21 @@ def is_available() -> bool:
     return _NSFW_GUARD_AVAILABLE
 
 
+def get_nsfw_model_status() -> dict:
+    """
+    Get the readiness of the NSFW classifier.
+    
+    Returns:
+        dict: "state" is one of "idle" (not loaded yet), "loading", "ready"
+              or "failed", plus timing details and the configured
+              loading policy. {"state": "unavailable"} if the guard isn't loaded.
+    """
+    if not _NSFW_GUARD_AVAILABLE or not _get_nsfw_model_status:
+        return {"state": "unavailable"}
+    
+    return _get_nsfw_model_status()
+
+
 def is_sfw_enforced_for_user(username: Optional[str] = None) -> bool:
     """
     Check if SFW (Safe For Work) restrictions are enforced for a user.
@@ -322,12 +353,17 @@ def check_tensor_nsfw(images_tensor, threshold: float = 0.5) -> bool:
         if images_tensor is None or len(images_tensor) == 0:
             return False
         
-        # Convert tensor to PIL Image
-        i = 255. * images_tensor[0].cpu().numpy()
-        img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-        
-        # Run classification
-        results = pipeline(img)
+        if _classify_tensor_results:
+            # Resized/normalized on the tensor's device; only the
+            # model-sized input is transferred
+            results = _classify_tensor_results(pipeline, images_tensor[:1])[0]
+        else:
+            # Convert tensor to PIL Image
+            i = 255. * images_tensor[0].cpu().numpy()
+            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+            
+            # Run classification
+            results = pipeline(img)
         if not results:
             return False
         
@@ -667,6 +703,7 @@ def set_image_nsfw_tag(image_path: str, is_nsfw: bool, score: float = 1.0, label
 # Export the public API
 __all__ = [
     "is_available",
+    "get_nsfw_model_status",
     "is_sfw_enforced_for_user",
     "check_tensor_nsfw",
     "check_image_path_nsfw",
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark: NSFW classifier input from a ComfyUI image tensor, via
+the PIL round trip vs. tensor_preprocess.tensor_pixel_values.
+
+Run from the repository root in an environment with torch and
+transformers (CPU is enough):
+
+    python benchmarks/bench_nsfw_preprocess.py [--sizes 512 1024 2048] [--batch B] [--number N]
+
+"PIL" is what check_tensor_nsfw did before: 255 * tensor.cpu().numpy(),
+clip, uint8, Image.fromarray, then the image processor. The processor is
+configured like the Falconsai/nsfw_image_detection one (224x224 bilinear,
+mean/std 0.5), so no model download is needed. Both paths are checked to
+produce (nearly) the same pixel values; the forward pass is not timed.
+"""
+
+import argparse
+import importlib.util
+import os
+import timeit
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import ViTImageProcessor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_tensor_preprocess():
+    spec = importlib.util.spec_from_file_location(
+        "usgromana_tensor_preprocess", os.path.join(ROOT, "utils", "sfw_intercept", "tensor_preprocess.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def pil_pixel_values(processor, images):
+    """The previous path, once per frame."""
+    frames = []
+    for image in images:
+        i = 255. * image.cpu().numpy()
+        frames.append(Image.fromarray(np.clip(i, 0, 255).astype(np.uint8)))
+    return processor(images=frames, return_tensors="pt")["pixel_values"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048], help="square image sizes")
+    parser.add_argument("--batch", type=int, default=1, help="frames per tensor")
+    parser.add_argument("--number", type=int, default=20, help="iterations per size")
+    args = parser.parse_args()
+
+    preprocess = load_tensor_preprocess()
+    processor = ViTImageProcessor(
+        do_resize=True, size={"height": 224, "width": 224}, resample=2,
+        do_rescale=True, rescale_factor=1 / 255,
+        do_normalize=True, image_mean=[0.5, 0.5, 0.5], image_std=[0.5, 0.5, 0.5],
+    )
+    torch.manual_seed(0)
+
+    print(f"{'size':>6} {'batch':>5} {'PIL ms':>9} {'tensor ms':>10} {'speedup':>8} {'max diff':>9}")
+    for size in args.sizes:
+        # Smooth content (like real outputs) so resampling differences stay small
+        low = torch.rand(args.batch, 3, 16, 16)
+        images = torch.nn.functional.interpolate(low, size=(size, size), mode="bicubic").clamp(0, 1).movedim(1, -1)
+
+        expected = pil_pixel_values(processor, images)
+        actual = preprocess.tensor_pixel_values(images, processor, torch.device("cpu"), torch.float32)
+        if actual is None or actual.shape != expected.shape:
+            raise SystemExit(f"Shape mismatch at {size}: {tuple(expected.shape)} vs {None if actual is None else tuple(actual.shape)}")
+        diff = (actual - expected).abs().max().item()
+
+        pil_ms = min(timeit.repeat(lambda: pil_pixel_values(processor, images), number=args.number, repeat=3))
+        tensor_ms = min(timeit.repeat(
+            lambda: preprocess.tensor_pixel_values(images, processor, torch.device("cpu"), torch.float32),
+            number=args.number, repeat=3,
+        ))
+        pil_ms, tensor_ms = pil_ms / args.number * 1e3, tensor_ms / args.number * 1e3
+        print(f"{size:>6} {args.batch:>5} {pil_ms:>9.2f} {tensor_ms:>10.2f} {pil_ms / tensor_ms:>7.1f}x {diff:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Micro-benchmark: separate Usgromana middlewares vs. the fused pipeline.
+
+Run from the repository root in an environment with aiohttp and bleach:
+
+    python benchmarks/bench_pipeline.py [--number N] [--repeat R] [--metrics]
+
+The IP filter, sanitizer, timeout, rate limiter and watcher are the real
+implementations. JWT auth, the workflow interceptor and the permission
+middleware need a running ComfyUI server, so light stand-ins with the same
+interface (and similar per-request work) are used for them. The numbers
+therefore isolate dispatch and path-classification overhead. With
+--metrics both variants record per-stage latency histograms, as they do
+with "enable_metrics" in config.json.
+"""
+
+import argparse
+import asyncio
+import functools
+import importlib
+import os
+import sys
+import tempfile
+import time
+import types
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Load utils/* as a package without running utils/__init__.py (which pulls
+# in the ComfyUI-only modules)
+_pkg = types.ModuleType("usgromana_bench_utils")
+_pkg.__path__ = [os.path.join(ROOT, "utils")]
+sys.modules["usgromana_bench_utils"] = _pkg
+
+
+def _load(name):
+    return importlib.import_module(f"usgromana_bench_utils.{name}")
+
+
+ip_filter_mod = _load("ip_filter")
+sanitizer_mod = _load("sanitizer")
+timeout_mod = _load("timeout")
+rate_limit_mod = _load("rate_limit")
+watcher_mod = _load("watcher")
+identity_mod = _load("identity")
+prefix_router_mod = _load("prefix_router")
+permissions_mod = _load("permissions")
+metrics_mod = _load("metrics")
+pipeline_mod = _load("pipeline")
+
+JWT_PUBLIC = ("/login", "/logout", "/register")
+JWT_PUBLIC_PREFIXES = ("/usgromana", "/usgromana-gallery", "/assets", "/static")
+LIMITED = ("/login", "/register")
+
+
+class StandInAuth:
+    """Mimics JWTAuth: one token check, identity stored on the request."""
+
+    def __init__(self):
+        perms = permissions_mod.RolePermissions("user", {"can_run": True})
+        self.identity = identity_mod.Identity("1", "alice", ["user"], "user", perms)
+
+    def get_request_identity(self, request):
+        identity = request.get(identity_mod.IDENTITY_KEY)
+        if identity is None:
+            identity = identity_mod.Identity.anonymous()
+            request[identity_mod.IDENTITY_KEY] = identity
+        return identity
+
+    def authenticate_request(self, request):
+        if not request.headers.get("Authorization"):
+            return web.json_response({"error": "Authentication required"}, status=401)
+        request["user_id"] = self.identity.user_id
+        request["user"] = self.identity.username
+        request[identity_mod.IDENTITY_KEY] = self.identity
+        return None
+
+    def create_jwt_middleware(self, public=(), public_prefixes=()):
+        @web.middleware
+        async def jwt_middleware(request, handler):
+            if request.path in public or request.path.startswith(public_prefixes):
+                return await handler(request)
+            unauthorized = self.authenticate_request(request)
+            if unauthorized is not None:
+                return unauthorized
+            return await handler(request)
+
+        return jwt_middleware
+
+
+class StandInAccessControl:
+    """Mimics AccessControl.check_request: whitelist, prefix trie, role checks."""
+
+    def __init__(self, auth):
+        self.auth = auth
+        self.router = prefix_router_mod.PrefixRouter({"can_access_manager": ["/api/manager"]})
+
+    def check_request(self, request):
+        path = request.path
+        if path.startswith(("/login", "/register", "/logout", "/usgromana", "/static", "/assets")) or path == "/":
+            return None
+        perms = self.auth.get_request_identity(request).permissions
+        for key in self.router.match(path):
+            if not perms.allows(key):
+                return web.Response(status=403)
+        return None
+
+    def create_usgromana_middleware(self):
+        @web.middleware
+        async def middleware(request, handler):
+            denied = self.check_request(request)
+            if denied is not None:
+                return denied
+            return await handler(request)
+
+        return middleware
+
+
+async def intercept(request):
+    identity = request.get(identity_mod.IDENTITY_KEY)
+    _ = identity.username if identity is not None else "guest"
+    return None
+
+
+@web.middleware
+async def interceptor_middleware(request, handler):
+    response = await intercept(request)
+    if response is not None:
+        return response
+    return await handler(request)
+
+
+@web.middleware
+async def folder_middleware(request, handler):
+    return await handler(request)
+
+
+async def final_handler(request):
+    return web.Response(text="ok")
+
+
+def build_chain(middlewares, handler):
+    """Compose middlewares the way aiohttp does (outermost first)."""
+    for middleware in reversed(middlewares):
+        handler = functools.partial(middleware, handler=handler)
+    return handler
+
+
+REQUESTS = [
+    ("GET", "/extensions/some-node/widget.js"),
+    ("GET", "/assets/index.css"),
+    ("GET", "/usgromana/api/me"),
+    ("GET", "/view?filename=ComfyUI_00001_.png&type=output"),
+    ("GET", "/api/queue"),
+    ("GET", "/api/userdata/workflows/portrait.json"),
+    ("POST", "/api/prompt"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=500, help="requests per timing run")
+    parser.add_argument("--repeat", type=int, default=20, help="timing runs (best one is reported)")
+    parser.add_argument("--metrics", action="store_true", help="time every stage into a MetricsRegistry")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    whitelist = os.path.join(tmp, "whitelist.txt")
+    blacklist = os.path.join(tmp, "blacklist.txt")
+    for path in (whitelist, blacklist):
+        open(path, "w").close()
+
+    ip_filter = ip_filter_mod.IPFilter(whitelist, blacklist)
+    sanitizer = sanitizer_mod.Sanitizer()
+    timeout = timeout_mod.Timeout(ip_filter)
+    rate_limiter = rate_limit_mod.RateLimiter()
+    auth = StandInAuth()
+    access_control = StandInAccessControl(auth)
+
+    metrics = metrics_mod.MetricsRegistry() if args.metrics else None
+    stages = [
+        ("ip_filter", ip_filter.create_ip_filter_middleware()),
+        ("sanitizer", sanitizer.create_sanitizer_middleware()),
+        ("timeout", timeout.create_time_out_middleware(limited=LIMITED)),
+        ("jwt", auth.create_jwt_middleware(public=JWT_PUBLIC, public_prefixes=JWT_PUBLIC_PREFIXES)),
+        ("rate_limit", rate_limiter.create_rate_limit_middleware(auth.get_request_identity)),
+        ("workflow_interceptor", interceptor_middleware),
+        ("folder_access", folder_middleware),
+        ("access_control", access_control.create_usgromana_middleware()),
+        ("watcher", watcher_mod.create_error_watcher_middleware()),
+    ]
+    chained = build_chain(
+        [metrics.timed_middleware(stage, mw) if metrics else mw for stage, mw in stages],
+        final_handler,
+    )
+    fused = build_chain(
+        [
+            pipeline_mod.create_fused_middleware(
+                ip_filter=ip_filter,
+                sanitizer=sanitizer,
+                timeout=timeout,
+                jwt_auth=auth,
+                rate_limiter=rate_limiter,
+                access_control=access_control,
+                intercept=intercept,
+                limited=LIMITED,
+                public=JWT_PUBLIC,
+                public_prefixes=JWT_PUBLIC_PREFIXES,
+                metrics=metrics,
+            )
+        ],
+        final_handler,
+    )
+
+    headers = {"X-Real-IP": "127.0.0.1", "Authorization": "Bearer x"}
+
+    async def run(chain, requests):
+        start = time.perf_counter()
+        for request in requests:
+            await chain(request)
+        return (time.perf_counter() - start) / len(requests) * 1e6
+
+    async def bench():
+        print(f"{'request':<52} {'chained us':>10} {'fused us':>9} {'speedup':>8}")
+        for method, path in REQUESTS:
+            # Mocked requests are expensive to build: create them once and
+            # alternate both variants over the same objects, keeping the best run
+            requests = [make_mocked_request(method, path, headers=headers) for _ in range(args.number)]
+            chained_us = fused_us = float("inf")
+            for _ in range(args.repeat):
+                chained_us = min(chained_us, await run(chained, requests))
+                fused_us = min(fused_us, await run(fused, requests))
+            label = f"{method} {path}"[:52]
+            print(f"{label:<52} {chained_us:>10.2f} {fused_us:>9.2f} {chained_us / fused_us:>7.2f}x")
+
+    asyncio.run(bench())
+
+
+if __name__ == "__main__":
+    main()
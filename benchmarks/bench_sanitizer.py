@@ -0,0 +1,115 @@
+"""
+Micro-benchmark: Sanitizer.sanitize_input vs. the previous implementation.
+
+Run from the repository root inside the ComfyUI environment (needs aiohttp
+and bleach):
+
+    python benchmarks/bench_sanitizer.py [--number N]
+
+Every payload is also checked to produce identical output on both engines.
+"""
+
+import argparse
+import html
+import importlib.util
+import os
+import re
+import timeit
+import unicodedata
+
+from bleach import clean
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_sanitizer():
+    spec = importlib.util.spec_from_file_location(
+        "usgromana_sanitizer", os.path.join(ROOT, "utils", "sanitizer.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Sanitizer
+
+
+def legacy_sanitize_input(value):
+    """The sanitizer as it was before the precompiled engine."""
+    if isinstance(value, str):
+        value = value.strip()
+        value = unicodedata.normalize("NFC", value)
+        value = html.escape(value)
+        value = value.replace("\r", "").replace("\n", "")
+        value = re.sub(r"([;'\-()<>`=])", r"\\\1", value)
+        value = re.sub(r"[;&|`]", "", value)
+        value = clean(value, tags=[], attributes=[], protocols=[])
+
+        xss_patterns = [
+            r"<script.*?>.*?</script>",
+            r"javascript:",
+            r"vbscript:",
+            r"data:text/html",
+            r"data:image",
+        ]
+        for pattern in xss_patterns:
+            value = re.sub(pattern, "", value, flags=re.IGNORECASE)
+
+    elif isinstance(value, (int, float)):
+        return value
+
+    elif isinstance(value, (list, dict)):
+        return (
+            [legacy_sanitize_input(item) for item in value]
+            if isinstance(value, list)
+            else {key: legacy_sanitize_input(val) for key, val in value.items()}
+        )
+
+    return value
+
+
+PAYLOADS = {
+    "login form": {"username": "alice", "password": "correct horse battery staple"},
+    "guest login": {"guest_login": "true"},
+    "register form": {
+        "username": "admin",
+        "password": "S3cr3t!-pass(word)=1",
+        "new_user_username": "Zoë_Müller",
+        "new_user_password": "p@ss;word|`rm -rf`",
+    },
+    "hostile login": {
+        "username": "<script>alert('x')</script>",
+        "password": "javascript:alert(1)\r\n data:text/html,<b>",
+    },
+    "query string": {"filename": "ComfyUI_00042_.png", "subfolder": "alice", "type": "output"},
+    "nested json": {
+        "workflow": {"name": "portrait (v2)", "tags": ["sfw", "faces", "x=1;y=2"]},
+        "nodes": [{"id": i, "title": f"KSampler #{i}", "widgets": [20, 7.5, "euler"]} for i in range(20)],
+    },
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="iterations per payload")
+    args = parser.parse_args()
+
+    Sanitizer = load_sanitizer()
+
+    print(f"{'payload':<16} {'legacy us':>10} {'current us':>11} {'speedup':>8}")
+    for name, payload in PAYLOADS.items():
+        expected = {k: legacy_sanitize_input(v) for k, v in payload.items()}
+        actual = {k: Sanitizer.sanitize_input(v) for k, v in payload.items()}
+        if actual != expected:
+            raise SystemExit(f"Output mismatch for {name!r}:\n  legacy:  {expected}\n  current: {actual}")
+
+        legacy = timeit.timeit(
+            lambda: {k: legacy_sanitize_input(v) for k, v in payload.items()}, number=args.number
+        )
+        current = timeit.timeit(
+            lambda: {k: Sanitizer.sanitize_input(v) for k, v in payload.items()}, number=args.number
+        )
+        legacy_us = legacy / args.number * 1e6
+        current_us = current / args.number * 1e6
+        print(f"{name:<16} {legacy_us:>10.1f} {current_us:>11.1f} {legacy_us / current_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Micro-benchmark: reading NSFW tags via the header-only readers vs. PIL.
+
+Run from the repository root in an environment with Pillow and piexif:
+
+    python benchmarks/bench_tag_read.py [--size PX] [--number N]
+
+Creates a tagged PNG (with a ComfyUI-sized prompt/workflow chunk ahead of
+the tag) and a tagged JPEG of --size x --size pixels in a temp directory,
+then times one tag lookup each way. "PIL" is what _get_nsfw_tag did
+before: Image.open() + info for PNG, Image.open() + piexif.load() of the
+EXIF block for JPEG. Both ways are checked to find the same tag.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import tempfile
+import timeit
+
+import piexif
+from PIL import Image, PngImagePlugin
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NSFW_KEYS = ("UsgromanaNSFW", "UsgromanaNSFWScore", "UsgromanaNSFWLabel", "Keywords", "Comment")
+USER_COMMENT, XP_COMMENT, XP_KEYWORDS = 0x9286, 0x9C9C, 0x9C9E
+
+
+def load_image_metadata():
+    spec = importlib.util.spec_from_file_location(
+        "usgromana_image_metadata", os.path.join(ROOT, "utils", "sfw_intercept", "image_metadata.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_images(directory, size, meta):
+    rng = random.Random(0)
+    workflow = json.dumps({
+        "nodes": [
+            {"id": i, "type": "KSampler", "widgets_values": [rng.randrange(2**32), 20, 7.5, "euler", "normal"]}
+            for i in range(400)
+        ]
+    })
+    noise = Image.effect_noise((size, size), 64).convert("RGB")
+
+    png = os.path.join(directory, "ComfyUI_00001_.png")
+    info = PngImagePlugin.PngInfo()
+    info.add_text("prompt", workflow)
+    info.add_text("workflow", workflow)
+    noise.save(png, pnginfo=info, compress_level=1)
+    meta.update_png_text(png, [
+        ("UsgromanaNSFW", "true"),
+        ("UsgromanaNSFWScore", "0.97"),
+        ("UsgromanaNSFWLabel", "nsfw"),
+        ("Keywords", "NSFW"),
+    ])
+
+    jpg = os.path.join(directory, "ComfyUI_00001_.jpg")
+    noise.save(jpg, quality=92)
+    exif = meta.read_jpeg_exif(jpg)
+    exif["Exif"][piexif.ExifIFD.UserComment] = b'NSFW:{"is_nsfw": true, "score": 0.97, "label": "nsfw"}'
+    exif["0th"][piexif.ImageIFD.XPKeywords] = "NSFW".encode("utf-16le")
+    meta.write_jpeg_exif(jpg, exif)
+    return png, jpg
+
+
+def pil_png(path):
+    with Image.open(path) as img:
+        return {k: v for k, v in img.info.items() if k in NSFW_KEYS}
+
+
+def pil_jpeg(path):
+    with Image.open(path) as img:
+        exif = piexif.load(img.info.get("exif", b""))
+    return exif["Exif"].get(USER_COMMENT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=2048, help="image width/height in pixels")
+    parser.add_argument("--number", type=int, default=2000, help="lookups per image")
+    args = parser.parse_args()
+
+    meta = load_image_metadata()
+    with tempfile.TemporaryDirectory() as tmp:
+        png, jpg = make_images(tmp, args.size, meta)
+
+        def header_png(path):
+            return meta.read_png_text(path, keys=NSFW_KEYS, stop_at_idat=True)
+
+        def header_jpeg(path):
+            tags = meta.read_jpeg_exif_tags(path, (XP_KEYWORDS, XP_COMMENT), (USER_COMMENT,))
+            return tags.get(USER_COMMENT)
+
+        cases = [("png", png, pil_png, header_png), ("jpeg", jpg, pil_jpeg, header_jpeg)]
+        print(f"{'image':<6} {'file MB':>8} {'PIL us':>9} {'header us':>10} {'speedup':>8}")
+        for name, path, pil, header in cases:
+            if pil(path) != header(path):
+                raise SystemExit(f"Tag mismatch for {name}:\n  PIL:    {pil(path)}\n  header: {header(path)}")
+            pil_us = min(timeit.repeat(lambda: pil(path), number=args.number, repeat=3)) / args.number * 1e6
+            header_us = min(timeit.repeat(lambda: header(path), number=args.number, repeat=3)) / args.number * 1e6
+            size_mb = os.path.getsize(path) / 1e6
+            print(f"{name:<6} {size_mb:>8.1f} {pil_us:>9.1f} {header_us:>10.1f} {pil_us / header_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
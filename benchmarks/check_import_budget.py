@@ -0,0 +1,141 @@
+"""
+Import-time budget check for the NSFW guard. Exits non-zero when it fails.
+
+Run from the repository root in an environment with the requirements
+plus Pillow (ComfyUI itself is not needed):
+
+    python benchmarks/check_import_budget.py [--budget-ms MS]
+
+Copies the extension to a temp directory (so the users DB, log and tag
+index it creates on import land there), stubs the ComfyUI modules it
+imports (server.PromptServer, execution, folder_paths,
+comfy.model_management),
+imports utils.sfw_intercept.nsfw_guard and reads the tag of a tagged PNG.
+Fails if that pulled in transformers, or if it took longer than the
+budget. The modules ComfyUI has loaded before any custom node (PIL,
+aiohttp) are imported up front and not counted.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+from aiohttp import web
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "usgromana_import_check"
+HEAVY_MODULES = ("transformers",)
+
+
+class _FakePromptServer:
+    """Just enough of PromptServer for globals.py and AccessControl."""
+
+    instance = None
+
+    def __init__(self):
+        self.app = web.Application()
+        self.routes = web.RouteTableDef()
+        self.prompt_queue = types.SimpleNamespace(put=lambda item: None)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def install_comfy_stubs(base_path):
+    server = types.ModuleType("server")
+    server.PromptServer = _FakePromptServer
+    _FakePromptServer.instance = _FakePromptServer()
+
+    execution = types.ModuleType("execution")
+    execution.PromptQueue = type("PromptQueue", (), {})
+    execution.MAXIMUM_HISTORY_SIZE = 10000
+
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.base_path = base_path
+    folder_paths.get_output_directory = lambda: os.path.join(base_path, "output")
+    folder_paths.get_input_directory = lambda: os.path.join(base_path, "input")
+    folder_paths.get_temp_directory = lambda: os.path.join(base_path, "temp")
+
+    comfy = types.ModuleType("comfy")
+    model_management = types.ModuleType("comfy.model_management")
+    model_management.get_torch_device = lambda: "cpu"
+    comfy.model_management = model_management
+
+    sys.modules.update({
+        "server": server,
+        "execution": execution,
+        "folder_paths": folder_paths,
+        "comfy": comfy,
+        "comfy.model_management": model_management,
+    })
+
+
+def copy_extension(directory):
+    """Copy the extension's Python tree, registered as a bare package so
+    importing a submodule doesn't run the extension's __init__.py."""
+    target = os.path.join(directory, PACKAGE)
+    shutil.copytree(ROOT, target, ignore=shutil.ignore_patterns(
+        ".git", "__pycache__", "web", "benchmarks", "*.log", "*.sqlite3",
+    ))
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [target]
+    sys.modules[PACKAGE] = package
+    sys.path.insert(0, directory)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=1500, help="max wall time for import + tag read")
+    args = parser.parse_args()
+
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    if loaded:
+        raise SystemExit(f"Already imported before the check: {', '.join(loaded)}")
+
+    # Keeps utils.config from warning about a random session key
+    os.environ.setdefault("SECRET_KEY", "import-budget-check")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_comfy_stubs(tmp)
+        copy_extension(tmp)
+
+        png = os.path.join(tmp, "ComfyUI_00001_.png")
+        Image.new("RGB", (64, 64)).save(png)
+
+        start = time.perf_counter()
+        nsfw_guard = __import__(f"{PACKAGE}.utils.sfw_intercept.nsfw_guard", fromlist=["nsfw_guard"])
+        elapsed = time.perf_counter() - start
+
+        # Embedded tag read (header-only), then the indexed lookup
+        nsfw_guard._write_embedded_nsfw_tag(png, False, 0.01, "normal")
+        start = time.perf_counter()
+        embedded = nsfw_guard._read_embedded_nsfw_tag(png)
+        tag = nsfw_guard._get_nsfw_tag(png)
+        elapsed_ms = (elapsed + time.perf_counter() - start) * 1e3
+
+    failures = []
+    for name, found in (("embedded", embedded), ("indexed", tag)):
+        if not found or found.get("is_nsfw") is not False:
+            failures.append(f"{name} tag read returned {found!r}")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    if loaded:
+        failures.append(f"imported {', '.join(loaded)}")
+    if elapsed_ms > args.budget_ms:
+        failures.append(f"took {elapsed_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    print(f"nsfw_guard import + tag read: {elapsed_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,12 @@ config_data = _load_config(CONFIG_FILE_PATH)
 
 # --- Files & Paths ---
 USERS_FILE = os.path.join(CURRENT_DIR, "users", "users.json")
+USERS_SQLITE_FILE = os.path.join(CURRENT_DIR, config_data.get("users_sqlite_db", os.path.join("users", "users.sqlite3")))
+# Sidecar NSFW tag index; "" disables it (tags are then read from the images)
+_nsfw_tag_index_db = config_data.get("nsfw_tag_index_db", os.path.join("users", "nsfw_tags.sqlite3"))
+NSFW_TAG_INDEX_FILE = os.path.join(CURRENT_DIR, _nsfw_tag_index_db) if _nsfw_tag_index_db else None
+# Where NSFW tags live: "embed" (image metadata + index) or "index" (index only, images untouched)
+NSFW_TAG_STORE = str(config_data.get("nsfw_tag_store", "embed")).lower()
 GROUPS_CONFIG_FILE = os.path.join(CURRENT_DIR, "users", "usgromana_groups.json")
 DEFAULT_GROUP_CONFIG_PATH = os.path.join(CURRENT_DIR, "users", "defaults", "default_group_config.json")
 WHITELIST_FILE = os.path.join(CURRENT_DIR, "users", "whitelist.txt")
@@ -44,10 +50,38 @@ if not SECRET_KEY:
 TOKEN_EXPIRE_MINUTES = 60 * config_data.get("access_token_expiration_hours", 12)
 MAX_TOKEN_EXPIRE_MINUTES = 60 * config_data.get("max_access_token_expiration_hours", 8760)
 TOKEN_ALGORITHM = "HS256"
+TOKEN_CACHE_SIZE = config_data.get("token_cache_size", 1024)
+
+USERS_BACKEND = config_data.get("users_backend", "json")
+USERS_DB_RECHECK_SECONDS = config_data.get("users_db_recheck_seconds", 0)
+
+BCRYPT_WORKERS = config_data.get("bcrypt_workers", 2)
+BCRYPT_MAX_PENDING = config_data.get("bcrypt_max_pending", 32)
 
 BLACKLIST_AFTER_ATTEMPTS = config_data.get("blacklist_after_attempts", 5)
+FAILED_ATTEMPTS_WINDOW = config_data.get("failed_attempts_window_seconds", 900)
+FAILED_ATTEMPTS_MAX_ENTRIES = config_data.get("failed_attempts_max_entries", 10000)
 FREE_MEMORY_ON_LOGOUT = config_data.get("free_memory_on_logout", True)
 FORCE_HTTPS = config_data.get("force_https", False)
+FUSED_MIDDLEWARE = config_data.get("fused_middleware", False)
+METRICS_ENABLED = config_data.get("enable_metrics", True)
+
+# NSFW classifier: opt-in background warmup at startup, and what /view does
+# with an untagged image while the model is loading ("wait", "allow", "block")
+NSFW_WARMUP = config_data.get("nsfw_warmup", False)
+NSFW_LOADING_POLICY = str(config_data.get("nsfw_loading_policy", "wait")).lower()
+if NSFW_LOADING_POLICY not in ("wait", "allow", "block"):
+    warnings.warn(f"[Usgromana] Unknown nsfw_loading_policy {NSFW_LOADING_POLICY!r}, using 'wait'.")
+    NSFW_LOADING_POLICY = "wait"
+NSFW_LOADING_WAIT_SECONDS = config_data.get("nsfw_loading_wait_seconds", 30)
+# Images per classifier forward pass when scanning a batch at save time
+NSFW_BATCH_SIZE = config_data.get("nsfw_batch_size", 8)
+if NSFW_TAG_STORE not in ("embed", "index"):
+    warnings.warn(f"[Usgromana] Unknown nsfw_tag_store {NSFW_TAG_STORE!r}, using 'embed'.")
+    NSFW_TAG_STORE = "embed"
+if NSFW_TAG_STORE == "index" and not NSFW_TAG_INDEX_FILE:
+    warnings.warn("[Usgromana] nsfw_tag_store 'index' needs nsfw_tag_index_db, using 'embed'.")
+    NSFW_TAG_STORE = "embed"
 SEPERATE_USERS = config_data.get("seperate_users", True)
 MANAGER_ADMIN_ONLY = config_data.get("manager_admin_only", True)
 MATCH_HEADERS = {"X-Forwarded-Proto": "https"}
\ No newline at end of file
@@ -5,11 +5,15 @@ from .constants import *
 # Import Utils
 from .utils.access_control import AccessControl
 from .utils.users_db import UsersDB
+from .utils.users_storage import create_users_storage
+from .utils.password_hasher import PasswordHasher
 from .utils.jwt_auth import JWTAuth
 from .utils.ip_filter import IPFilter
 from .utils.timeout import Timeout
+from .utils.rate_limit import RateLimiter
 from .utils.logger import Logger
 from .utils.sanitizer import Sanitizer
+from .utils.metrics import registry as metrics, CACHE_TOTAL
 
 import contextvars
 
@@ -21,7 +25,12 @@ routes = instance.routes
 
 # 1. Logger & DB
 logger = Logger(LOG_FILE, LOG_LEVELS)
-users_db = UsersDB(USERS_FILE)
+users_db = UsersDB(
+    USERS_FILE,
+    recheck_interval=USERS_DB_RECHECK_SECONDS,
+    storage=create_users_storage(USERS_BACKEND, USERS_FILE, USERS_SQLITE_FILE),
+    hasher=PasswordHasher(max_workers=BCRYPT_WORKERS, max_pending=BCRYPT_MAX_PENDING),
+)
 
 # 2. Access Control (Depends on DB + Server + Config Path)
 access_control = AccessControl(
@@ -37,10 +46,25 @@ jwt_auth = JWTAuth(
     logger=logger,
     secret_key=SECRET_KEY,
     expire_minutes=TOKEN_EXPIRE_MINUTES,
-    algorithm=TOKEN_ALGORITHM
+    algorithm=TOKEN_ALGORITHM,
+    token_cache_size=TOKEN_CACHE_SIZE,
 )
 
 # 4. Network Security
 ip_filter = IPFilter(WHITELIST_FILE, BLACKLIST_FILE)
-timeout = Timeout(ip_filter, BLACKLIST_AFTER_ATTEMPTS)
+timeout = Timeout(
+    ip_filter,
+    BLACKLIST_AFTER_ATTEMPTS,
+    window=FAILED_ATTEMPTS_WINDOW,
+    max_entries=FAILED_ATTEMPTS_MAX_ENTRIES,
+)
+rate_limiter = RateLimiter()
 sanitizer = Sanitizer()
+
+# 5. Metrics (components that already count their cache hits)
+metrics.add_collector(lambda: [
+    (CACHE_TOTAL, {"cache": "jwt_token", "result": "hit"}, jwt_auth.token_cache_hits),
+    (CACHE_TOTAL, {"cache": "jwt_token", "result": "miss"}, jwt_auth.token_cache_misses),
+    (CACHE_TOTAL, {"cache": "ip_decision", "result": "hit"}, ip_filter.decision_cache_hits),
+    (CACHE_TOTAL, {"cache": "ip_decision", "result": "miss"}, ip_filter.decision_cache_misses),
+])
@@ -1,19 +1,14 @@
 # --- START OF FILE routes/admin.py ---
 from aiohttp import web
-from ..globals import routes, jwt_auth, users_db, ip_filter
+from ..globals import routes, jwt_auth, users_db, ip_filter, access_control, metrics
 from ..constants import GROUPS_CONFIG_FILE, DEFAULT_GROUP_CONFIG_PATH, WHITELIST_FILE, BLACKLIST_FILE, USERS_FILE
 from ..utils.json_utils import load_json_file, save_json_file
 from ..utils.admin_logic import patch_user_group, delete_user_record
 from ..utils.bootstrap import load_default_groups
+from ..utils.rate_limit import is_rate_limit_key, coerce_rate_limit
 
 def is_admin(request):
-    token = jwt_auth.get_token_from_request(request)
-    if not token: return False
-    try:
-        p = jwt_auth.decode_access_token(token)
-        _, u = users_db.get_user(p['username'])
-        return u.get('admin', False) or "admin" in u.get('groups', [])
-    except: return False
+    return jwt_auth.get_request_identity(request).is_admin
 
 @routes.get("/usgromana/api/groups")
 async def api_groups(request):
@@ -31,8 +26,9 @@ async def api_update_groups(request):
             g_lower = g.lower()
             if g_lower not in current: current[g_lower] = {}
             for k, v in perms.items():
-                current[g_lower][k] = bool(v)
+                current[g_lower][k] = coerce_rate_limit(v) if is_rate_limit_key(k) else bool(v)
         save_json_file(GROUPS_CONFIG_FILE, current)
+        access_control.reload_group_config()
         return web.json_response({"status": "ok"})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
@@ -42,10 +38,8 @@ async def api_users(request):
     # Security: You might want to restrict this to admins only too
     if not is_admin(request): return web.json_response({"error": "Admin only"}, status=403)
     
-    raw = load_json_file(USERS_FILE, {})
     users_list = []
-    iterable = raw.get("users", raw).values() if isinstance(raw.get("users", raw), dict) else raw.get("users", raw)
-    for u in iterable:
+    for u in users_db.load_users().values():
         users_list.append({
             "username": u.get("username", "unknown"),
             "groups": [g.lower() for g in u.get("groups", ["user"])],
@@ -137,13 +131,36 @@ async def api_update_ip_lists(request):
                         # Skip invalid entries
                         continue
         
-        # Reload the filter lists to update in-memory cache
-        ip_filter.load_filter_list()
+        # Rebuild the in-memory prefix trees right away
+        ip_filter.reload()
         
         return web.json_response({"status": "ok"})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
+@routes.get("/usgromana/api/metrics")
+async def api_metrics(request):
+    """Middleware latency histograms and counters; ?format=prometheus for text exposition."""
+    if not is_admin(request):
+        return web.json_response({"error": "Admin only"}, status=403)
+
+    fmt = request.query.get("format", "").lower()
+    if fmt == "prometheus" or (not fmt and "text/plain" in request.headers.get("Accept", "")):
+        return web.Response(
+            text=metrics.render_prometheus(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+    return web.json_response(metrics.snapshot())
+
+@routes.get("/usgromana/api/nsfw-model")
+async def api_nsfw_model_status(request):
+    """NSFW classifier readiness (idle/loading/ready/failed)."""
+    if not is_admin(request):
+        return web.json_response({"error": "Admin only"}, status=403)
+
+    from ..utils.sfw_intercept.nsfw_guard import get_nsfw_model_status
+    return web.json_response(get_nsfw_model_status())
+
 @routes.post("/usgromana/api/nsfw-management")
 async def api_nsfw_management(request):
     """Admin-only NSFW management endpoints."""
@@ -159,7 +176,11 @@ async def api_nsfw_management(request):
         from ..utils.sfw_intercept.nsfw_guard import (
             scan_all_images_in_output_directory,
             fix_incorrectly_cached_tags,
-            clear_all_nsfw_tags
+            clear_all_nsfw_tags,
+            start_model_warmup,
+            get_nsfw_model_status,
+            rebuild_nsfw_tag_index,
+            export_nsfw_tags_to_images,
         )
         
         # Run blocking operations in executor to avoid blocking the event loop
@@ -207,6 +228,33 @@ async def api_nsfw_management(request):
                 "cleared_count": cleared_count
             })
         
+        elif action == "rebuild_index":
+            print(f"[Usgromana] Starting rebuild_index in executor...")
+            result = await loop.run_in_executor(None, rebuild_nsfw_tag_index)
+            return web.json_response({
+                "status": "ok",
+                "message": f"Indexed {result['indexed']} tagged images ({result['untagged']} untagged, {result['errors']} errors).",
+                "index_stats": result
+            })
+        
+        elif action == "export_tags":
+            print(f"[Usgromana] Starting export_tags in executor...")
+            result = await loop.run_in_executor(None, export_nsfw_tags_to_images)
+            return web.json_response({
+                "status": "ok",
+                "message": f"Embedded tags in {result['exported']} images ({result['unchanged']} already embedded, {result['errors']} errors).",
+                "export_stats": result
+            })
+        
+        elif action == "warmup_model":
+            started = start_model_warmup()
+            status = get_nsfw_model_status()
+            return web.json_response({
+                "status": "ok",
+                "message": "Model warmup started." if started else f"Model is {status['state']}.",
+                "model": status
+            })
+        
         else:
             return web.json_response({"error": f"Unknown action: {action}"}, status=400)
     
@@ -1,4 +1,5 @@
 # --- START OF FILE routes/auth.py ---
+import asyncio
 import os
 import uuid
 from aiohttp import web
@@ -6,8 +7,22 @@ from ..globals import routes, users_db, jwt_auth, logger, timeout
 from ..constants import HTML_DIR
 from ..utils.bootstrap import ensure_guest_user, ensure_groups_config
 from ..utils.ip_filter import get_ip
+from ..utils.password_hasher import PasswordHasherBusy
+from ..utils.users_db import UsernameTaken
 from ..utils import user_env
 
+# post_register awaits bcrypt between its checks and the insert; this keeps
+# the check (first admin? name free?) and the insert together, so two
+# concurrent registrations can't both become the first admin
+_register_lock = asyncio.Lock()
+
+def _hasher_busy_response(e: PasswordHasherBusy) -> web.Response:
+    return web.json_response(
+        {"error": "Server busy, please retry shortly"},
+        status=429,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 @routes.get("/register")
 async def get_register(request: web.Request) -> web.Response:
     path = os.path.join(HTML_DIR, "register.html")
@@ -28,18 +43,24 @@ async def post_register(request: web.Request) -> web.Response:
     username = sanitized_data.get("username")
     password = sanitized_data.get("password")
 
-    admin_user = users_db.get_admin_user()
-    is_first_admin = (admin_user[0] is None)
+    try:
+        async with _register_lock:
+            admin_user = users_db.get_admin_user()
+            is_first_admin = (admin_user[0] is None)
 
-    if not is_first_admin:
-        if not users_db.check_username_password(username, password):
-            timeout.add_failed_attempt(ip)
-            return web.json_response({"error": "Invalid admin credentials"}, status=403)
+            if not is_first_admin:
+                if not await users_db.check_username_password_async(username, password):
+                    timeout.add_failed_attempt(ip, username)
+                    return web.json_response({"error": "Invalid admin credentials"}, status=403)
 
-    if None not in users_db.get_user(new_username):
-        return web.json_response({"error": "Username exists"}, status=400)
+            if None not in users_db.get_user(new_username):
+                return web.json_response({"error": "Username exists"}, status=400)
 
-    users_db.add_user(str(uuid.uuid4()), new_username, new_password, is_first_admin)
+            await users_db.add_user_async(str(uuid.uuid4()), new_username, new_password, is_first_admin)
+    except UsernameTaken:
+        return web.json_response({"error": "Username exists"}, status=400)
+    except PasswordHasherBusy as e:
+        return _hasher_busy_response(e)
 
     # Create directory immediately
     user_env.get_user_workflow_dir(new_username)
@@ -49,7 +70,7 @@ async def post_register(request: web.Request) -> web.Response:
         ensure_guest_user()
 
     logger.registration_success(ip, new_username, username if not is_first_admin else None)
-    timeout.remove_failed_attempts(ip)
+    timeout.remove_failed_attempts(ip, username)
     return web.json_response({"message": "User registered"})
 
 @routes.get("/login")
@@ -81,7 +102,12 @@ async def post_login(request: web.Request) -> web.Response:
     username = sanitized_data.get("username")
     password = sanitized_data.get("password")
 
-    if users_db.check_username_password(username, password):
+    try:
+        valid = await users_db.check_username_password_async(username, password)
+    except PasswordHasherBusy as e:
+        return _hasher_busy_response(e)
+
+    if valid:
         user_id, _ = users_db.get_user(username)
         
         user_env.get_user_workflow_dir(username)
@@ -90,14 +116,15 @@ async def post_login(request: web.Request) -> web.Response:
         resp = web.json_response({"message": "Login successful", "jwt_token": token})
         resp.set_cookie("jwt_token", token, httponly=True, samesite="Strict")
         logger.login_success(ip, username)
-        timeout.remove_failed_attempts(ip)
+        timeout.remove_failed_attempts(ip, username)
         return resp
 
-    timeout.add_failed_attempt(ip)
+    timeout.add_failed_attempt(ip, username)
     return web.json_response({"error": "Invalid credentials"}, status=401)
 
 @routes.get("/logout")
 async def get_logout(request: web.Request) -> web.Response:
+    jwt_auth.invalidate_token(jwt_auth.get_token_from_request(request))
     resp = web.HTTPFound("/login")
     resp.del_cookie("jwt_token", path="/")
     return resp
\ No newline at end of file
@@ -1,6 +1,6 @@
 # --- START OF FILE routes/user.py ---
 from aiohttp import web
-from ..globals import routes, jwt_auth, users_db
+from ..globals import routes, jwt_auth
 from ..utils import user_env
 import folder_paths
 import os
@@ -36,20 +36,8 @@ def _get_caller_admin_info(request):
 
     Used to guard admin-only actions.
     """
-    token = jwt_auth.get_token_from_request(request)
-    if not token:
-        return False, None, ["guest"]
-
-    try:
-        payload = jwt_auth.decode_access_token(token)
-        username = payload.get("username")
-        _, rec = users_db.get_user(username)
-        groups = [g.lower() for g in rec.get("groups", [])] if rec else ["guest"]
-        is_admin = bool(rec and (rec.get("admin") or ("admin" in groups)))
-        return is_admin, username, groups
-    except Exception as e:
-        print(f"[usgromana] admin check error: {e}")
-        return False, None, ["guest"]
+    identity = jwt_auth.get_request_identity(request)
+    return identity.is_admin, identity.username, identity.groups
 
 
 @routes.get("/usgromana/api/me")
@@ -6,7 +6,6 @@ from aiohttp import web
 
 from ..globals import jwt_auth, current_username_var, users_db
 from ..utils import user_env
-from ..utils.sfw_intercept.nsfw_guard import should_block_image_for_current_user
 import folder_paths
 
 # 1. Determine Paths
@@ -20,17 +19,10 @@ POTENTIAL_GLOBALS = [
 
 def get_current_user(request):
     """
-    Extract username from JWT token in the request.
+    Username of the request identity.
     Falls back to 'guest' on any error / no token.
     """
-    token = jwt_auth.get_token_from_request(request)
-    if not token:
-        return "guest"
-    try:
-        payload = jwt_auth.decode_access_token(token)
-        return payload.get("username", "guest")
-    except Exception:
-        return "guest"
+    return jwt_auth.get_request_identity(request).username or "guest"
 
 def user_is_admin(username: str) -> bool:
     """
@@ -303,8 +295,9 @@ async def middleware_dispatch(request):
     - For workflow paths, routes to list/save/load/delete.
     - For /prompt, tags the current username in current_username_var
       so other parts of Usgromana know which user is executing the prompt.
-    - For /view, applies global NSFW enforcement for SFW users
-      using utils.nsfw_guard.
+    - For /view, tags the current username; the NSFW check itself is
+      done once, by the workflow interceptor in __init__.py (which
+      applies the model loading policy and times it).
     """
     path = request.path
     method = request.method
@@ -317,31 +310,11 @@ async def middleware_dispatch(request):
     if request.query.get("bypass") == "true":
         return None
 
-    # --- Global NSFW enforcement on /view ---
+    # --- /view: NSFW enforcement happens in the interceptor (_check_nsfw) ---
     if path == "/view" and method == "GET":
         username = get_current_user(request)
         current_username_var.set(username)
         print(f"[Usgromana] /view requested by user: {username!r}")
-
-        q = request.rel_url.query
-        filename = q.get("filename") or q.get("file") or q.get("name")
-        img_type = q.get("type", "output")
-
-        # Only guard standard output images for now
-        if filename and img_type == "output":
-            out_dir = folder_paths.get_output_directory()
-            img_path = os.path.join(out_dir, filename)
-
-            if os.path.isfile(img_path):
-                try:
-                    if should_block_image_for_current_user(img_path):
-                        # Hard global block for this user
-                        print(f"[Usgromana::NSFWGuard] Blocking NSFW image for user={username!r}: {img_path}")
-                        return web.Response(status=403, text="NSFW content blocked for this user.")
-                except Exception as e:
-                    print(f"[Usgromana::NSFWGuard] Error while checking {img_path}: {e}")
-
-        # Fall through to normal handler if not blocked
         return None
 
     # --- Workflow user-data endpoints ---
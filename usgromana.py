@@ -1,7 +1,7 @@
 from aiohttp import web
 from server import PromptServer
 from .globals import (
-    app, routes, ip_filter, sanitizer, timeout, jwt_auth, access_control,
+    app, routes, ip_filter, sanitizer, timeout, jwt_auth, access_control, rate_limiter,
     GROUPS_CONFIG_FILE, users_db
 )
 from .utils.watcher import watcher
@@ -35,6 +35,7 @@ app.middlewares.append(ip_filter.create_ip_filter_middleware())
 app.middlewares.append(sanitizer.create_sanitizer_middleware())
 app.middlewares.append(timeout.create_time_out_middleware(limited=("/login", "/register")))
 app.middlewares.append(jwt_auth.create_jwt_middleware(public=("/login", "/logout", "/register"), public_prefixes=("/usgromana", "/assets")))
+app.middlewares.append(rate_limiter.create_rate_limit_middleware(jwt_auth.get_request_identity))
 
 # Folder/Queue Access Control
 app.middlewares.append(access_control.create_folder_access_control_middleware())
@@ -2,11 +2,20 @@ from .config import *
 from .validate import *
 
 from .logger import Logger
+from .metrics import MetricsRegistry
+from .identity import Identity
+from .permissions import PermissionTable, RolePermissions
+from .prefix_router import PrefixRouter
 from .users_db import UsersDB
+from .password_hasher import PasswordHasher, PasswordHasherBusy
+from .users_storage import UsersStorage, JsonUsersStorage, SqliteUsersStorage
 
 from .force_https import create_https_middleware
 from .ip_filter import IPFilter, get_ip
+from .cidr_trie import CidrTrie
+from .rate_limit import RateLimiter
 from .sanitizer import Sanitizer
 from .timeout import Timeout
 from .jwt_auth import JWTAuth
-from .access_control import AccessControl
\ No newline at end of file
+from .access_control import AccessControl
+from .pipeline import create_fused_middleware
\ No newline at end of file
@@ -3,12 +3,16 @@ import os
 import json
 import heapq
 import copy
+import time
 import contextvars
 from aiohttp import web
 import folder_paths
 from server import PromptServer
 from execution import PromptQueue, MAXIMUM_HISTORY_SIZE
 from .users_db import UsersDB
+from .identity import IDENTITY_KEY
+from .permissions import PermissionTable, ANONYMOUS_PERMISSIONS
+from .prefix_router import PrefixRouter
 
 # Map Permission Keys -> URL Paths to Block
 EXTENSION_BLOCK_MAP = {
@@ -33,12 +37,24 @@ EXTENSION_BLOCK_MAP = {
 }
 
 class AccessControl:
+    # Minimum seconds between two stat() checks of the groups config file
+    GROUPS_RECHECK_INTERVAL = 1.0
+
     def __init__(self, users_db: UsersDB, server: PromptServer, groups_config_file: str):
         self.users_db = users_db
         self.server = server
         self.groups_config_file = groups_config_file
 
+        # Compiled EXTENSION_BLOCK_MAP (plus runtime registrations)
+        self.extension_router = PrefixRouter(EXTENSION_BLOCK_MAP)
+
+        # Compiled group config; replaced as a whole, never mutated
+        self._permission_table = PermissionTable({}, self.extension_router.keys)
+        self._groups_stat = None
+        self._groups_checked_at = None
+
         self._current_user = contextvars.ContextVar("user_id", default=None)
+        self._identity_resolver = None
         self.__current_user_id = None
         self.__get_output_directory = folder_paths.get_output_directory
         self.__get_temp_directory = folder_paths.get_temp_directory
@@ -55,82 +71,103 @@ class AccessControl:
         except Exception:
             return {}
 
-    def _get_user_role_and_permissions(self, request):
-        token = None
-        if "jwt_token" in request.cookies:
-            token = request.cookies.get("jwt_token")
-        if not token and "Authorization" in request.headers:
-            parts = request.headers.get("Authorization", "").split(" ")
-            if len(parts) == 2: token = parts[1]
-
-        if not token: return "guest", {}, None
-
+    def _groups_stat_signature(self):
         try:
-            import jwt
-            # Decode without verification here just to get username for role lookup
-            # The actual security check happens in JWTAuth middleware
-            payload = jwt.decode(token, options={"verify_signature": False})
-            username = payload.get("username")
+            st = os.stat(self.groups_config_file)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def reload_group_config(self) -> PermissionTable:
+        """Re-read usgromana_groups.json and atomically swap in a new compiled table."""
+        signature = self._groups_stat_signature()
+        table = PermissionTable(self._load_group_config(), self.extension_router.keys)
+        self._permission_table = table
+        self._groups_stat = signature
+        self._groups_checked_at = time.monotonic()
+        return table
+
+    def get_permission_table(self) -> PermissionTable:
+        """Current compiled table, recompiled when the config file changed on disk."""
+        now = time.monotonic()
+        checked_at = self._groups_checked_at
+        if checked_at is not None and now - checked_at < self.GROUPS_RECHECK_INTERVAL:
+            return self._permission_table
+
+        self._groups_checked_at = now
+        if checked_at is None or self._groups_stat_signature() != self._groups_stat:
+            return self.reload_group_config()
+        return self._permission_table
+
+    def get_role_permissions(self, role: str):
+        """Pre-resolved RolePermissions (read-only mapping) for a role."""
+        return self.get_permission_table().for_role(role)
+
+    def register_extension_block(self, perm_key: str, prefixes) -> None:
+        """
+        Gate additional URL prefixes behind a permission key at runtime
+        (same rules as EXTENSION_BLOCK_MAP entries).
+        """
+        self.extension_router.register(perm_key, prefixes)
+
+    def set_identity_resolver(self, resolver):
+        """Register the callable (request -> Identity) shared by all middlewares."""
+        self._identity_resolver = resolver
 
-            _, user_rec = self.users_db.get_user(username)
-            if not user_rec: return "guest", {}, None
-
-            groups = [g.lower() for g in user_rec.get("groups", [])]
-            role = groups[0] if groups else "user"
-            cfg = self._load_group_config()
-            perms = cfg.get(role, {})
-            return role, perms, username
-        except Exception:
-            return "guest", {}, None
+    def _get_user_role_and_permissions(self, request):
+        identity = request.get(IDENTITY_KEY)
+        if identity is None and self._identity_resolver is not None:
+            identity = self._identity_resolver(request)
+        if identity is None or not identity.is_authenticated:
+            return "guest", ANONYMOUS_PERMISSIONS, None
+        return identity.role, identity.permissions, identity.username
+
+    def check_request(self, request: web.Request):
+        """Return a 403 response if the request's role may not access the path, else None."""
+        path = request.path
+        
+        # 1. Public Whitelist
+        if (path.startswith(("/login", "/register", "/logout", "/usgromana", "/usgromana-gallery", "/static", "/favicon", "/ws", "/assets")) or path == "/"):
+            return None
+        
+        # 2. Core Extensions
+        if path.startswith(("/extensions/core", "/extensions/ComfyUI-Usgromana", "/extensions/Usgromana")):
+            return None
+
+        # 3. Resolve User
+        role, perms, username = self._get_user_role_and_permissions(request)
+
+        # 4. Check Permissions
+        is_queue = path.startswith(("/prompt", "/api/prompt", "/api/queue", "/queue"))
+        is_upload = path.startswith(("/upload", "/api/upload"))
+        is_userdata_workflow = path.startswith(("/api/userdata/workflows", "/api/userdata/workflows:"))
+
+        if is_queue and perms.denies("can_run"):
+            return web.json_response({"error": "Usgromana: Execution Denied"}, status=403)
+
+        if is_upload and perms.denies("can_upload"):
+            return web.json_response({"error": "Usgromana: Upload Denied"}, status=403)
+
+        if is_userdata_workflow and request.method in ("POST", "PUT", "DELETE", "PATCH"):
+            if not perms.allows("can_modify_workflows"):
+                return web.json_response({"error": "Usgromana: Workflow Denied", "code": "WORKFLOW_DENIED", "role": role}, status=403)
+
+        for perm_key in self.extension_router.match(path):
+            if not perms.allows(perm_key):
+                return web.Response(status=403, text="Usgromana: Access Denied")
+
+        if not is_queue and not is_upload and path.startswith("/api/"):
+            if perms.denies("can_access_api"):
+                return web.json_response({"error": "Usgromana: API Denied"}, status=403)
+
+        return None
 
     def create_usgromana_middleware(self):
         @web.middleware
         async def middleware(request: web.Request, handler):
-            path = request.path
-            
-            # 1. Public Whitelist
-            if (path.startswith(("/login", "/register", "/logout", "/usgromana", "/usgromana-gallery", "/static", "/favicon", "/ws", "/assets")) or path == "/"):
-                return await handler(request)
-            
-            # 2. Core Extensions
-            if path.startswith(("/extensions/core", "/extensions/ComfyUI-Usgromana", "/extensions/Usgromana")):
-                return await handler(request)
-
-            # 3. Resolve User
-            role, perms, username = self._get_user_role_and_permissions(request)
-
-            # 4. Check Permissions
-            is_queue = path.startswith(("/prompt", "/api/prompt", "/api/queue", "/queue"))
-            is_upload = path.startswith(("/upload", "/api/upload"))
-            is_userdata_workflow = path.startswith(("/api/userdata/workflows", "/api/userdata/workflows:"))
-
-            if is_queue and perms.get("can_run") is False:
-                return web.json_response({"error": "Usgromana: Execution Denied"}, status=403)
-
-            if is_upload and perms.get("can_upload") is False:
-                return web.json_response({"error": "Usgromana: Upload Denied"}, status=403)
-
-            if is_userdata_workflow and request.method in ("POST", "PUT", "DELETE", "PATCH"):
-                can_modify = perms.get("can_modify_workflows")
-                if can_modify is None: can_modify = (role != "guest")
-                if role == "admin": can_modify = True
-
-                if not can_modify:
-                    return web.json_response({"error": "Usgromana: Workflow Denied", "code": "WORKFLOW_DENIED", "role": role}, status=403)
-
-            for perm_key, blocked_paths in EXTENSION_BLOCK_MAP.items():
-                allow = perms.get(perm_key)
-                if allow is None: allow = (role != "guest")
-                if role == "admin": allow = True
-                if allow is False:
-                    for blocked_prefix in blocked_paths:
-                        if path.lower().startswith(blocked_prefix.lower()):
-                            return web.Response(status=403, text="Usgromana: Access Denied")
-
-            if not is_queue and not is_upload and path.startswith("/api/"):
-                if perms.get("can_access_api") is False:
-                    return web.json_response({"error": "Usgromana: API Denied"}, status=403)
-
+            denied = self.check_request(request)
+            if denied is not None:
+                return denied
             return await handler(request)
         return middleware
 
@@ -203,21 +240,14 @@ class AccessControl:
 
     def user_queue_put(self, item):
         current_user_id = self.get_current_user_id()
-        _, user_rec = self.users_db.get_user(current_user_id)
+        _, user_rec = self.users_db.get_user(user_id=current_user_id)
 
         if user_rec:
-            if os.path.exists(self.groups_config_file):
-                try:
-                    with open(self.groups_config_file, 'r') as f:
-                        cfg = json.load(f)
-                    groups = user_rec.get("groups", ["user"])
-                    role = groups[0] if groups else "user"
-                    perms = cfg.get(role, {})
-                    if perms.get("can_run") is False:
-                        print(f"[AccessControl] Blocked execution for {current_user_id}")
-                        return
-                except Exception:
-                    pass
+            groups = user_rec.get("groups", ["user"])
+            role = groups[0] if groups else "user"
+            if self.get_role_permissions(role).denies("can_run"):
+                print(f"[AccessControl] Blocked execution for {current_user_id}")
+                return
 
         if isinstance(item, tuple):
             new_item = (*item, {"user_id": current_user_id})
@@ -4,7 +4,7 @@ import uuid
 from ..constants import USERS_FILE, GROUPS_CONFIG_FILE, DEFAULT_GROUP_CONFIG_PATH
 from .json_utils import load_json_file, save_json_file
 from .admin_logic import patch_user_group
-from ..globals import logger, users_db
+from ..globals import logger, users_db, access_control
 
 def load_default_groups():
     cfg = load_json_file(DEFAULT_GROUP_CONFIG_PATH, None)
@@ -38,6 +38,7 @@ def ensure_groups_config():
 
     if changed:
         save_json_file(GROUPS_CONFIG_FILE, current)
+        access_control.reload_group_config()
 
 def ensure_guest_user():
     try:
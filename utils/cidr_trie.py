@@ -0,0 +1,82 @@
+import ipaddress
+
+# Node layout: [child for bit 0, child for bit 1, terminal flag]
+_ZERO, _ONE, _TERMINAL = 0, 1, 2
+
+
+def _new_node() -> list:
+    return [None, None, False]
+
+
+class CidrTrie:
+    """
+    Binary prefix tree of IPv4 and IPv6 networks.
+
+    A lookup walks at most 32 (IPv4) or 128 (IPv6) bits and stops at the
+    first network containing the address or the first missing branch, so
+    the cost doesn't depend on how many networks are loaded. Single
+    addresses are stored as /32 or /128 networks.
+    """
+
+    def __init__(self, entries=()):
+        self._roots = {4: _new_node(), 6: _new_node()}
+        self._count = 0
+        for entry in entries:
+            self.add(entry)
+
+    @staticmethod
+    def _as_network(entry):
+        if isinstance(entry, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+            return entry
+        if isinstance(entry, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            return ipaddress.ip_network(entry)
+        return ipaddress.ip_network(str(entry).strip(), strict=False)
+
+    def add(self, entry) -> None:
+        """Add an ip_address, ip_network or their string form."""
+        network = self._as_network(entry)
+        bits = network.max_prefixlen
+        value = int(network.network_address)
+
+        node = self._roots[network.version]
+        for i in range(network.prefixlen):
+            if node[_TERMINAL]:
+                return  # Already covered by a shorter prefix
+            bit = (value >> (bits - 1 - i)) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = _new_node()
+            node = child
+
+        if not node[_TERMINAL]:
+            node[_TERMINAL] = True
+            # Anything longer under this prefix is now redundant
+            node[_ZERO] = node[_ONE] = None
+            self._count += 1
+
+    def __contains__(self, address) -> bool:
+        if not isinstance(address, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            try:
+                address = ipaddress.ip_address(address)
+            except ValueError:
+                return False
+
+        node = self._roots[address.version]
+        if node[_TERMINAL]:
+            return True
+
+        value = int(address)
+        for shift in range(address.max_prefixlen - 1, -1, -1):
+            node = node[(value >> shift) & 1]
+            if node is None:
+                return False
+            if node[_TERMINAL]:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        """Number of networks added (ignoring ones already covered when added)."""
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self._count > 0
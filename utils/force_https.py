@@ -1,6 +1,18 @@
 from aiohttp import web
 
 
+def upgrade_request_scheme(request: web.Request, match_headers: dict | None) -> web.Request:
+    """Return the request with scheme https if the HTTPS headers matched, else as-is."""
+    matched = any(
+        request.headers.get(key) == value for key, value in match_headers.items()
+    )
+
+    if matched:
+        request = request.clone(scheme="https")
+
+    return request
+
+
 def create_https_middleware(match_headers: dict | None) -> web.middleware:
     """
     Create middlware to change scheme of current request when HTTPS headers matched.
@@ -9,14 +21,6 @@ def create_https_middleware(match_headers: dict | None) -> web.middleware:
     @web.middleware
     async def https_middleware(request: web.Request, handler) -> web.StreamResponse:
         """Change scheme of current request when HTTPS headers matched."""
-
-        matched = any(
-            request.headers.get(key) == value for key, value in match_headers.items()
-        )
-
-        if matched:
-            request = request.clone(scheme="https")
-
-        return await handler(request)
+        return await handler(upgrade_request_scheme(request, match_headers))
 
     return https_middleware
@@ -0,0 +1,74 @@
+from collections.abc import Mapping
+from typing import Optional
+
+from .permissions import ANONYMOUS_PERMISSIONS
+
+# Key under which the resolved identity is stored on the aiohttp request
+IDENTITY_KEY = "usgromana_identity"
+
+
+class Identity:
+    """
+    Who is making the current request.
+
+    Resolved once per request (one token decode + one user lookup) and shared
+    by every Usgromana middleware and route via request[IDENTITY_KEY].
+    """
+
+    __slots__ = (
+        "user_id",
+        "username",
+        "groups",
+        "role",
+        "permissions",
+        "sfw_check",
+        "is_admin",
+    )
+
+    def __init__(
+        self,
+        user_id: Optional[str],
+        username: Optional[str],
+        groups: list,
+        role: str,
+        permissions: Mapping,
+        sfw_check: bool = True,
+        is_admin: bool = False,
+    ):
+        self.user_id = user_id
+        self.username = username
+        self.groups = groups
+        self.role = role
+        self.permissions = permissions
+        self.sfw_check = sfw_check
+        self.is_admin = is_admin
+
+    @classmethod
+    def anonymous(cls) -> "Identity":
+        """Identity used when there is no valid token on the request."""
+        return cls(None, None, ["guest"], "guest", ANONYMOUS_PERMISSIONS, True, False)
+
+    @classmethod
+    def from_user_record(cls, user_id: str, username: str, user_rec: dict, get_permissions) -> "Identity":
+        """
+        Build an identity from a users_db record.
+        get_permissions(role) returns the effective permissions for the role.
+        """
+        groups = [g.lower() for g in user_rec.get("groups", [])]
+        role = groups[0] if groups else "user"
+        return cls(
+            user_id=user_id,
+            username=username,
+            groups=groups,
+            role=role,
+            permissions=get_permissions(role),
+            sfw_check=user_rec.get("sfw_check", True),
+            is_admin=bool(user_rec.get("admin") or "admin" in groups),
+        )
+
+    @property
+    def is_authenticated(self) -> bool:
+        return self.user_id is not None
+
+    def __repr__(self) -> str:
+        return f"Identity(username={self.username!r}, role={self.role!r}, is_admin={self.is_admin})"
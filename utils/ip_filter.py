@@ -1,10 +1,14 @@
 import os
-import hashlib
+import time
+import atexit
 import ipaddress
+from collections import OrderedDict
 
 from aiohttp import web
 from pathlib import Path
 
+from .cidr_trie import CidrTrie
+
 
 def get_ip(request: web.Request) -> str:
     """Extract IP address from request headers or remote address."""
@@ -27,67 +31,140 @@ def get_ip(request: web.Request) -> str:
 
 
 class IPFilter:
-    def __init__(self, whitelist_file: str | Path, blacklist_file: str | Path):
+    # Minimum seconds between two stat() checks of the list files
+    RECHECK_INTERVAL = 1.0
+    # Minimum seconds between two fsync() calls of the blacklist file
+    BLACKLIST_FSYNC_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        whitelist_file: str | Path,
+        blacklist_file: str | Path,
+        decision_cache_size: int = 4096,
+    ):
         self.whitelist_file = whitelist_file
         self.blacklist_file = blacklist_file
 
-        self._whitelist_hash = None
-        self._blacklist_hash = None
+        # (mtime_ns, size, inode) of each file when it was last loaded
+        self._whitelist_stat = None
+        self._blacklist_stat = None
+        self._checked_at = None
 
         self.whitelist = []
         self.blacklist = []
 
-        self.load_filter_list()
+        # Prefix trees built from the lists on reload
+        self._whitelist_trie = CidrTrie()
+        self._blacklist_trie = CidrTrie()
+
+        # Exact blacklist entries (str form) for O(1) duplicate checks
+        self._blacklist_entries: set[str] = set()
+
+        # Append-only blacklist writer, opened lazily and kept open
+        self._blacklist_fh = None
+        self._blacklist_needs_newline = False
+        self._blacklist_synced_at = 0.0
+        self._blacklist_unsynced = False
+
+        # LRU of recent ip -> is_allowed decisions, cleared on reload
+        self.decision_cache_size = decision_cache_size
+        self._decisions: OrderedDict[str, bool] = OrderedDict()
+        self.decision_cache_hits = 0
+        self.decision_cache_misses = 0
+
+        self.reload()
+        atexit.register(self.close_blacklist_writer)
 
     @staticmethod
-    def calculate_file_hash(filter_file) -> str:
-        """Calculate the SHA256 hash of the filter IP list file."""
-        if os.path.exists(filter_file):
-            with open(filter_file, "rb") as f:
-                file_data = f.read()
-                return hashlib.sha256(file_data).hexdigest()
-        return ""
+    def _stat_signature(filter_file):
+        try:
+            st = os.stat(filter_file)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
 
-    def load_filter_list(self) -> tuple[list, list]:
-        """Load whitelist and blacklist IP lists from files. Supports both single IPs and CIDR ranges."""
-
-        def load_ip_list(
-            file_path: str | Path, current_hash: str, hash_attribute: str, list_attribute: str
-        ) -> list:
-            new_hash = self.calculate_file_hash(file_path)
-            if new_hash != current_hash:
-                ip_list = []
-                if os.path.exists(file_path):
-                    with open(file_path, "r") as f:
-                        for line in f:
-                            ip = line.strip()
-                            if ip and not ip.startswith("#"):  # Skip comments
-                                try:
-                                    # Try as single IP first
-                                    ip_list.append(ipaddress.ip_address(ip))
-                                except ValueError:
-                                    try:
-                                        # Try as CIDR network
-                                        ip_list.append(ipaddress.ip_network(ip, strict=False))
-                                    except ValueError:
-                                        # Invalid IP format, skip
-                                        continue
-                setattr(self, hash_attribute, new_hash)
-                setattr(self, list_attribute, ip_list)
-                return ip_list
-            else:
-                # Hash unchanged, return cached list
-                return getattr(self, list_attribute)
-
-        self.whitelist = load_ip_list(
-            self.whitelist_file, self._whitelist_hash, "_whitelist_hash", "whitelist"
-        )
-        self.blacklist = load_ip_list(
-            self.blacklist_file, self._blacklist_hash, "_blacklist_hash", "blacklist"
-        )
+    @staticmethod
+    def _read_ip_list(file_path: str | Path) -> list:
+        """Parse a list file. Supports both single IPs and CIDR ranges."""
+        ip_list = []
+        if os.path.exists(file_path):
+            with open(file_path, "r") as f:
+                for line in f:
+                    ip = line.strip()
+                    if ip and not ip.startswith("#"):  # Skip comments
+                        try:
+                            # Try as single IP first
+                            ip_list.append(ipaddress.ip_address(ip))
+                        except ValueError:
+                            try:
+                                # Try as CIDR network
+                                ip_list.append(ipaddress.ip_network(ip, strict=False))
+                            except ValueError:
+                                # Invalid IP format, skip
+                                continue
+        return ip_list
+
+    @staticmethod
+    def _needs_newline(file_path: str | Path) -> bool:
+        """True if the file is non-empty and doesn't end with a newline."""
+        try:
+            with open(file_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except OSError:
+            return False
+
+    def reload(self, force: bool = True) -> tuple[list, list]:
+        """
+        Re-read the whitelist/blacklist files and rebuild the prefix trees.
+        With force=False, only files whose stat signature changed are re-read.
+        """
+        self._checked_at = time.monotonic()
+        changed = False
+
+        signature = self._stat_signature(self.whitelist_file)
+        if force or signature != self._whitelist_stat:
+            whitelist = self._read_ip_list(self.whitelist_file)
+            self._whitelist_trie = CidrTrie(whitelist)
+            self.whitelist = whitelist
+            self._whitelist_stat = signature
+            changed = True
+
+        signature = self._stat_signature(self.blacklist_file)
+        if force or signature != self._blacklist_stat:
+            # The file may have been replaced: reopen the writer on next use
+            self.close_blacklist_writer()
+            blacklist = self._read_ip_list(self.blacklist_file)
+            self._blacklist_trie = CidrTrie(blacklist)
+            self._blacklist_entries = {str(entry) for entry in blacklist}
+            self._blacklist_needs_newline = self._needs_newline(self.blacklist_file)
+            self.blacklist = blacklist
+            self._blacklist_stat = signature
+            changed = True
+
+        if changed:
+            self._decisions = OrderedDict()
 
         return self.whitelist, self.blacklist
 
+    def load_filter_list(self) -> tuple[list, list]:
+        """Return (whitelist, blacklist), reloading files that changed on disk."""
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.RECHECK_INTERVAL:
+            # Piggyback the deferred fsync of recent bans on the periodic check
+            if self._blacklist_unsynced:
+                self.sync_blacklist()
+            self.reload(force=False)
+        return self.whitelist, self.blacklist
+
+    def is_whitelisted(self, ip: str) -> bool:
+        """True if the IP matches an entry of the whitelist."""
+        self.load_filter_list()
+        return ip in self._whitelist_trie
+
     def is_allowed(self, ip: str) -> bool:
         """
         Checks if the given IP address is allowed based on the whitelist and blacklist.
@@ -98,36 +175,32 @@ class IPFilter:
         """
         self.load_filter_list()
 
+        decisions = self._decisions
+        allowed = decisions.get(ip)
+        if allowed is not None:
+            decisions.move_to_end(ip)
+            self.decision_cache_hits += 1
+            return allowed
+
+        self.decision_cache_misses += 1
+        allowed = self._decide(ip)
+        decisions[ip] = allowed
+        if len(decisions) > self.decision_cache_size:
+            decisions.popitem(last=False)
+        return allowed
+
+    def _decide(self, ip: str) -> bool:
         try:
             ip_addr = ipaddress.ip_address(ip)
         except ValueError:
             return False
 
         # Check whitelist (if not empty, IP must be whitelisted)
-        if self.whitelist:
-            for entry in self.whitelist:
-                if isinstance(entry, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
-                    # CIDR range check
-                    if ip_addr in entry:
-                        return True
-                else:
-                    # Single IP check
-                    if ip_addr == entry:
-                        return True
-            return False
+        if self._whitelist_trie:
+            return ip_addr in self._whitelist_trie
 
         # Check blacklist (if whitelist is empty)
-        for entry in self.blacklist:
-            if isinstance(entry, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
-                # CIDR range check
-                if ip_addr in entry:
-                    return False
-            else:
-                # Single IP check
-                if ip_addr == entry:
-                    return False
-
-        return True
+        return ip_addr not in self._blacklist_trie
 
     def add_to_blacklist(self, ip: str) -> None:
         """Add a given IP to the blacklist file."""
@@ -138,59 +211,84 @@ class IPFilter:
         
         # Check if already in blacklist
         ip_str = str(ip_obj)
-        for entry in self.blacklist:
-            if str(entry) == ip_str:
-                return  # Already in blacklist
+        if ip_str in self._blacklist_entries:
+            return  # Already in blacklist
         
         # Add to in-memory list
+        self._blacklist_entries.add(ip_str)
         self.blacklist.append(ip_obj)
+        self._blacklist_trie.add(ip_obj)
+        self._decisions.pop(ip_str, None)
         
         # Append to file
         try:
-            # Check if file exists and has content
-            file_exists = os.path.exists(self.blacklist_file)
-            needs_newline = False
-            
-            if file_exists:
-                with open(self.blacklist_file, "r") as f:
-                    content = f.read()
-                    if content and not content.endswith("\n"):
-                        needs_newline = True
-            
-            with open(self.blacklist_file, "a") as file:
-                if needs_newline:
-                    file.write("\n")
-                file.write(ip_str + "\n")
-            
-            # Update hash after writing
-            self._blacklist_hash = self.calculate_file_hash(self.blacklist_file)
+            if self._blacklist_fh is None:
+                self._blacklist_fh = open(self.blacklist_file, "a")
+
+            line = ip_str + "\n"
+            if self._blacklist_needs_newline:
+                line = "\n" + line
+            self._blacklist_fh.write(line)
+            self._blacklist_fh.flush()
+            self._blacklist_needs_newline = False
+            self._blacklist_unsynced = True
+
+            # fsync at most once per interval; a burst of bans shares one sync
+            if time.monotonic() - self._blacklist_synced_at >= self.BLACKLIST_FSYNC_INTERVAL:
+                self.sync_blacklist()
+
+            # Our own write must not trigger a reload
+            self._blacklist_stat = self._stat_signature(self.blacklist_file)
         except Exception as e:
             # Log error but don't fail - in-memory list is updated
             print(f"[Usgromana] Warning: Failed to write IP to blacklist file: {e}")
+            self.close_blacklist_writer()
+
+    def sync_blacklist(self) -> None:
+        """fsync pending blacklist appends to disk."""
+        fh = self._blacklist_fh
+        if fh is None or not self._blacklist_unsynced:
+            return
+        try:
+            os.fsync(fh.fileno())
+        except OSError as e:
+            print(f"[Usgromana] Warning: Failed to sync blacklist file: {e}")
+        self._blacklist_unsynced = False
+        self._blacklist_synced_at = time.monotonic()
+
+    def close_blacklist_writer(self) -> None:
+        """Sync and close the append handle (reopened on the next ban)."""
+        fh = self._blacklist_fh
+        if fh is None:
+            return
+        self.sync_blacklist()
+        self._blacklist_fh = None
+        try:
+            fh.close()
+        except OSError:
+            pass
+
+    def check_request(self, request: web.Request) -> web.Response | None:
+        """Return a denial response if the request's IP is not allowed, else None."""
+        if self.is_allowed(get_ip(request)):
+            return None
+
+        message = "Access denied: IP is either not whitelisted or is blacklisted."
+        accept_header = request.headers.get("Accept", "")
+        if "text/html" in accept_header:
+            return web.HTTPForbidden(reason=message)
+        else:
+            return web.json_response({"error": message}, status=403)
 
     def create_ip_filter_middleware(self) -> web.middleware:
         """Create the middleware for managing blacklisted and whitelisted ip."""
 
         @web.middleware
         async def ip_filter_middleware(request: web.Request, handler) -> web.Response:
-            ip = get_ip(request)
-
-            if not self.is_allowed(ip):
-                return await handle_access_denied(
-                    request,
-                    "Access denied: IP is either not whitelisted or is blacklisted.",
-                )
+            denied = self.check_request(request)
+            if denied is not None:
+                return denied
 
             return await handler(request)
 
-        async def handle_access_denied(
-            request: web.Request, message: str
-        ) -> web.Response:
-            """Handle denied access cases."""
-            accept_header = request.headers.get("Accept", "")
-            if "text/html" in accept_header:
-                return web.HTTPForbidden(reason=message)
-            else:
-                return web.json_response({"error": message}, status=403)
-
         return ip_filter_middleware
@@ -1,9 +1,13 @@
 import jwt
+import time
+import threading
+from collections import OrderedDict
 from aiohttp import web
 from datetime import datetime, timedelta, timezone
 
 from .users_db import UsersDB
 from .access_control import AccessControl
+from .identity import Identity, IDENTITY_KEY
 from .logger import Logger
 
 
@@ -16,6 +20,7 @@ class JWTAuth:
         secret_key: str,
         expire_minutes: int = 12 * 60,
         algorithm: str = "HS256",
+        token_cache_size: int = 1024,
     ):
         self.users_db = users_db
         self.access_control = access_control
@@ -26,6 +31,17 @@ class JWTAuth:
 
         self.__secret_key = secret_key
 
+        # Verified-token cache: { token: (user_id, username, exp_timestamp) }
+        # Lets repeat requests skip signature verification and the DB lookup.
+        self._token_cache: OrderedDict = OrderedDict()
+        self._token_cache_size = max(0, int(token_cache_size))
+        self._token_cache_lock = threading.Lock()
+        self.token_cache_hits = 0
+        self.token_cache_misses = 0
+
+        self.access_control.set_identity_resolver(self.get_request_identity)
+        self.users_db.add_change_listener(self._on_users_changed)
+
     @staticmethod
     def get_token_from_request(request: web.Request) -> str:
         """Extract token from request headers or cookies."""
@@ -47,6 +63,176 @@ class JWTAuth:
         """Decode a JWT access token."""
         return jwt.decode(token, self.__secret_key, algorithms=[self.algorithm])
 
+    # ----------------------------
+    # Verified-token cache
+    # ----------------------------
+
+    def verify_token(self, token: str) -> tuple[str, str]:
+        """
+        Verify a token and return (user_id, username).
+
+        Tokens that were already verified are served from a bounded LRU until
+        their 'exp' passes. Raises the same errors as decode_access_token, or
+        ValueError if the user is no longer in the database.
+        """
+        now = time.time()
+        with self._token_cache_lock:
+            entry = self._token_cache.get(token)
+            if entry is not None:
+                if entry[2] > now:
+                    self._token_cache.move_to_end(token)
+                    self.token_cache_hits += 1
+                    return entry[0], entry[1]
+                # Expired: drop it and let jwt.decode raise ExpiredSignatureError
+                del self._token_cache[token]
+            self.token_cache_misses += 1
+
+        payload = self.decode_access_token(token)
+        user_id = payload.get("id")
+        username = payload.get("username")
+        if not user_id == self.users_db.get_user(username)[0]:
+            raise ValueError(f"User with username: {username} is not in the database")
+
+        exp = payload.get("exp")
+        if self._token_cache_size and isinstance(exp, (int, float)):
+            with self._token_cache_lock:
+                self._token_cache[token] = (user_id, username, float(exp))
+                self._token_cache.move_to_end(token)
+                while len(self._token_cache) > self._token_cache_size:
+                    self._token_cache.popitem(last=False)
+
+        return user_id, username
+
+    def invalidate_token(self, token: str | None) -> None:
+        """Forget a cached token (e.g. on logout)."""
+        if not token:
+            return
+        with self._token_cache_lock:
+            self._token_cache.pop(token, None)
+
+    def invalidate_user(self, username: str | None = None, user_id: str | None = None) -> None:
+        """Forget every cached token belonging to a user (e.g. on deletion)."""
+        with self._token_cache_lock:
+            stale = [
+                token
+                for token, (uid, uname, _exp) in self._token_cache.items()
+                if (username is not None and uname == username)
+                or (user_id is not None and uid == user_id)
+            ]
+            for token in stale:
+                del self._token_cache[token]
+
+    def _on_users_changed(self, event: str, user_id: str | None, username: str | None) -> None:
+        """users_db change listener: drop tokens of deleted users."""
+        if event == "deleted":
+            self.invalidate_user(username=username, user_id=user_id)
+        elif event == "reloaded":
+            # Store changed outside this process; re-verify everything
+            self.clear_token_cache()
+
+    def clear_token_cache(self) -> None:
+        """Drop all cached tokens."""
+        with self._token_cache_lock:
+            self._token_cache.clear()
+
+    def token_cache_stats(self) -> dict:
+        """Return hit/miss counters and current size of the verified-token cache."""
+        with self._token_cache_lock:
+            return {
+                "hits": self.token_cache_hits,
+                "misses": self.token_cache_misses,
+                "size": len(self._token_cache),
+                "max_size": self._token_cache_size,
+            }
+
+    # ----------------------------
+    # Request identity
+    # ----------------------------
+
+    def build_identity(self, user_id: str, username: str) -> Identity:
+        """Build the identity for a verified (user_id, username) pair."""
+        _, user_rec = self.users_db.get_user(user_id=user_id)
+        if not user_rec:
+            return Identity.anonymous()
+        return Identity.from_user_record(
+            user_id, username, user_rec, self.access_control.get_role_permissions
+        )
+
+    def get_request_identity(self, request: web.Request) -> Identity:
+        """
+        Return the identity attached to this request, resolving it on first use.
+
+        The JWT middleware attaches it for protected paths; public paths
+        (e.g. /usgromana/api/*) resolve it lazily here. Invalid or missing
+        tokens resolve to Identity.anonymous().
+        """
+        identity = request.get(IDENTITY_KEY)
+        if identity is not None:
+            return identity
+
+        identity = None
+        token = self.get_token_from_request(request)
+        if token:
+            try:
+                user_id, username = self.verify_token(token)
+                identity = self.build_identity(user_id, username)
+            except Exception:
+                identity = None
+
+        if identity is None:
+            identity = Identity.anonymous()
+        request[IDENTITY_KEY] = identity
+        return identity
+
+    @staticmethod
+    def _unauthorized_response(
+        request: web.Request,
+        redirect_path: str,
+        message: str = "Authentication required",
+    ) -> web.Response:
+        """Handle unauthorized access cases."""
+        accept_header = request.headers.get("Accept", "")
+        if "text/html" in accept_header:
+            return web.HTTPFound(redirect_path)
+        else:
+            return web.json_response({"error": message}, status=401)
+
+    def authenticate_request(self, request: web.Request) -> web.Response | None:
+        """
+        Verify the request's token and attach the user to it.
+        Returns an unauthorized response on failure, None on success.
+        """
+        token = self.get_token_from_request(request)
+
+        if not token:
+            return self._unauthorized_response(request, "/login")
+
+        try:
+            user_id, username = self.verify_token(token)
+
+            request["user_id"] = user_id
+            request["user"] = username
+            request[IDENTITY_KEY] = self.build_identity(user_id, username)
+
+            set_fallback = request.path in ["/api/prompt"]
+            self.access_control.set_current_user_id(user_id, set_fallback)
+
+        except jwt.ExpiredSignatureError:
+            return self._unauthorized_response(
+                request, "/logout", message="Token has expired"
+            )
+        except jwt.DecodeError:
+            return self._unauthorized_response(
+                request, "/logout", message="Token is invalid"
+            )
+        except Exception as e:
+            self.logger.error(f"Unexpected error during token decoding: {e}")
+            return self._unauthorized_response(
+                request, "/logout", message="Unexpected error"
+            )
+
+        return None
+
     def create_jwt_middleware(
         self,
         public: tuple = (),
@@ -65,52 +251,10 @@ class JWTAuth:
             ):
                 return await handler(request)
 
-            token = self.get_token_from_request(request)
-
-            if not token:
-                return await handle_unauthorized_access(request, "/login")
-
-            try:
-                user = self.decode_access_token(token)
-                user_id = user.get("id")
-                username = user.get("username")
-                if not user_id == self.users_db.get_user(username)[0]:
-                    raise ValueError(
-                        f"User with username: {username} is not in the database"
-                    )
-
-                request["user_id"] = user_id
-                request["user"] = username
-
-                set_fallback = request.path in ["/api/prompt"]
-                self.access_control.set_current_user_id(user_id, set_fallback)
-
-            except jwt.ExpiredSignatureError:
-                return await handle_unauthorized_access(
-                    request, "/logout", message="Token has expired"
-                )
-            except jwt.DecodeError:
-                return await handle_unauthorized_access(
-                    request, "/logout", message="Token is invalid"
-                )
-            except Exception as e:
-                self.logger.error(f"Unexpected error during token decoding: {e}")
-                return await handle_unauthorized_access(
-                    request, "/logout", message="Unexpected error"
-                )
+            unauthorized = self.authenticate_request(request)
+            if unauthorized is not None:
+                return unauthorized
 
             return await handler(request)
 
-        async def handle_unauthorized_access(
-            request: web.Request,
-            redirect_path: str,
-            message: str = "Authentication required",
-        ) -> web.Response:
-            """Handle unauthorized access cases."""
-            accept_header = request.headers.get("Accept", "")
-            if "text/html" in accept_header:
-                return web.HTTPFound(redirect_path)
-            else:
-                return web.json_response({"error": message}, status=401)
-
         return jwt_middleware
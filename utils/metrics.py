@@ -0,0 +1,237 @@
+import threading
+import time
+from bisect import bisect_left
+from time import perf_counter
+from aiohttp import web
+
+# Latency bucket upper bounds in seconds (10us .. 10s); the last bucket is +Inf
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Metric families
+MIDDLEWARE_SECONDS = "usgromana_middleware_seconds"
+BLOCKED_TOTAL = "usgromana_blocked_total"
+CACHE_TOTAL = "usgromana_cache_total"
+NSFW_CHECK_SECONDS = "usgromana_nsfw_check_seconds"
+NSFW_CLASSIFY_SECONDS = "usgromana_nsfw_classify_seconds"
+NSFW_CLASSIFIER_CALLS = "usgromana_nsfw_classifier_invocations_total"
+
+_HELP = {
+    MIDDLEWARE_SECONDS: "Time spent in each Usgromana middleware, excluding downstream handlers.",
+    BLOCKED_TOTAL: "Requests rejected by a Usgromana stage.",
+    CACHE_TOTAL: "Cache lookups by cache and result.",
+    NSFW_CHECK_SECONDS: "Time spent deciding whether to block an image, including classification and model waits.",
+    NSFW_CLASSIFY_SECONDS: "Time spent running the NSFW classifier on one image.",
+    NSFW_CLASSIFIER_CALLS: "NSFW classifier invocations.",
+}
+
+
+# Histogram and Counter updates are deliberately unlocked: they are almost
+# always made from the event loop, and a rare lost increment from a worker
+# thread is an acceptable price for keeping them cheap enough to leave on.
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three increments."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        counts = list(self.counts)
+        total, count = self.sum, self.count
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            running += n
+            cumulative.append((bound, running))
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    )
+    return "{" + body + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class MetricsRegistry:
+    """
+    In-process histograms and counters, exported as JSON or Prometheus text.
+
+    Hot paths should fetch their Histogram/Counter once (histogram(),
+    counter()) and keep the reference. Components that already keep their
+    own counters (e.g. JWTAuth.token_cache_hits) can be exposed with
+    add_collector() instead of counting twice.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, Counter] = {}
+        self._collectors = []
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, _label_key(labels))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram())
+        return hist
+
+    def counter(self, name: str, **labels) -> Counter:
+        key = (name, _label_key(labels))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def add_collector(self, collect) -> None:
+        """
+        Register collect() -> iterable of (name, labels dict, value); it is
+        called on every export and reported as counters.
+        """
+        self._collectors.append(collect)
+
+    def _collected(self) -> list:
+        rows = []
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    rows.append((name, _label_key(labels), value))
+            except Exception as e:
+                print(f"[Usgromana] Metrics collector failed: {e}")
+        return rows
+
+    def _counter_rows(self) -> list:
+        rows = [(name, labels, c.value) for (name, labels), c in list(self._counters.items())]
+        rows.extend(self._collected())
+        return sorted(rows, key=lambda row: (row[0], row[1]))
+
+    def snapshot(self) -> dict:
+        """JSON-friendly view of every metric."""
+        histograms = {}
+        for (name, labels), hist in sorted(self._histograms.items()):
+            snap = hist.snapshot()
+            histograms.setdefault(name, []).append({
+                "labels": dict(labels),
+                "count": snap["count"],
+                "sum": snap["sum"],
+                "mean": snap["sum"] / snap["count"] if snap["count"] else 0.0,
+                "buckets": [[_format_bound(b), n] for b, n in snap["buckets"]],
+            })
+
+        counters = {}
+        for name, labels, value in self._counter_rows():
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "histograms": histograms,
+            "counters": counters,
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+
+        last = None
+        for (name, labels), hist in sorted(self._histograms.items()):
+            if name != last:
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                last = name
+            snap = hist.snapshot()
+            for bound, n in snap["buckets"]:
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_bound(bound)),))} {n}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {snap['sum']!r}")
+            lines.append(f"{name}_count{_format_labels(labels)} {snap['count']}")
+
+        last = None
+        for name, labels, value in self._counter_rows():
+            if name != last:
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                last = name
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def timed_middleware(self, stage: str, middleware) -> web.middleware:
+        """
+        Wrap an aiohttp middleware so its own time (excluding the handlers
+        it calls) goes into MIDDLEWARE_SECONDS{stage=...}. Error responses
+        (or exceptions) it produces without calling the next handler count
+        as BLOCKED_TOTAL.
+        """
+        hist = self.histogram(MIDDLEWARE_SECONDS, stage=stage)
+        blocked = self.counter(BLOCKED_TOTAL, stage=stage)
+
+        @web.middleware
+        async def timed(request: web.Request, handler) -> web.StreamResponse:
+            downstream = None
+
+            async def next_handler(req):
+                nonlocal downstream
+                entered = perf_counter()
+                try:
+                    return await handler(req)
+                finally:
+                    downstream = (downstream or 0.0) + perf_counter() - entered
+
+            start = perf_counter()
+            response = None
+            try:
+                response = await middleware(request, next_handler)
+                return response
+            finally:
+                elapsed = perf_counter() - start
+                if downstream is None:
+                    hist.observe(elapsed)
+                    if response is None or response.status >= 400:
+                        blocked.inc()
+                else:
+                    hist.observe(elapsed - downstream)
+
+        return timed
+
+
+# Process-wide registry
+registry = MetricsRegistry()
@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify jobs are already queued."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Password hasher is busy")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a dedicated, bounded thread pool
+    so a burst of logins can't stall the aiohttp event loop.
+
+    At most `max_pending` jobs (running + queued) are accepted; beyond that
+    calls fail fast with PasswordHasherBusy so the caller can answer 429.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, retry_after: int = 1):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.retry_after = retry_after
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="usgromana-bcrypt"
+        )
+        # Only touched from the event loop thread
+        self._pending = 0
+
+    @staticmethod
+    def hash_sync(password: str) -> str:
+        """Hash a password using bcrypt (blocking)."""
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+    @staticmethod
+    def verify_sync(password: str, hashed: str) -> bool:
+        """Check a password against a bcrypt hash (blocking)."""
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy(self.retry_after)
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop."""
+        return await self._run(self.hash_sync, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """Check a password off the event loop."""
+        return await self._run(self.verify_sync, password, hashed)
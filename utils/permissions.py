@@ -0,0 +1,91 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+class RolePermissions(Mapping):
+    """
+    Immutable, pre-resolved permission decisions for one role.
+
+    Behaves like the raw permissions dict from usgromana_groups.json
+    (read-only), plus allows()/denies() answering from precomputed sets.
+
+    "Gated" keys (extension blocks, can_modify_workflows) use the defaults
+    None -> allowed unless the role is guest, and admin -> always allowed.
+    """
+
+    __slots__ = ("role", "_raw", "_resolved", "_allowed", "_denied")
+
+    def __init__(self, role: str, raw: dict, gated_keys=()):
+        self.role = role
+        self._raw = MappingProxyType(dict(raw))
+
+        self._resolved = frozenset(self._raw) | frozenset(gated_keys)
+        self._allowed = frozenset(k for k in self._resolved if self._resolve_gated(k))
+        self._denied = frozenset(k for k in self._raw if self._raw[k] is False)
+
+    def _resolve_gated(self, key: str) -> bool:
+        if self.role == "admin":
+            return True
+        value = self._raw.get(key)
+        if value is None:
+            return self.role != "guest"
+        return bool(value)
+
+    def allows(self, key: str) -> bool:
+        """Gated decision: explicit value, else role != guest; admin always allowed."""
+        if key in self._allowed:
+            return True
+        if key in self._resolved:
+            return False
+        # Key unknown when the table was compiled
+        return self._resolve_gated(key)
+
+    def denies(self, key: str) -> bool:
+        """Explicit-deny decision (can_run, can_upload, ...): True only if set to False."""
+        return key in self._denied
+
+    # --- Mapping interface (raw values) ---
+
+    def __getitem__(self, key):
+        return self._raw[key]
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __repr__(self) -> str:
+        return f"RolePermissions(role={self.role!r}, keys={len(self._raw)})"
+
+
+# Permissions of a request without a valid token
+ANONYMOUS_PERMISSIONS = RolePermissions("guest", {})
+
+
+class PermissionTable:
+    """Compiled, immutable role -> RolePermissions table for a group config."""
+
+    __slots__ = ("_roles", "_gated_keys", "_fallbacks")
+
+    def __init__(self, config: dict, gated_keys=()):
+        self._gated_keys = tuple(gated_keys)
+        self._roles = MappingProxyType({
+            role: RolePermissions(role, perms if isinstance(perms, dict) else {}, self._gated_keys)
+            for role, perms in (config or {}).items()
+        })
+        # Roles missing from the config resolve like an empty permissions dict
+        self._fallbacks: dict = {}
+
+    def for_role(self, role: str) -> RolePermissions:
+        perms = self._roles.get(role)
+        if perms is None:
+            perms = self._fallbacks.get(role)
+            if perms is None:
+                perms = RolePermissions(role, {}, self._gated_keys)
+                self._fallbacks[role] = perms
+        return perms
+
+    @property
+    def roles(self) -> tuple:
+        return tuple(self._roles)
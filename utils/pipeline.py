@@ -0,0 +1,163 @@
+from time import perf_counter
+from aiohttp import web
+
+from .force_https import upgrade_request_scheme
+from .metrics import MIDDLEWARE_SECONDS, BLOCKED_TOTAL
+from .rate_limit import classify_request
+from .watcher import tag_workflow_denial
+
+# Path kinds, decided once per request. Only kinds that let stages be
+# skipped get their own; everything else (/view, /prompt, other /api
+# endpoints) needs the full chain and is OTHER.
+ASSET = "asset"        # public static files (/assets/, /static/, /favicon)
+PUBLIC = "public"      # no token needed (login/register/logout, /usgromana*)
+STATIC = "static"      # extension files (/extensions/), token + extension permissions
+USERDATA = "userdata"  # /api/userdata (workflows)
+OTHER = "other"
+
+ASSET_PREFIXES = ("/assets/", "/static/", "/favicon")
+
+# Stage names, shared with the timed separate middlewares
+STAGES = (
+    "https", "ip_filter", "sanitizer", "timeout", "jwt",
+    "rate_limit", "workflow_interceptor", "access_control", "watcher",
+)
+
+
+def classify_path(path: str, public: tuple = (), public_prefixes: tuple = (), public_suffixes: tuple = ()) -> str:
+    """Classify a request path into one of the kinds above."""
+    # "/static/" with the slash: /static_gallery/ images go through the NSFW checks
+    if path.startswith(ASSET_PREFIXES):
+        return ASSET
+    if path in public or path.startswith(public_prefixes) or path.endswith(public_suffixes):
+        return PUBLIC
+    if path.startswith("/extensions/"):
+        return STATIC
+    if path.startswith("/api/userdata"):
+        return USERDATA
+    return OTHER
+
+
+def create_fused_middleware(
+    *,
+    ip_filter,
+    sanitizer,
+    timeout,
+    jwt_auth,
+    rate_limiter,
+    access_control,
+    intercept,
+    limited: tuple = (),
+    public: tuple = (),
+    public_prefixes: tuple = (),
+    public_suffixes: tuple = (),
+    https_headers: dict | None = None,
+    metrics=None,
+) -> web.middleware:
+    """
+    One middleware running the whole Usgromana chain in a single frame.
+
+    Same stages, order and responses as the separate middlewares
+    (https, ip filter, sanitizer, timeout, jwt, rate limit, workflow
+    interceptor, permissions, watcher), but the path is classified once
+    and stages that can't act on it are skipped: public paths skip token
+    verification, only limited POSTs hit the timeout check, only
+    rate-limited categories touch the buckets, static files (assets and
+    /extensions/) skip the workflow interceptor and its user resolution,
+    public assets also skip the permission check (which whitelists them),
+    only /api/userdata responses go through the watcher, and the folder
+    access middleware (a pass-through) is dropped.
+
+    `intercept(request)` is the workflow interceptor: it returns a response
+    to short-circuit, or None to continue. With a MetricsRegistry as
+    `metrics`, each stage that runs is timed under the same names as the
+    separate middlewares.
+    """
+    limited = frozenset(limited)
+    get_identity = jwt_auth.get_request_identity
+
+    timed = metrics is not None
+    if timed:
+        stage_seconds = {stage: metrics.histogram(MIDDLEWARE_SECONDS, stage=stage) for stage in STAGES}
+        stage_blocked = {stage: metrics.counter(BLOCKED_TOTAL, stage=stage) for stage in STAGES}
+
+    def lap(stage: str, mark: float) -> float:
+        now = perf_counter()
+        stage_seconds[stage].observe(now - mark)
+        return now
+
+    def blocked(stage: str, response: web.StreamResponse) -> web.StreamResponse:
+        if timed and response.status >= 400:
+            stage_blocked[stage].inc()
+        return response
+
+    @web.middleware
+    async def usgromana_pipeline(request: web.Request, handler) -> web.StreamResponse:
+        path = request.path
+        method = request.method
+        kind = classify_path(path, public, public_prefixes, public_suffixes)
+        mark = perf_counter() if timed else 0.0
+
+        if https_headers is not None:
+            request = upgrade_request_scheme(request, https_headers)
+            if timed:
+                mark = lap("https", mark)
+
+        response = ip_filter.check_request(request)
+        if timed:
+            mark = lap("ip_filter", mark)
+        if response is not None:
+            return blocked("ip_filter", response)
+
+        await sanitizer.prepare_request(request)
+        if timed:
+            mark = lap("sanitizer", mark)
+
+        if method == "POST" and path in limited:
+            response = timeout.check_request(request)
+            if timed:
+                mark = lap("timeout", mark)
+            if response is not None:
+                return blocked("timeout", response)
+
+        if kind is ASSET:
+            # Nothing below acts on public static files
+            return await handler(request)
+
+        if kind is not PUBLIC:
+            response = jwt_auth.authenticate_request(request)
+            if timed:
+                mark = lap("jwt", mark)
+            if response is not None:
+                return blocked("jwt", response)
+
+        category = classify_request(path, method)
+        if category is not None:
+            response = rate_limiter.check_request(request, get_identity, category)
+            if timed:
+                mark = lap("rate_limit", mark)
+            if response is not None:
+                return blocked("rate_limit", response)
+
+        if kind is not STATIC:
+            response = await intercept(request)
+            if timed:
+                mark = lap("workflow_interceptor", mark)
+            if response is not None:
+                return blocked("workflow_interceptor", response)
+
+        response = access_control.check_request(request)
+        if timed:
+            lap("access_control", mark)
+        if response is not None:
+            return blocked("access_control", response)
+
+        response = await handler(request)
+        if kind is USERDATA:
+            mark = perf_counter() if timed else 0.0
+            response = tag_workflow_denial(request, response)
+            if timed:
+                lap("watcher", mark)
+        return response
+
+    return usgromana_pipeline
@@ -0,0 +1,67 @@
+import threading
+
+# Trie node key holding the permission keys whose prefix ends at that node
+# (path characters are always str, so None can't collide with them)
+_KEYS = None
+
+
+class PrefixRouter:
+    """
+    Case-insensitive URL prefix trie: path -> permission keys gating it.
+
+    match() walks the lowercased path once and collects every permission
+    whose blocked prefix matches, so the cost depends on the path length,
+    not on how many extensions are gated. Registering entries rebuilds the
+    trie and swaps it in as a whole; readers never see a partial update.
+    """
+
+    def __init__(self, entries: dict | None = None):
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[str, ...]] = {}
+        self._root: dict = {}
+
+        for perm_key, prefixes in (entries or {}).items():
+            self._entries[perm_key] = tuple(prefixes)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        root: dict = {}
+        for perm_key, prefixes in self._entries.items():
+            for prefix in prefixes:
+                node = root
+                for ch in prefix.lower():
+                    node = node.setdefault(ch, {})
+                keys = node.get(_KEYS, ())
+                if perm_key not in keys:
+                    node[_KEYS] = keys + (perm_key,)
+        self._root = root
+
+    def register(self, perm_key: str, prefixes) -> None:
+        """Add (or extend) the prefixes gated by a permission key."""
+        with self._lock:
+            current = self._entries.get(perm_key, ())
+            self._entries[perm_key] = current + tuple(p for p in prefixes if p not in current)
+            self._rebuild()
+
+    def unregister(self, perm_key: str) -> None:
+        """Stop gating any path with the given permission key."""
+        with self._lock:
+            if self._entries.pop(perm_key, None) is not None:
+                self._rebuild()
+
+    @property
+    def keys(self) -> tuple[str, ...]:
+        return tuple(self._entries)
+
+    def match(self, path: str) -> tuple[str, ...]:
+        """Permission keys whose blocked prefixes match the start of `path`."""
+        node = self._root
+        found = node.get(_KEYS, ())
+        for ch in path.lower():
+            node = node.get(ch)
+            if node is None:
+                break
+            keys = node.get(_KEYS)
+            if keys:
+                found += keys
+        return found
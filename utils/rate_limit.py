@@ -0,0 +1,152 @@
+import math
+import time
+from collections import OrderedDict
+from aiohttp import web
+
+# Limits live in usgromana_groups.json next to can_run/can_upload, as
+# requests per minute (missing or 0 = unlimited):
+#   rate_limit_<category>        -> per user of the group
+#   group_rate_limit_<category>  -> shared by all users of the group
+RATE_LIMIT_PREFIX = "rate_limit_"
+GROUP_RATE_LIMIT_PREFIX = "group_rate_limit_"
+
+RATE_LIMIT_CATEGORIES = ("prompt", "view", "upload", "userdata", "nsfw")
+
+
+def is_rate_limit_key(key: str) -> bool:
+    return key.startswith((RATE_LIMIT_PREFIX, GROUP_RATE_LIMIT_PREFIX))
+
+
+def coerce_rate_limit(value) -> int:
+    """Normalize a configured limit to a non-negative int (0 = unlimited)."""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def classify_request(path: str, method: str) -> str | None:
+    """Rate limit category of a request, or None if it isn't limited."""
+    if method == "POST" and path in ("/prompt", "/api/prompt"):
+        return "prompt"
+    if path in ("/view", "/api/view"):
+        return "view"
+    if method == "POST" and path.startswith(("/upload/", "/api/upload/")):
+        return "upload"
+    if path.startswith(("/api/userdata", "/userdata")):
+        return "userdata"
+    if method == "POST" and path in ("/usgromana/api/nsfw-management", "/usgromana-gallery/mark-nsfw"):
+        return "nsfw"
+    return None
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def wait_time(self, capacity: float, rate: float, now: float) -> float:
+        """Refill, then return seconds until one token is available (0 = now)."""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class RateLimiter:
+    """
+    Per-user and per-group token buckets for expensive endpoints.
+
+    A limit of N per minute gives a bucket of capacity N refilled at N/60
+    tokens per second. A request needs a token from both its user bucket
+    and its group bucket (when those limits are set); otherwise it gets a
+    429 with Retry-After. Buckets are kept in an LRU capped at
+    `max_buckets`; an evicted bucket simply starts full again.
+    """
+
+    def __init__(self, max_buckets: int = 10000):
+        self.max_buckets = max(1, int(max_buckets))
+        self._buckets: OrderedDict[tuple, TokenBucket] = OrderedDict()
+
+    def _bucket(self, key: tuple, capacity: float, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def check(self, category: str, username: str, role: str, perms) -> float:
+        """
+        Take one token for this request. Returns 0 if allowed, otherwise the
+        number of seconds to wait (nothing is consumed in that case).
+        """
+        limits = (
+            (("user", username, category), coerce_rate_limit(perms.get(RATE_LIMIT_PREFIX + category))),
+            (("group", role, category), coerce_rate_limit(perms.get(GROUP_RATE_LIMIT_PREFIX + category))),
+        )
+
+        now = time.monotonic()
+        buckets = []
+        retry_after = 0.0
+        for key, limit in limits:
+            if limit <= 0:
+                continue
+            bucket = self._bucket(key, limit, now)
+            retry_after = max(retry_after, bucket.wait_time(limit, limit / 60.0, now))
+            buckets.append(bucket)
+
+        if retry_after > 0:
+            return retry_after
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return 0.0
+
+    def check_request(self, request: web.Request, get_identity, category: str | None = None) -> web.Response | None:
+        """
+        Return a 429 response if the request is over its limits, else None.
+        get_identity(request) returns the request's Identity; `category`
+        may be passed when the caller already classified the request.
+        """
+        if category is None:
+            category = classify_request(request.path, request.method)
+            if category is None:
+                return None
+
+        identity = get_identity(request)
+        if not identity.is_authenticated:
+            return None
+
+        retry_after = self.check(category, identity.username, identity.role, identity.permissions)
+        if retry_after <= 0:
+            return None
+
+        seconds = max(1, math.ceil(retry_after))
+        return web.json_response(
+            {
+                "error": "Usgromana: Rate limit exceeded",
+                "category": category,
+                "retry_after": seconds,
+            },
+            status=429,
+            headers={"Retry-After": str(seconds)},
+        )
+
+    def create_rate_limit_middleware(self, get_identity) -> web.middleware:
+        """Create the middleware; get_identity(request) returns the request's Identity."""
+
+        @web.middleware
+        async def rate_limit_middleware(request: web.Request, handler) -> web.Response:
+            limited = self.check_request(request, get_identity)
+            if limited is not None:
+                return limited
+
+            return await handler(request)
+
+        return rate_limit_middleware
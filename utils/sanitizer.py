@@ -1,68 +1,174 @@
 import re
 import unicodedata
-import html
+from collections.abc import Mapping
 from aiohttp import web
 from bleach import clean
 
+# Steps html.escape -> drop CR/LF -> backslash-escape [;'-()<>`=] -> drop [;&|`]
+# only ever act on one character at a time, so together they reduce to a
+# single translation table.
+_ESCAPE_TABLE = str.maketrans({
+    "&": "amp\\",   # &amp;  -> amp\;  -> amp\
+    "<": "lt\\",    # &lt;   -> lt\;   -> lt\
+    ">": "gt\\",    # &gt;   -> gt\;   -> gt\
+    '"': "quot\\",  # &quot; -> quot\; -> quot\
+    "'": "#x27\\",  # &#x27; -> #x27\; -> #x27\
+    "\r": "",
+    "\n": "",
+    ";": "\\",
+    "`": "\\",
+    "|": "",
+    "-": "\\-",
+    "(": "\\(",
+    ")": "\\)",
+    "=": "\\=",
+})
+
+# After the table no markup characters remain, so bleach.clean can only
+# change control characters, surrogates and noncharacters (html5lib
+# replaces or drops them). Strings without any of those skip bleach.
+_BLEACH_SENSITIVE = re.compile(
+    r"[\x00-\x1f\x7f-\x9f\ud800-\udfff\ufdd0-\ufdef<>&"
+    + "".join(f"\\U{plane:04x}fffe\\U{plane:04x}ffff" for plane in range(17))
+    + "]"
+)
+
+# Applied in order, like the original per-call re.sub loop
+_SCRIPT_PATTERN = re.compile(r"<script.*?>.*?</script>", re.IGNORECASE)
+_SCHEME_PATTERNS = tuple(
+    re.compile(p, re.IGNORECASE)
+    for p in (r"javascript:", r"vbscript:", r"data:text/html", r"data:image")
+)
+
+
+class LazySanitizedMapping(Mapping):
+    """
+    Read-only view of raw request values that sanitizes each value the
+    first time it is read, so unused fields cost nothing.
+    """
+
+    def __init__(self, raw: dict, sanitize):
+        self._raw = raw
+        self._sanitize = sanitize
+        self._cache = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        value = self._sanitize(self._raw[key])
+        self._cache[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
 
 class Sanitizer:
+    # Form endpoints whose handlers read request["_sanitized_data"]
+    FORM_PATHS = ("/login", "/register", "/generate_token")
+
+    def __init__(self, form_paths: tuple = FORM_PATHS):
+        self.form_paths = frozenset(form_paths)
+
     @staticmethod
-    def sanitize_input(value):
-        """Sanitize user input of various types to prevent security risks."""
-        if isinstance(value, str):
-            value = value.strip()
+    def sanitize_string(value: str) -> str:
+        """
+        Sanitize one string: strip, NFC-normalize, HTML-escape, escape/drop
+        shell and SQL metacharacters, strip markup and script schemes.
+        """
+        value = value.strip()
+        if not value.isascii():
             value = unicodedata.normalize("NFC", value)
-            value = html.escape(value)
-            value = value.replace("\r", "").replace("\n", "")
-            value = re.sub(r"([;'\-()<>`=])", r"\\\1", value)
-            value = re.sub(r"[;&|`]", "", value)
+        value = value.translate(_ESCAPE_TABLE)
+
+        if _BLEACH_SENSITIVE.search(value):
             value = clean(value, tags=[], attributes=[], protocols=[])
 
-            xss_patterns = [
-                r"<script.*?>.*?</script>",
-                r"javascript:",
-                r"vbscript:",
-                r"data:text/html",
-                r"data:image",
-            ]
-            for pattern in xss_patterns:
-                value = re.sub(pattern, "", value, flags=re.IGNORECASE)
+        # Every pattern needs a "<" or a ":"; skip them when neither is present
+        if "<" in value:
+            value = _SCRIPT_PATTERN.sub("", value)
+        if ":" in value:
+            for pattern in _SCHEME_PATTERNS:
+                value = pattern.sub("", value)
+        return value
+
+    @staticmethod
+    def sanitize_input(value):
+        """Sanitize user input of various types to prevent security risks."""
+        if isinstance(value, str):
+            return Sanitizer.sanitize_string(value)
 
         elif isinstance(value, (int, float)):
             return value
 
         elif isinstance(value, (list, dict)):
-            return (
-                [Sanitizer.sanitize_input(item) for item in value]
-                if isinstance(value, list)
-                else {key: Sanitizer.sanitize_input(val) for key, val in value.items()}
-            )
+            return Sanitizer.sanitize_json(value)
 
         return value
 
+    @staticmethod
+    def sanitize_json(value):
+        """
+        Sanitize a decoded JSON document (nested lists/dicts) iteratively,
+        so deeply nested payloads can't hit the recursion limit. Dict keys
+        are kept as-is, like sanitize_input always did.
+        """
+        sanitize_string = Sanitizer.sanitize_string
+        root = [None]
+        stack = [(root, 0, value)]
+        while stack:
+            parent, key, node = stack.pop()
+            if isinstance(node, str):
+                parent[key] = sanitize_string(node)
+            elif isinstance(node, list):
+                out = [None] * len(node)
+                parent[key] = out
+                stack.extend((out, i, item) for i, item in enumerate(node))
+            elif isinstance(node, dict):
+                out = dict.fromkeys(node)
+                parent[key] = out
+                stack.extend((out, k, item) for k, item in node.items())
+            else:
+                parent[key] = node
+        return root[0]
+
+    async def prepare_request(self, request: web.Request) -> None:
+        """
+        Expose sanitized inputs as request["_sanitized_data"] (form endpoints
+        only) and request["_sanitized_query"]. Values are sanitized on first access.
+        """
+        if request.path in self.form_paths and request.can_read_body:
+            try:
+                data = await request.post()
+                request["_sanitized_data"] = LazySanitizedMapping(
+                    dict(data.items()), self.sanitize_input
+                )
+            except Exception:
+                pass
+
+        if request.query_string:
+            request["_sanitized_query"] = LazySanitizedMapping(
+                dict(request.query.items()), self.sanitize_input
+            )
+
     def create_sanitizer_middleware(self) -> web.middleware:
-        """Create middleware to sanitize all request inputs."""
+        """
+        Create middleware exposing sanitized request inputs.
+
+        Only the form endpoints in `form_paths` have their body read; every
+        other body (uploads, prompts, workflow saves) streams to its handler
+        untouched.
+        """
 
         @web.middleware
         async def sanitizer_middleware(request: web.Request, handler) -> web.Response:
-            """Middleware to sanitize all request inputs."""
-            if request.can_read_body:
-                try:
-                    data = await request.post()
-                    sanitized_data = {
-                        key: self.sanitize_input(value) for key, value in data.items()
-                    }
-                    request["_sanitized_data"] = sanitized_data
-                except Exception:
-                    pass
-
-            if request.query:
-                sanitized_query = {
-                    key: self.sanitize_input(value)
-                    for key, value in request.query.items()
-                }
-                request["_sanitized_query"] = sanitized_query
-
+            """Middleware to sanitize the inputs of form endpoints and queries."""
+            await self.prepare_request(request)
             return await handler(request)
 
         return sanitizer_middleware
@@ -0,0 +1,313 @@
+# utils/sfw_intercept/image_metadata.py
+#
+# Metadata edits that never touch pixel data: PNG text chunks are swapped
+# at the chunk level and JPEG EXIF is spliced in as a new APP1 segment.
+# Files are rewritten through a temp file + os.replace, so a crash never
+# leaves a half-written image behind.
+#
+# The readers only walk the container headers (PNG chunks up to IDAT,
+# JPEG segments up to SOS) and seek past everything they don't need;
+# no image object is ever built.
+
+import io
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from typing import Collection, Dict, Iterable, Optional, Tuple
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_TEXT_CHUNKS = (b"tEXt", b"iTXt", b"zTXt")
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Replace `path` with `data` (same directory temp file, then os.replace)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".usgromana-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# --- PNG ---
+
+def _iter_png_chunks(data: bytes):
+    """Yield (chunk_type, start, end) for every chunk; end is past the CRC."""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG file")
+    pos = len(PNG_SIGNATURE)
+    size = len(data)
+    while pos < size:
+        if pos + 8 > size:
+            raise ValueError("Truncated PNG chunk header")
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        chunk_type = data[pos + 4:pos + 8]
+        end = pos + 12 + length
+        if end > size:
+            raise ValueError(f"Truncated PNG chunk {chunk_type!r}")
+        yield chunk_type, pos, end
+        pos = end
+        if chunk_type == b"IEND":
+            return
+
+
+def _decode_text_chunk(chunk_type: bytes, body: bytes) -> Optional[Tuple[str, str]]:
+    key, sep, rest = body.partition(b"\0")
+    if not sep:
+        return None
+    try:
+        keyword = key.decode("latin-1")
+        if chunk_type == b"tEXt":
+            return keyword, rest.decode("latin-1")
+        if chunk_type == b"zTXt":
+            # compression method byte, then zlib data
+            return keyword, zlib.decompress(rest[1:]).decode("latin-1")
+        # iTXt: flag, method, language\0, translated keyword\0, text
+        flag = rest[0]
+        _language, _, rest = rest[2:].partition(b"\0")
+        _translated, _, text = rest.partition(b"\0")
+        if flag:
+            text = zlib.decompress(text)
+        return keyword, text.decode("utf-8")
+    except (IndexError, UnicodeDecodeError, zlib.error):
+        return None
+
+
+def _text_chunk(key: str, value: str) -> bytes:
+    """tEXt when the value is Latin-1, else uncompressed iTXt (UTF-8)."""
+    keyword = key.encode("latin-1")
+    try:
+        chunk_type, body = b"tEXt", keyword + b"\0" + value.encode("latin-1")
+    except UnicodeEncodeError:
+        chunk_type, body = b"iTXt", keyword + b"\0\0\0\0\0" + value.encode("utf-8")
+    crc = zlib.crc32(chunk_type + body) & 0xFFFFFFFF
+    return len(body).to_bytes(4, "big") + chunk_type + body + crc.to_bytes(4, "big")
+
+
+def read_png_text(
+    path: str,
+    keys: Optional[Collection[str]] = None,
+    stop_at_idat: bool = False,
+) -> Dict[str, str]:
+    """
+    Text chunks of a PNG (later chunks win, as with PIL).
+
+    Only chunk headers are read; other chunks are skipped with a seek.
+    With `keys`, text chunks with any other keyword are skipped unread
+    (ComfyUI's prompt/workflow chunks can be large). With `stop_at_idat`,
+    reading stops at the image data, like PIL's Image.open().info.
+    """
+    wanted = None if keys is None else {key.encode("latin-1") for key in keys}
+    text = {}
+    with open(path, "rb", buffering=4096) as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length = int.from_bytes(header[:4], "big")
+            chunk_type = header[4:]
+            if chunk_type == b"IEND" or (stop_at_idat and chunk_type == b"IDAT"):
+                break
+            if chunk_type not in PNG_TEXT_CHUNKS:
+                f.seek(length + 4, os.SEEK_CUR)
+                continue
+            if wanted is not None:
+                # Keywords are 1-79 bytes, NUL terminated
+                head = f.read(min(length, 80))
+                if head.partition(b"\0")[0] not in wanted:
+                    f.seek(length - len(head) + 4, os.SEEK_CUR)
+                    continue
+                body = head + f.read(length - len(head))
+            else:
+                body = f.read(length)
+            f.seek(4, os.SEEK_CUR)
+            if len(body) < length:
+                raise ValueError(f"Truncated PNG chunk {chunk_type!r}")
+            item = _decode_text_chunk(chunk_type, body)
+            if item is not None:
+                text[item[0]] = item[1]
+    return text
+
+
+def update_png_text(path: str, set_items: Iterable[Tuple[str, str]] = (), remove_keys: Iterable[str] = ()) -> bool:
+    """
+    Set and/or drop text chunks without re-encoding the image.
+
+    Every existing text chunk whose keyword is being set or removed is
+    dropped; the new ones are inserted right before the first IDAT (so
+    readers that stop at the image data still see them). All other chunks
+    are copied byte for byte. Returns False (and leaves the file alone)
+    when nothing would change.
+    """
+    set_items = list(set_items)
+    drop = {key for key, _ in set_items} | set(remove_keys)
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    new_chunks = b"".join(_text_chunk(key, value) for key, value in set_items)
+    out = [PNG_SIGNATURE]
+    inserted = False
+    for chunk_type, start, end in _iter_png_chunks(data):
+        if chunk_type in PNG_TEXT_CHUNKS:
+            keyword = data[start + 8:end - 4].partition(b"\0")[0].decode("latin-1")
+            if keyword in drop:
+                continue
+        if not inserted and chunk_type in (b"IDAT", b"IEND"):
+            out.append(new_chunks)
+            inserted = True
+        out.append(data[start:end])
+
+    new_data = b"".join(out)
+    if new_data == data:
+        return False
+    _atomic_write(path, new_data)
+    return True
+
+
+# --- JPEG ---
+
+# Windows XPTitle .. XPSubject (UTF-16LE stored as BYTE arrays)
+_XP_TAGS = range(0x9C9B, 0x9CA0)
+
+
+def read_jpeg_exif(path: str) -> Dict:
+    """
+    piexif dict of a JPEG's EXIF (empty IFDs when it has none).
+
+    piexif hands BYTE arrays back as tuples of ints; the XP* fields are
+    turned back into bytes so they can be decoded and written as such.
+    """
+    import piexif
+
+    exif_dict = piexif.load(path)
+    zeroth = exif_dict.get("0th") or {}
+    for tag in _XP_TAGS:
+        if isinstance(zeroth.get(tag), tuple):
+            zeroth[tag] = bytes(zeroth[tag])
+    return exif_dict
+
+
+# TIFF field type -> size in bytes
+_TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+_EXIF_IFD_POINTER = 0x8769
+# Markers without a length field (TEM, RST0-7); SOS starts the scan data
+_JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+_JPEG_SOS, _JPEG_EOI, _JPEG_APP1 = 0xDA, 0xD9, 0xE1
+
+
+def _read_jpeg_exif_segment(f) -> Optional[bytes]:
+    """TIFF payload of the first Exif APP1 segment before SOS, or None."""
+    if f.read(2) != b"\xff\xd8":
+        raise ValueError("Not a JPEG file")
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            raise ValueError("Corrupt JPEG marker stream")
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in (_JPEG_SOS, _JPEG_EOI):
+            return None
+        if marker in _JPEG_STANDALONE:
+            continue
+        size = f.read(2)
+        if len(size) < 2:
+            return None
+        length = int.from_bytes(size, "big") - 2
+        if marker == _JPEG_APP1 and length >= 6:
+            head = f.read(6)
+            if head == b"Exif\0\0":
+                return f.read(length - 6)
+            f.seek(length - 6, os.SEEK_CUR)
+        else:
+            f.seek(length, os.SEEK_CUR)
+
+
+def _read_tiff_ifd(tiff: bytes, offset: int, endian: str, tags: Collection[int]) -> Dict[int, bytes]:
+    """Raw value bytes of the wanted tags in one IFD."""
+    found = {}
+    (count,) = struct.unpack_from(endian + "H", tiff, offset)
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, field_type, n = struct.unpack_from(endian + "HHI", tiff, entry)
+        if tag not in tags:
+            continue
+        size = _TIFF_TYPE_SIZES.get(field_type, 1) * n
+        if size <= 4:
+            start = entry + 8
+        else:
+            (start,) = struct.unpack_from(endian + "I", tiff, entry + 8)
+        value = tiff[start:start + size]
+        if len(value) == size:
+            found[tag] = value
+    return found
+
+
+def read_jpeg_exif_tags(
+    path: str,
+    ifd0_tags: Collection[int] = (),
+    exif_tags: Collection[int] = (),
+) -> Dict[int, bytes]:
+    """
+    Raw bytes of selected EXIF tags, from the JPEG headers only.
+
+    Walks the marker segments up to SOS, seeking past everything but the
+    Exif APP1 segment, then reads just IFD0 and (if asked for) the Exif
+    sub-IFD. Values are returned undecoded, e.g. UserComment as stored
+    and the Windows XP* fields as UTF-16LE. Missing tags are left out.
+    """
+    with open(path, "rb", buffering=4096) as f:
+        tiff = _read_jpeg_exif_segment(f)
+    if not tiff or len(tiff) < 8:
+        return {}
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Bad TIFF byte order in EXIF")
+
+    try:
+        (ifd0,) = struct.unpack_from(endian + "I", tiff, 4)
+        wanted = set(ifd0_tags)
+        if exif_tags:
+            wanted.add(_EXIF_IFD_POINTER)
+        found = _read_tiff_ifd(tiff, ifd0, endian, wanted)
+        pointer = found.pop(_EXIF_IFD_POINTER, None)
+        if exif_tags and pointer is not None:
+            (exif_ifd,) = struct.unpack(endian + "I", pointer)
+            found.update(_read_tiff_ifd(tiff, exif_ifd, endian, exif_tags))
+    except struct.error as e:
+        raise ValueError(f"Truncated EXIF: {e}") from e
+    return found
+
+
+def write_jpeg_exif(path: str, exif_dict: Dict) -> None:
+    """Replace the EXIF APP1 segment of a JPEG; the compressed scan data is copied as is."""
+    import piexif
+
+    exif_bytes = piexif.dump(exif_dict)
+    with open(path, "rb") as f:
+        data = f.read()
+    out = io.BytesIO()
+    piexif.insert(exif_bytes, data, out)
+    _atomic_write(path, out.getvalue())
@@ -1,60 +1,87 @@
 # --- START OF FILE utils/node_interceptor.py ---
+import os
 import torch
 import nodes
-import numpy as np
-from PIL import Image
 import latent_preview
+from comfy.cli_args import args
 
 from ...utils.sfw_intercept.nsfw_guard import (
     _get_nsfw_pipeline,
+    classify_tensor_frames,
+    _index_nsfw_tag,
+    _set_nsfw_tag,
+    nsfw_tag_pnginfo,
     is_sfw_enforced_for_current_session,
 )
+from ...constants import NSFW_BATCH_SIZE
 # --- CONFIGURATION ---
 SCORE_THRESHOLD = 0.50  
 
 # ----------------------------------------------------------------------------
 # PART 1: The Scanner
 # ----------------------------------------------------------------------------
-def check_tensor_nsfw(images_tensor):
+def scan_tensor_nsfw(images_tensor):
+    """
+    Returns (blocked, verdicts): a per-frame list of block flags, and a
+    per-frame list of classifier (label, score) verdicts - or None when
+    no scan ran (SFW off for the user, empty batch) or it failed. A
+    failed scan blocks every frame (fail-safe).
+    """
+    if images_tensor is None or len(images_tensor) == 0:
+        return [], None
+    count = len(images_tensor)
+
     # 1. CHECK USER PERMISSIONS FIRST
     # Use quiet mode to reduce logging during node execution
     if not is_sfw_enforced_for_current_session(quiet=True):
         # print("[Usgromana] 🛡️ SFW Disabled for this user. Bypassing scan.")
-        return False
+        return [False] * count, None
 
     # 2. Run Scan
-    print("[Usgromana] 🔍 Interceptor: Analysis starting...")
+    print(f"[Usgromana] 🔍 Interceptor: Analysis starting ({count} image(s))...")
     pipeline = _get_nsfw_pipeline()
     if pipeline is None:
         print("[Usgromana] ⚠️ WARN: Model failed. BLOCKING (Fail-Safe).")
-        return True 
+        return [True] * count, None
 
     try:
-        if images_tensor is None or len(images_tensor) == 0: return False
-        
-        i = 255. * images_tensor[0].cpu().numpy()
-        img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-        
-        results = pipeline(img)
-        # print(f"[Usgromana] 🔍 Raw Output: {results}")
-
-        if not results: return False
-            
-        top = results[0]
-        label = top.get("label", "").lower()
-        score = float(top.get("score", 0.0))
-        
-        print(f"[Usgromana] 🔍 Decision: Label='{label}' Score={score:.4f}")
-
-        if label == "nsfw" and score > SCORE_THRESHOLD:
-            print(f"[Usgromana] 🛑 BLOCKED NSFW (Score {score:.4f})")
-            return True
-            
+        verdicts = classify_tensor_frames(pipeline, images_tensor, NSFW_BATCH_SIZE)
     except Exception as e:
         print(f"[Usgromana] ❌ Interceptor Error: {e}")
-        return True 
-    
-    return False
+        return [True] * count, None
+
+    blocked = []
+    for index, (label, score) in enumerate(verdicts):
+        print(f"[Usgromana] 🔍 Decision #{index}: Label='{label}' Score={score:.4f}")
+        is_bad = label == "nsfw" and score > SCORE_THRESHOLD
+        if is_bad:
+            print(f"[Usgromana] 🛑 BLOCKED NSFW #{index} (Score {score:.4f})")
+        blocked.append(is_bad)
+    return blocked, verdicts
+
+
+def check_tensor_nsfw(images_tensor):
+    return any(scan_tensor_nsfw(images_tensor)[0])
+
+
+def _tag_saved_images(node, result, tags, embedded):
+    """
+    Record the per-frame verdicts for the files a save node just wrote.
+    `embedded` tags are already in the PNGs and only need indexing; the
+    rest are written with a chunk-level metadata edit. None = untagged.
+    """
+    try:
+        output_dir = node.output_dir
+        for item, tag in zip(result["ui"]["images"], tags):
+            if tag is None:
+                continue
+            path = os.path.join(output_dir, item.get("subfolder", ""), item["filename"])
+            if embedded:
+                _index_nsfw_tag(path, *tag)
+            else:
+                _set_nsfw_tag(path, *tag)
+    except (AttributeError, KeyError, TypeError) as e:
+        print(f"[Usgromana] ⚠️ Could not tag saved images: {e}")
 
 # ----------------------------------------------------------------------------
 # PART 2: The Kill Switch
@@ -93,20 +120,44 @@ def install_node_interceptor():
         return
 
     def intercepted_wrapper(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None, mode="unknown"):
-        is_bad = check_tensor_nsfw(images)
+        blocked, verdicts = scan_tensor_nsfw(images)
 
-        if is_bad:
-            print(f"[Usgromana] 🛑 BLOCKED {mode}: Replacing with BLACK SQUARE.")
-            black_images = torch.zeros_like(images)
-            if mode == "save":
-                return original_save(self, black_images, filename_prefix, prompt, extra_pnginfo)
+        if any(blocked):
+            if all(blocked):
+                print(f"[Usgromana] 🛑 BLOCKED {mode}: Replacing with BLACK SQUARE.")
+                images = torch.zeros_like(images)
             else:
-                return original_preview(self, black_images, filename_prefix, prompt, extra_pnginfo)
+                print(f"[Usgromana] 🛑 BLOCKED {mode}: Blanking {sum(blocked)} of {len(blocked)} image(s).")
+                images = images.clone()
+                images[torch.tensor(blocked, device=images.device)] = 0
+        
+        # Tag each saved file with its frame's verdict so it is never
+        # reopened and reclassified on first /view. Blanked frames are left
+        # untagged (the file is a black frame). A single image gets the tag
+        # in the PNG ComfyUI is about to write; extra_pnginfo is shared by
+        # the whole batch, so batches are tagged right after the save. So
+        # is everything under --disable-metadata, which drops extra_pnginfo.
+        tags = None
+        if verdicts is not None:
+            tags = [
+                None if is_bad else (label == "nsfw" and score > SCORE_THRESHOLD, score, label)
+                for is_bad, (label, score) in zip(blocked, verdicts)
+            ]
+        embedded = (
+            tags is not None and len(tags) == 1 and tags[0] is not None
+            and not getattr(args, "disable_metadata", False)
+        )
+        if embedded:
+            extra_pnginfo = {**(extra_pnginfo or {}), **nsfw_tag_pnginfo(*tags[0])}
         
         if mode == "save":
-            return original_save(self, images, filename_prefix, prompt, extra_pnginfo)
+            result = original_save(self, images, filename_prefix, prompt, extra_pnginfo)
         else:
-            return original_preview(self, images, filename_prefix, prompt, extra_pnginfo)
+            result = original_preview(self, images, filename_prefix, prompt, extra_pnginfo)
+        
+        if tags is not None and any(tag is not None for tag in tags):
+            _tag_saved_images(self, result, tags, embedded)
+        return result
 
     def save_patch(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
         return intercepted_wrapper(self, images, filename_prefix, prompt, extra_pnginfo, mode="save")
@@ -1,18 +1,23 @@
 # --- START OF FILE utils/nsfw_guard.py ---
 import os
+import re
 import json
-from functools import lru_cache
+import time
+import asyncio
+import threading
 from typing import Optional, Tuple, Dict
 
 from PIL import Image
-from PIL import PngImagePlugin
 from PIL.ExifTags import TAGS
-from transformers import pipeline
 
 import folder_paths
 import comfy.model_management as model_management
 
 from ...globals import users_db, current_username_var
+from ...constants import NSFW_LOADING_POLICY, NSFW_LOADING_WAIT_SECONDS, NSFW_TAG_INDEX_FILE, NSFW_TAG_STORE
+from .tag_index import NSFWTagIndex
+from .image_metadata import read_png_text, update_png_text, read_jpeg_exif, read_jpeg_exif_tags, write_jpeg_exif
+from ..metrics import registry as metrics, CACHE_TOTAL, NSFW_CLASSIFY_SECONDS, NSFW_CLASSIFIER_CALLS
 
 # --- CONFIGURATION ---
 # Using Falconsai for stricter detection
@@ -24,6 +29,13 @@ NSFW_METADATA_KEY = "UsgromanaNSFW"
 NSFW_SCORE_KEY = "UsgromanaNSFWScore"
 NSFW_LABEL_KEY = "UsgromanaNSFWLabel"
 
+# Text chunks / EXIF tags the tag reader looks at
+_PNG_TAG_KEYS = (NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY, "Keywords", "Comment")
+_EXIF_USER_COMMENT = 0x9286  # Exif IFD
+_EXIF_XP_COMMENT = 0x9C9C    # IFD0
+_EXIF_XP_KEYWORDS = 0x9C9E   # IFD0
+_SCORE_RE = re.compile(r'Score:\s*([\d.]+)')
+
 # --- GLOBAL STATE (The Bridge) ---
 # This variable holds the username of the person who most recently
 # queued a prompt. It bridges the Web Server and the Worker Thread.
@@ -33,10 +45,117 @@ _LATEST_PROMPT_USER = "guest"
 _SFW_CACHE = {}  # {username: (sfw_flag, last_logged_username)}
 _LAST_LOGGED_USER = None
 
+# Metrics
+_TAG_CACHE_HITS = metrics.counter(CACHE_TOTAL, cache="nsfw_tag", result="hit")
+_TAG_CACHE_MISSES = metrics.counter(CACHE_TOTAL, cache="nsfw_tag", result="miss")
+_TAG_INDEX_HITS = metrics.counter(CACHE_TOTAL, cache="nsfw_tag_index", result="hit")
+_TAG_INDEX_MISSES = metrics.counter(CACHE_TOTAL, cache="nsfw_tag_index", result="miss")
+_CLASSIFIER_CALLS = metrics.counter(NSFW_CLASSIFIER_CALLS)
+_CLASSIFY_SECONDS = metrics.histogram(NSFW_CLASSIFY_SECONDS)
+
+
+# --- TAG INDEX ---
+_TAG_INDEX = None
+_TAG_INDEX_OPENED = False
+_TAG_INDEX_LOCK = threading.Lock()
+
+
+def _get_tag_index() -> Optional[NSFWTagIndex]:
+    """The sidecar tag index, opened on first use (None if disabled or broken)."""
+    global _TAG_INDEX, _TAG_INDEX_OPENED
+    if _TAG_INDEX_OPENED:
+        return _TAG_INDEX
+
+    with _TAG_INDEX_LOCK:
+        if not _TAG_INDEX_OPENED:
+            if NSFW_TAG_INDEX_FILE:
+                try:
+                    _TAG_INDEX = NSFWTagIndex(NSFW_TAG_INDEX_FILE)
+                except Exception as e:
+                    print(f"[Usgromana::NSFWGuard] ⚠️ Tag index unavailable, reading tags from images: {e}")
+            _TAG_INDEX_OPENED = True
+    return _TAG_INDEX
+
 
 def _get_nsfw_tag(path: str) -> Optional[Dict]:
+    """
+    Get the NSFW tag of an image: from the sidecar index when it is
+    current for the file, else from the embedded metadata (which is then
+    indexed, so the image is opened once per change).
+
+    Returns:
+        Dict with keys: is_nsfw, score, label
+        or None if not tagged
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    index = _get_tag_index()
+    if index is not None:
+        try:
+            tag = index.get(path, st)
+        except Exception as e:
+            print(f"[Usgromana::NSFWGuard] Tag index lookup failed for {path}: {e}")
+            tag = None
+        if tag is not None:
+            _TAG_INDEX_HITS.inc()
+            return tag
+        _TAG_INDEX_MISSES.inc()
+
+    tag = _read_embedded_nsfw_tag(path)
+    if tag is not None and index is not None:
+        try:
+            index.put(path, tag["is_nsfw"], tag["score"], tag["label"], st)
+        except Exception as e:
+            print(f"[Usgromana::NSFWGuard] Could not index tag for {path}: {e}")
+    return tag
+
+
+def _index_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
+    index = _get_tag_index()
+    if index is None:
+        return
+    try:
+        index.put(path, is_nsfw, score, label)
+    except Exception as e:
+        print(f"[Usgromana::NSFWGuard] Could not index tag for {path}: {e}")
+
+
+def _unindex_nsfw_tag(path: str):
+    index = _get_tag_index()
+    if index is None:
+        return
+    try:
+        index.remove(path)
+    except Exception as e:
+        print(f"[Usgromana::NSFWGuard] Could not drop indexed tag for {path}: {e}")
+
+
+def _tag_from_user_comment(user_comment) -> Optional[Dict]:
+    """Parse our "NSFW:{json}" EXIF UserComment."""
+    if isinstance(user_comment, bytes):
+        user_comment = user_comment.decode('utf-8', errors='ignore')
+    if not user_comment.startswith('NSFW:'):
+        return None
+    try:
+        data = json.loads(user_comment[5:].rstrip('\x00'))
+        return {
+            "is_nsfw": data.get("is_nsfw", False),
+            "score": data.get("score", 0.0),
+            "label": data.get("label", "")
+        }
+    except (json.JSONDecodeError, ValueError, AttributeError):
+        return None
+
+
+def _read_embedded_nsfw_tag(path: str) -> Optional[Dict]:
     """
     Get NSFW tag directly from image metadata.
+
+    PNG and JPEG tags are read from the file headers only (text chunks
+    before IDAT / EXIF segment before SOS); no image object is created.
     
     Returns:
         Dict with keys: is_nsfw, score, label
@@ -46,17 +165,18 @@ def _get_nsfw_tag(path: str) -> Optional[Dict]:
         if not os.path.exists(path):
             return None
         
-        img = Image.open(path)
         ext = os.path.splitext(path)[1].lower()
         
-        # For PNG: Check info metadata
+        # For PNG: Check text chunks
         if ext in ('.png',):
-            info = img.info
-            # First check our custom keys (primary source)
+            info = read_png_text(path, keys=_PNG_TAG_KEYS, stop_at_idat=True)
+            # First check our custom keys (primary source). Tags written at
+            # save time went through extra_pnginfo, which ComfyUI stores
+            # JSON-encoded (label '"nsfw"'), hence the strip('"').
             if NSFW_METADATA_KEY in info:
-                is_nsfw = info.get(NSFW_METADATA_KEY, '').lower() == 'true'
-                score = float(info.get(NSFW_SCORE_KEY, '0.0'))
-                label = info.get(NSFW_LABEL_KEY, '')
+                is_nsfw = info.get(NSFW_METADATA_KEY, '').strip('"').lower() == 'true'
+                score = float(info.get(NSFW_SCORE_KEY, '0.0').strip('"'))
+                label = info.get(NSFW_LABEL_KEY, '').strip('"')
                 result = {
                     "is_nsfw": is_nsfw,
                     "score": score,
@@ -73,8 +193,7 @@ def _get_nsfw_tag(path: str) -> Optional[Dict]:
                     score = 0.5  # Default score
                     label = "nsfw"
                     # Try to extract score from comment
-                    import re
-                    score_match = re.search(r'Score:\s*([\d.]+)', comment)
+                    score_match = _SCORE_RE.search(comment)
                     if score_match:
                         score = float(score_match.group(1))
                     result = {
@@ -83,78 +202,44 @@ def _get_nsfw_tag(path: str) -> Optional[Dict]:
                         "label": label
                     }
                     return result
+            return None
         
         # For JPEG: Check EXIF (both our custom tag and Windows-readable fields)
-        elif ext in ('.jpg', '.jpeg'):
-            try:
-                # Try piexif first (more reliable)
-                try:
-                    import piexif
-                    exif_dict = piexif.load(img.info.get('exif', b''))
-                    
-                    # Check our custom UserComment first
-                    if "Exif" in exif_dict and piexif.ExifIFD.UserComment in exif_dict["Exif"]:
-                        user_comment = exif_dict["Exif"][piexif.ExifIFD.UserComment]
-                        if isinstance(user_comment, bytes):
-                            user_comment = user_comment.decode('utf-8', errors='ignore')
-                        if user_comment.startswith('NSFW:'):
-                            try:
-                                data = json.loads(user_comment[5:])
-                                return {
-                                    "is_nsfw": data.get("is_nsfw", False),
-                                    "score": data.get("score", 0.0),
-                                    "label": data.get("label", "")
-                                }
-                            except (json.JSONDecodeError, ValueError):
-                                pass
-                    
-                    # Fallback: Check Windows XPKeywords field
-                    if "0th" in exif_dict and piexif.ImageIFD.XPKeywords in exif_dict["0th"]:
-                        keywords = exif_dict["0th"][piexif.ImageIFD.XPKeywords]
-                        if isinstance(keywords, bytes):
-                            keywords = keywords.decode('utf-16le', errors='ignore')
-                        if "nsfw" in keywords.lower():
-                            # Extract score from XPComment if available
-                            score = 0.5
-                            label = "nsfw"
-                            if "0th" in exif_dict and piexif.ImageIFD.XPComment in exif_dict["0th"]:
-                                comment = exif_dict["0th"][piexif.ImageIFD.XPComment]
-                                if isinstance(comment, bytes):
-                                    comment = comment.decode('utf-16le', errors='ignore')
-                                import re
-                                score_match = re.search(r'Score:\s*([\d.]+)', comment)
-                                if score_match:
-                                    score = float(score_match.group(1))
-                            return {
-                                "is_nsfw": True,
-                                "score": score,
-                                "label": label
-                            }
-                except ImportError:
-                    # Fallback to PIL's basic EXIF
-                    exif = img.getexif()
-                    if exif:
-                        # Use UserComment tag (0x9286)
-                        user_comment = exif.get(0x9286)
-                        if user_comment and isinstance(user_comment, (str, bytes)):
-                            if isinstance(user_comment, bytes):
-                                user_comment = user_comment.decode('utf-8', errors='ignore')
-                            # Check if it's our NSFW data
-                            if user_comment.startswith('NSFW:'):
-                                try:
-                                    data = json.loads(user_comment[5:])
-                                    return {
-                                        "is_nsfw": data.get("is_nsfw", False),
-                                        "score": data.get("score", 0.0),
-                                        "label": data.get("label", "")
-                                    }
-                                except (json.JSONDecodeError, ValueError):
-                                    pass
-            except Exception:
-                pass
+        if ext in ('.jpg', '.jpeg'):
+            exif = read_jpeg_exif_tags(
+                path,
+                ifd0_tags=(_EXIF_XP_KEYWORDS, _EXIF_XP_COMMENT),
+                exif_tags=(_EXIF_USER_COMMENT,),
+            )
+            
+            # Check our custom UserComment first
+            if _EXIF_USER_COMMENT in exif:
+                tag = _tag_from_user_comment(exif[_EXIF_USER_COMMENT])
+                if tag is not None:
+                    return tag
+            
+            # Fallback: Check Windows XPKeywords field
+            if _EXIF_XP_KEYWORDS in exif:
+                keywords = exif[_EXIF_XP_KEYWORDS].decode('utf-16le', errors='ignore')
+                if "nsfw" in keywords.lower():
+                    # Extract score from XPComment if available
+                    score = 0.5
+                    label = "nsfw"
+                    if _EXIF_XP_COMMENT in exif:
+                        comment = exif[_EXIF_XP_COMMENT].decode('utf-16le', errors='ignore')
+                        score_match = _SCORE_RE.search(comment)
+                        if score_match:
+                            score = float(score_match.group(1))
+                    return {
+                        "is_nsfw": True,
+                        "score": score,
+                        "label": label
+                    }
+            return None
         
         # For other formats, try to read from info
-        info = img.info
+        with Image.open(path) as img:
+            info = img.info
         if NSFW_METADATA_KEY in info:
             is_nsfw = info.get(NSFW_METADATA_KEY, '').lower() == 'true'
             score = float(info.get(NSFW_SCORE_KEY, '0.0'))
@@ -171,7 +256,36 @@ def _get_nsfw_tag(path: str) -> Optional[Dict]:
     return None
 
 
+def nsfw_tag_pnginfo(is_nsfw: bool, score: float, label: str) -> Dict:
+    """
+    The NSFW tag as extra_pnginfo entries, so SaveImage writes it into the
+    PNG it is encoding anyway. Empty when tags are kept in the index only.
+    """
+    if NSFW_TAG_STORE == "index" and _get_tag_index() is not None:
+        return {}
+    return {
+        NSFW_METADATA_KEY: bool(is_nsfw),
+        NSFW_SCORE_KEY: round(float(score), 6),
+        NSFW_LABEL_KEY: str(label),
+    }
+
+
 def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
+    """
+    Set NSFW tag in the image metadata and the sidecar index.
+
+    The index entry is written after the image, against its new
+    signature; it is written even if the format can't hold metadata.
+    With nsfw_tag_store = "index" the image is not touched at all
+    (see export_nsfw_tags_to_images).
+    """
+    if NSFW_TAG_STORE != "index" or _get_tag_index() is None:
+        _write_embedded_nsfw_tag(path, is_nsfw, score, label)
+    if os.path.exists(path):
+        _index_nsfw_tag(path, is_nsfw, score, label)
+
+
+def _write_embedded_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
     """
     Set NSFW tag directly in image metadata.
     
@@ -185,62 +299,52 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
         if not os.path.exists(path):
             return
         
-        img = Image.open(path)
         ext = os.path.splitext(path)[1].lower()
         
-        # For PNG: Use PngInfo + Windows-compatible metadata
+        # For PNG: swap the text chunks (incl. Windows-compatible fields),
+        # the image data itself is copied untouched
         if ext in ('.png',):
-            # Read existing PNG info or create new
-            pnginfo = PngImagePlugin.PngInfo()
-            # Copy ALL existing text chunks (preserve existing metadata)
-            # Exclude only the NSFW-related keys we're about to overwrite
-            nsfw_keys_to_exclude = {NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY, "Keywords", "Subject", "Comment"}
-            for key, value in img.info.items():
-                # Preserve all metadata keys except NSFW ones we're overwriting
-                if key not in nsfw_keys_to_exclude:
-                    pnginfo.add_text(key, str(value))
+            existing = read_png_text(path)
             
-            # Add NSFW metadata to PNG text chunks (for our code to read)
-            pnginfo.add_text(NSFW_METADATA_KEY, str(is_nsfw).lower())
-            pnginfo.add_text(NSFW_SCORE_KEY, str(score))
-            pnginfo.add_text(NSFW_LABEL_KEY, label)
+            # NSFW metadata in PNG text chunks (for our code to read)
+            items = [
+                (NSFW_METADATA_KEY, str(is_nsfw).lower()),
+                (NSFW_SCORE_KEY, str(score)),
+                (NSFW_LABEL_KEY, label),
+            ]
             
             # Also add to Windows-readable fields (Keywords/Tags field in Windows Properties)
             # Windows reads "Keywords" from PNG tEXt chunks - this is what shows in Properties > Details > Tags
-            existing_keywords = img.info.get("Keywords", None)
-            existing_subject = img.info.get("Subject", None)
-            existing_comment = img.info.get("Comment", None)
+            existing_keywords = existing.get("Keywords", None)
+            existing_subject = existing.get("Subject", None)
+            existing_comment = existing.get("Comment", None)
             
             if is_nsfw:
                 # Add to Keywords field (Windows Properties shows this in Tags)
                 # Preserve existing keywords if they're not NSFW-related
                 if existing_keywords and "nsfw" not in str(existing_keywords).lower():
-                    pnginfo.add_text("Keywords", f"{existing_keywords}, NSFW")
+                    items.append(("Keywords", f"{existing_keywords}, NSFW"))
                 else:
-                    pnginfo.add_text("Keywords", "NSFW")
+                    items.append(("Keywords", "NSFW"))
                 
                 # Preserve existing Subject if it's not NSFW-related, otherwise update with NSFW info
                 if existing_subject and "NSFW Content" not in str(existing_subject):
                     # Preserve existing subject, append NSFW info
-                    pnginfo.add_text("Subject", f"{existing_subject} | NSFW Content (Score: {score:.2f})")
+                    items.append(("Subject", f"{existing_subject} | NSFW Content (Score: {score:.2f})"))
                 else:
                     # No existing subject or it's already NSFW-related, set new one
-                    pnginfo.add_text("Subject", f"NSFW Content (Score: {score:.2f})")
+                    items.append(("Subject", f"NSFW Content (Score: {score:.2f})"))
                 
                 # Preserve existing Comment if it's not NSFW-related, otherwise update with NSFW info
                 if existing_comment and "NSFW Content Detected" not in str(existing_comment):
                     # Preserve existing comment, append NSFW info
-                    pnginfo.add_text("Comment", f"{existing_comment} | NSFW Content Detected - Score: {score:.2f}, Label: {label}")
+                    items.append(("Comment", f"{existing_comment} | NSFW Content Detected - Score: {score:.2f}, Label: {label}"))
                 else:
                     # No existing comment or it's already NSFW-related, set new one
-                    pnginfo.add_text("Comment", f"NSFW Content Detected - Score: {score:.2f}, Label: {label}")
-            else:
-                # If SFW, preserve existing Windows-readable fields (they're already excluded from preservation loop above)
-                # So we don't need to add them back here - they're already preserved
-                pass
+                    items.append(("Comment", f"NSFW Content Detected - Score: {score:.2f}, Label: {label}"))
+            # If SFW, existing Windows-readable fields are left as they are
             
-            # Save with metadata
-            img.save(path, "PNG", pnginfo=pnginfo, optimize=False)
+            update_png_text(path, items)
         
         # For JPEG: Use EXIF (Windows-readable)
         elif ext in ('.jpg', '.jpeg'):
@@ -256,7 +360,7 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
                     # Load existing EXIF or create new
                     exif_dict = {}
                     try:
-                        exif_dict = piexif.load(img.info.get('exif', b''))
+                        exif_dict = read_jpeg_exif(path)
                     except:
                         exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None}
                     
@@ -310,11 +414,12 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
                             exif_dict["0th"][piexif.ImageIFD.XPComment] = f"NSFW Content Detected - Score: {score:.2f}, Label: {label}".encode('utf-16le')
                     # If SFW, preserve existing Windows-readable fields (don't overwrite)
                     
-                    # Convert back to bytes and save
-                    exif_bytes = piexif.dump(exif_dict)
-                    img.save(path, "JPEG", quality=95, exif=exif_bytes, optimize=False)
+                    # Splice the new EXIF segment in (no re-compression)
+                    write_jpeg_exif(path, exif_dict)
                 if not piexif_available:
-                    # Fallback: Use PIL's basic EXIF (less reliable but no extra dependency)
+                    # Fallback: Use PIL's basic EXIF (less reliable but no extra dependency).
+                    # This re-encodes the image; install piexif to avoid it.
+                    img = Image.open(path)
                     exif_dict = {}
                     if hasattr(img, 'getexif'):
                         exif_dict = dict(img.getexif())
@@ -333,12 +438,12 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
                     # Save with EXIF
                     img.save(path, "JPEG", quality=95, exif=exif_bytes if exif_bytes else None, optimize=False)
             except Exception as e:
-                # If EXIF writing fails, at least try to save the image
+                # The image is left as it was; the tag index still records the tag
                 print(f"[Usgromana::NSFWGuard] Warning: Could not write EXIF to {path}: {e}")
-                img.save(path, "JPEG", quality=95, optimize=False)
         
         # For other formats: Try to save in info
         else:
+            img = Image.open(path)
             # Create a copy with metadata in info
             info = img.info.copy()
             info[NSFW_METADATA_KEY] = str(is_nsfw).lower()
@@ -388,53 +493,40 @@ def clear_nsfw_tag(path: str):
     Args:
         path: Image file path
     """
-    
+    _unindex_nsfw_tag(path)
+
     try:
         if not os.path.exists(path):
             return
         
-        img = Image.open(path)
         ext = os.path.splitext(path)[1].lower()
         
-        # For PNG: Remove only NSFW-related metadata, preserve everything else
+        # For PNG: Remove only NSFW-related text chunks, everything else is copied as is
         if ext in ('.png',):
-            pnginfo = PngImagePlugin.PngInfo()
-            # Copy ALL existing text chunks, but filter out NSFW-related content
-            excluded_nsfw_keys = {NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY}
+            existing = read_png_text(path)
+            items = []
+            # Our custom NSFW keys always go
+            remove_keys = {NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY}
             
-            for key, value in img.info.items():
-                # Skip our custom NSFW keys
-                if key in excluded_nsfw_keys:
-                    continue
-                
-                # For Keywords, Subject, and Comment fields, remove only NSFW-related content
-                if key == "Keywords":
-                    keywords_str = str(value)
-                    # Remove NSFW from keywords list, preserve other keywords
-                    keywords_list = [k.strip() for k in keywords_str.split(',') if k.strip()]
-                    filtered_keywords = [k for k in keywords_list if k.upper() not in ("NSFW", "SFW")]
-                    if filtered_keywords:
-                        # Preserve the cleaned keywords
-                        pnginfo.add_text(key, ", ".join(filtered_keywords))
-                    # If no keywords remain after filtering, don't add the field (removes NSFW-only keywords)
-                elif key == "Subject":
-                    subject_str = str(value)
-                    # Only remove if it's clearly our NSFW Subject field
-                    if "NSFW Content" not in subject_str:
-                        # Preserve non-NSFW subject
-                        pnginfo.add_text(key, str(value))
-                elif key == "Comment":
-                    comment_str = str(value)
-                    # Only remove if it's clearly our NSFW Comment field
-                    if "NSFW Content Detected" not in comment_str:
-                        # Preserve non-NSFW comments
-                        pnginfo.add_text(key, str(value))
-                else:
-                    # Preserve all other metadata fields
-                    pnginfo.add_text(key, str(value))
+            # For Keywords, Subject, and Comment fields, remove only NSFW-related content
+            if "Keywords" in existing:
+                # Remove NSFW from keywords list, preserve other keywords
+                keywords_list = [k.strip() for k in str(existing["Keywords"]).split(',') if k.strip()]
+                filtered_keywords = [k for k in keywords_list if k.upper() not in ("NSFW", "SFW")]
+                if not filtered_keywords:
+                    # If no keywords remain after filtering, drop the field (removes NSFW-only keywords)
+                    remove_keys.add("Keywords")
+                elif filtered_keywords != keywords_list:
+                    # Preserve the cleaned keywords
+                    items.append(("Keywords", ", ".join(filtered_keywords)))
+            # Only remove Subject/Comment if they're clearly our NSFW fields
+            if "NSFW Content" in str(existing.get("Subject", "")):
+                remove_keys.add("Subject")
+            if "NSFW Content Detected" in str(existing.get("Comment", "")):
+                remove_keys.add("Comment")
             
-            # Save with preserved metadata (NSFW tags removed)
-            img.save(path, "PNG", pnginfo=pnginfo, optimize=False)
+            # Rewrites the file only if something actually changes
+            update_png_text(path, items, remove_keys)
         
         # For JPEG: Remove only NSFW-related metadata, preserve everything else
         elif ext in ('.jpg', '.jpeg'):
@@ -445,9 +537,10 @@ def clear_nsfw_tag(path: str):
                 # Load existing EXIF
                 exif_dict = {}
                 try:
-                    exif_dict = piexif.load(img.info.get('exif', b''))
+                    exif_dict = read_jpeg_exif(path)
                 except:
                     exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None}
+                changed = False
                 
                 # Remove NSFW data from UserComment (only if it's our NSFW data)
                 if "Exif" in exif_dict and piexif.ExifIFD.UserComment in exif_dict["Exif"]:
@@ -455,6 +548,7 @@ def clear_nsfw_tag(path: str):
                     if isinstance(user_comment, bytes) and user_comment.startswith(b"NSFW:"):
                         # Only remove if it's our NSFW tag
                         del exif_dict["Exif"][piexif.ExifIFD.UserComment]
+                        changed = True
                 
                 # For Windows-readable fields, remove only NSFW-related content, preserve other content
                 if "0th" in exif_dict:
@@ -465,12 +559,14 @@ def clear_nsfw_tag(path: str):
                             keywords_str = keywords_bytes.decode('utf-16le', errors='ignore')
                             keywords_list = [k.strip() for k in keywords_str.split(',') if k.strip()]
                             filtered_keywords = [k for k in keywords_list if k.upper() not in ("NSFW", "SFW")]
-                            if filtered_keywords:
-                                # Preserve cleaned keywords
-                                exif_dict["0th"][piexif.ImageIFD.XPKeywords] = ", ".join(filtered_keywords).encode('utf-16le')
-                            else:
+                            if not filtered_keywords:
                                 # Remove if only NSFW keywords existed
                                 del exif_dict["0th"][piexif.ImageIFD.XPKeywords]
+                                changed = True
+                            elif filtered_keywords != keywords_list:
+                                # Preserve cleaned keywords
+                                exif_dict["0th"][piexif.ImageIFD.XPKeywords] = ", ".join(filtered_keywords).encode('utf-16le')
+                                changed = True
                     
                     # XPSubject - only remove if it's clearly our NSFW Subject field
                     if piexif.ImageIFD.XPSubject in exif_dict["0th"]:
@@ -480,6 +576,7 @@ def clear_nsfw_tag(path: str):
                             if "NSFW Content" in subject_str:
                                 # Remove our NSFW Subject field
                                 del exif_dict["0th"][piexif.ImageIFD.XPSubject]
+                                changed = True
                             # Otherwise preserve it
                     
                     # XPComment - only remove if it's clearly our NSFW Comment field
@@ -490,13 +587,15 @@ def clear_nsfw_tag(path: str):
                             if "NSFW Content Detected" in comment_str:
                                 # Remove our NSFW Comment field
                                 del exif_dict["0th"][piexif.ImageIFD.XPComment]
+                                changed = True
                             # Otherwise preserve it
                 
-                # Convert back to bytes and save (preserving all non-NSFW metadata)
-                exif_bytes = piexif.dump(exif_dict)
-                img.save(path, "JPEG", quality=95, exif=exif_bytes, optimize=False)
+                # Splice the cleaned EXIF back in (preserving all non-NSFW metadata)
+                if changed:
+                    write_jpeg_exif(path, exif_dict)
             except ImportError:
-                # Fallback: Use PIL's basic EXIF
+                # Fallback: Use PIL's basic EXIF (re-encodes the image)
+                img = Image.open(path)
                 exif_dict = {}
                 if hasattr(img, 'getexif'):
                     exif = img.getexif()
@@ -534,11 +633,174 @@ def set_latest_prompt_user(username: str | None):
     print(f"[Usgromana::NSFWGuard] set_latest_prompt_user → {effective!r}")
 
 
-@lru_cache(maxsize=1)
+# --- MODEL READINESS ---
+# idle -> loading -> ready | failed. The model is loaded once, either by the
+# warmup thread (start_model_warmup) or by the first classification.
+MODEL_IDLE = "idle"
+MODEL_LOADING = "loading"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
+
+# What a caller passing loading_policy gets while the model isn't loaded
+LOADING_WAIT = "wait"    # caller awaits the model (no thread held) up to a timeout
+LOADING_ALLOW = "allow"  # treat untagged images as safe
+LOADING_BLOCK = "block"  # refuse untagged images
+
+
+class NSFWModelLoading(Exception):
+    """The classifier is still loading (see should_block_image_for_current_user)."""
+
+
+_MODEL_LOCK = threading.Lock()
+_MODEL_SETTLED = threading.Event()  # set once the model is ready or failed
+_MODEL_WAITERS = []  # (loop, future) of coroutines awaiting _MODEL_SETTLED
+_MODEL_WAITERS_LOCK = threading.Lock()
+_MODEL_STATUS = {
+    "state": MODEL_IDLE,
+    "error": None,
+    "started_at": None,
+    "ready_at": None,
+    "warmed_up": False,
+}
+_PIPELINE = None
+_WARMUP_THREAD = None
+_WARMUP_LOCK = threading.Lock()
+
+
 def _get_nsfw_pipeline():
+    """
+    Return the classification pipeline, loading it on first use.
+    Concurrent callers wait for the one load; a failed load is not retried
+    (None is returned, as before).
+    """
+    global _PIPELINE
+    if _MODEL_SETTLED.is_set():
+        return _PIPELINE
+
+    with _MODEL_LOCK:
+        if not _MODEL_SETTLED.is_set():
+            _MODEL_STATUS["state"] = MODEL_LOADING
+            _MODEL_STATUS["started_at"] = time.time()
+            try:
+                _PIPELINE = _load_nsfw_pipeline()
+            except Exception as e:
+                _PIPELINE = None
+                _MODEL_STATUS["error"] = str(e)
+            if _PIPELINE is None:
+                _MODEL_STATUS["state"] = MODEL_FAILED
+                _MODEL_STATUS["error"] = _MODEL_STATUS["error"] or "Failed to load NSFW model"
+            else:
+                _MODEL_STATUS["state"] = MODEL_READY
+                _MODEL_STATUS["ready_at"] = time.time()
+            _MODEL_SETTLED.set()
+            _wake_model_waiters()
+
+    return _PIPELINE
+
+
+def _warmup_model():
+    clf = _get_nsfw_pipeline()
+    if clf is None:
+        return
+    try:
+        # One dummy inference so the first real request doesn't pay for
+        # kernel selection / lazy weight moves
+        clf(Image.new("RGB", (224, 224)))
+        _MODEL_STATUS["warmed_up"] = True
+        elapsed = time.time() - (_MODEL_STATUS["started_at"] or time.time())
+        print(f"[Usgromana::NSFWGuard] ✅ NSFW model ready ({elapsed:.1f}s)")
+    except Exception as e:
+        print(f"[Usgromana::NSFWGuard] ⚠️ Warmup inference failed: {e}")
+
+
+def start_model_warmup() -> bool:
+    """
+    Load the classifier and run a dummy inference on a background thread.
+    Returns False if a warmup already started or the model is already loaded.
+    """
+    global _WARMUP_THREAD
+    with _WARMUP_LOCK:
+        if _WARMUP_THREAD is not None or _MODEL_SETTLED.is_set():
+            return False
+        _WARMUP_THREAD = threading.Thread(
+            target=_warmup_model, name="usgromana-nsfw-warmup", daemon=True
+        )
+        _WARMUP_THREAD.start()
+        return True
+
+
+def wait_for_nsfw_model(timeout: Optional[float] = None) -> bool:
+    """Block until the model is ready or failed; False on timeout."""
+    return _MODEL_SETTLED.wait(timeout)
+
+
+def _wake_model_waiters():
+    """Resolve the futures of wait_for_nsfw_model_async, each on its own loop."""
+    with _MODEL_WAITERS_LOCK:
+        waiters = _MODEL_WAITERS[:]
+        _MODEL_WAITERS.clear()
+    for loop, future in waiters:
+        try:
+            loop.call_soon_threadsafe(_resolve_waiter, future)
+        except RuntimeError:
+            pass  # loop already closed
+
+
+def _resolve_waiter(future):
+    if not future.done():
+        future.set_result(True)
+
+
+async def wait_for_nsfw_model_async(timeout: Optional[float] = None) -> bool:
+    """
+    Await the model being ready or failed; False on timeout.
+    Unlike wait_for_nsfw_model, no thread is held while waiting: the
+    loader wakes the caller's event loop when it settles.
+    """
+    if _MODEL_SETTLED.is_set():
+        return True
+
+    loop = asyncio.get_running_loop()
+    waiter = (loop, loop.create_future())
+    with _MODEL_WAITERS_LOCK:
+        # Checked under the lock: the loader sets the event before it
+        # takes the waiter list, so a waiter added here is always woken
+        if _MODEL_SETTLED.is_set():
+            return True
+        _MODEL_WAITERS.append(waiter)
+
+    try:
+        return await asyncio.wait_for(waiter[1], timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        with _MODEL_WAITERS_LOCK:
+            if waiter in _MODEL_WAITERS:
+                _MODEL_WAITERS.remove(waiter)
+
+
+def get_nsfw_model_status() -> Dict:
+    """Readiness of the classifier, for the API and the admin panel."""
+    status = dict(_MODEL_STATUS)
+    started = status["started_at"]
+    if status["state"] == MODEL_LOADING and started:
+        status["loading_seconds"] = round(time.time() - started, 1)
+    elif status["ready_at"] and started:
+        status["load_seconds"] = round(status["ready_at"] - started, 1)
+    status["warmup_running"] = _WARMUP_THREAD is not None and _WARMUP_THREAD.is_alive()
+    status["loading_policy"] = NSFW_LOADING_POLICY
+    status["loading_wait_seconds"] = NSFW_LOADING_WAIT_SECONDS
+    return status
+
+
+def _load_nsfw_pipeline():
     """
     Load the HuggingFace image-classification pipeline.
     Handles auto-downloading and device selection (CUDA/MPS/CPU).
+
+    transformers is imported here rather than at module level: it takes
+    seconds to import, and only actual classification needs it (tag reads
+    and permission checks don't).
     """
     base = folder_paths.base_path
     local_model_dir = os.path.join(base, "models", "nsfw_detector", MODEL_FOLDER_NAME)
@@ -568,10 +830,13 @@ def _get_nsfw_pipeline():
 
     # 3. Initialize Pipeline
     try:
+        from transformers import pipeline
+
         clf = pipeline("image-classification", model=model_source, device=pipe_device)
         return clf
     except Exception as e:
         print(f"[Usgromana::NSFWGuard] ❌ CRITICAL: Failed to load NSFW model. Error: {e}")
+        _MODEL_STATUS["error"] = str(e)
         return None
 
 
@@ -598,6 +863,8 @@ def _classify_image_path(path: str, use_cache: bool = True) -> Optional[Tuple[st
     if clf is None:
         return None
 
+    _CLASSIFIER_CALLS.inc()
+    start = time.perf_counter()
     try:
         with Image.open(path) as img:
             img = img.convert("RGB")
@@ -605,10 +872,28 @@ def _classify_image_path(path: str, use_cache: bool = True) -> Optional[Tuple[st
     except Exception as e:
         print(f"[Usgromana::NSFWGuard] Error reading image {path}: {e}")
         return None
+    finally:
+        _CLASSIFY_SECONDS.observe(time.perf_counter() - start)
 
     if not result:
         return None
     
+    label, score = _verdict_from_results(result)
+    
+    # 3. Determine if NSFW (only trust model's explicit "nsfw" label)
+    # Removed strict heuristic - it was causing too many false positives
+    # Only block if model explicitly says "nsfw" with score > 0.5
+    is_nsfw = (label == "nsfw" and score > 0.5)
+    
+    # Cache the result
+    if use_cache:
+        _set_nsfw_tag(path, is_nsfw, score, label)
+    
+    return label, score
+
+
+def _verdict_from_results(result) -> Tuple[str, float]:
+    """(label, score) from classifier output, preferring the "nsfw" entry."""
     # Find NSFW label in all results (hypothesis A: model returns multiple labels)
     nsfw_result = None
     normal_result = None
@@ -627,19 +912,69 @@ def _classify_image_path(path: str, use_cache: bool = True) -> Optional[Tuple[st
         top = result[0]
         label = top.get("label", "").lower()
         score = float(top.get("score", 0.0))
-    
-    # 3. Determine if NSFW (only trust model's explicit "nsfw" label)
-    # Removed strict heuristic - it was causing too many false positives
-    # Only block if model explicitly says "nsfw" with score > 0.5
-    is_nsfw = (label == "nsfw" and score > 0.5)
-    
-    # Cache the result
-    if use_cache:
-        _set_nsfw_tag(path, is_nsfw, score, label)
-    
     return label, score
 
 
+def classify_tensor_results(pipeline, images_tensor, batch_size: int = 8):
+    """
+    Run the classifier on every frame of a [B, H, W, C] 0..1 image tensor.
+
+    Frames go through the model `batch_size` at a time. Resizing and
+    normalization happen on the tensor's device (see tensor_preprocess),
+    so only model-sized input is transferred; processors that can't be
+    mirrored get uint8 frames instead (still no PIL image per frame).
+    Pipelines without an image_processor/model pair, and models that
+    aren't single-label classifiers (whose scores aren't a softmax), fall
+    back to a batched pipeline call.
+
+    Returns:
+        Per frame, the pipeline-style [{"label", "score"}, ...] list,
+        highest score first
+    """
+    import torch
+    from .tensor_preprocess import tensor_pixel_values
+
+    batch_size = max(1, int(batch_size))
+    processor = getattr(pipeline, "image_processor", None)
+    model = getattr(pipeline, "model", None)
+    config = getattr(model, "config", None)
+    if (
+        processor is None or config is None
+        or config.num_labels < 2
+        or getattr(config, "problem_type", None) not in (None, "single_label_classification")
+    ):
+        frames = (images_tensor[..., :3].clamp(0, 1) * 255).round().to(torch.uint8).cpu().numpy()
+        return pipeline([Image.fromarray(frame) for frame in frames], batch_size=batch_size)
+
+    id2label = config.id2label
+    frame_results = []
+    with torch.inference_mode():
+        for start in range(0, len(images_tensor), batch_size):
+            chunk = images_tensor[start:start + batch_size]
+            pixel_values = tensor_pixel_values(chunk, processor, model.device, model.dtype)
+            if pixel_values is None:
+                frames = (chunk[..., :3].clamp(0, 1) * 255).round().to(torch.uint8).cpu().numpy()
+                inputs = processor(images=list(frames), return_tensors="pt").to(model.device)
+                pixel_values = inputs["pixel_values"].to(model.dtype)
+            probs = model(pixel_values=pixel_values).logits.softmax(-1).float().cpu().tolist()
+            for row in probs:
+                results = [{"label": id2label[i], "score": p} for i, p in enumerate(row)]
+                results.sort(key=lambda r: r["score"], reverse=True)
+                frame_results.append(results)
+    return frame_results
+
+
+def classify_tensor_frames(pipeline, images_tensor, batch_size: int = 8):
+    """
+    Classify every frame of a [B, H, W, C] 0..1 image tensor (see
+    classify_tensor_results).
+
+    Returns:
+        One (label, score) per frame
+    """
+    return [_verdict_from_results(r) for r in classify_tensor_results(pipeline, images_tensor, batch_size)]
+
+
 def _resolve_effective_username() -> str:
     """
     Decide which username to use for policy:
@@ -751,7 +1086,23 @@ def clear_sfw_cache(username: str | None = None):
         _LAST_LOGGED_USER = None
 
 
-def should_block_image_for_current_user(path: str, quiet: bool = False, use_cache: bool = True) -> bool:
+def _on_users_changed(event: str, user_id: str | None, username: str | None):
+    """users_db change listener: keep _SFW_CACHE in sync with user edits."""
+    if event == "reloaded" or not username:
+        clear_sfw_cache()
+    else:
+        clear_sfw_cache(username)
+
+
+users_db.add_change_listener(_on_users_changed)
+
+
+def should_block_image_for_current_user(
+    path: str,
+    quiet: bool = False,
+    use_cache: bool = True,
+    loading_policy: Optional[str] = None,
+) -> bool:
     """
     Main function called by __init__.py middleware to check static files.
     Uses cache for fast lookups - only scans if not cached.
@@ -760,6 +1111,10 @@ def should_block_image_for_current_user(path: str, quiet: bool = False, use_cach
         path: Path to the image file
         quiet: If True, suppresses logging (useful for batch operations)
         use_cache: If True, check cache before scanning (default: True)
+        loading_policy: If set, never load the model inline. While it is
+            loading (a warmup is started if needed), "allow" returns False
+            and "wait"/"block" raise NSFWModelLoading so the caller can wait
+            off the event loop or refuse the request.
     """
     # 1. Check Permissions
     sfw_enforced = is_sfw_enforced_for_current_session(quiet=quiet)
@@ -770,7 +1125,10 @@ def should_block_image_for_current_user(path: str, quiet: bool = False, use_cach
     # 2. Check cache first (fast path)
     if use_cache:
         tag = _get_nsfw_tag(path)
-        if tag is not None:
+        if tag is None:
+            _TAG_CACHE_MISSES.inc()
+        else:
+            _TAG_CACHE_HITS.inc()
             cached_is_nsfw = tag.get("is_nsfw", False)
             
             # Only block if explicitly marked as NSFW in cache
@@ -788,6 +1146,12 @@ def should_block_image_for_current_user(path: str, quiet: bool = False, use_cach
                 return False
 
     # 3. Scan image (slow path, only if not cached)
+    if loading_policy is not None and not _MODEL_SETTLED.is_set():
+        start_model_warmup()
+        if loading_policy == LOADING_ALLOW:
+            return False
+        raise NSFWModelLoading(path)
+
     cls = _classify_image_path(path, use_cache=use_cache)
     if cls is None:
         # Fail open (allow) if model is broken
@@ -884,13 +1248,121 @@ def fix_incorrectly_cached_tags():
     return fixed_count
 
 
+def rebuild_nsfw_tag_index(directory: Optional[str] = None) -> Dict:
+    """
+    Rebuild the sidecar tag index from the metadata embedded in the images.
+    
+    Args:
+        directory: Folder to index (default: the output directory, in which
+                   case the whole index is reset first - unless tags are
+                   stored in the index only, where it is the only copy)
+    
+    Returns:
+        dict with stats: {"indexed": int, "untagged": int, "errors": int}
+    """
+    stats = {"indexed": 0, "untagged": 0, "errors": 0}
+    index = _get_tag_index()
+    if index is None:
+        print("[Usgromana::NSFWGuard] Tag index is disabled (nsfw_tag_index_db), nothing to rebuild")
+        return stats
+
+    index_only = NSFW_TAG_STORE == "index"
+    if directory is None:
+        directory = folder_paths.get_output_directory()
+        if not index_only:
+            index.clear()
+
+    print(f"[Usgromana::NSFWGuard] Rebuilding tag index from images in: {directory}")
+    batch = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if not file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                continue
+            path = os.path.join(root, file)
+            try:
+                # Stat first: if the file changes while we read it, the
+                # entry simply won't match and the image is re-read later
+                st = os.stat(path)
+                if index_only and index.get(path, st) is not None:
+                    stats["indexed"] += 1
+                    continue
+                tag = _read_embedded_nsfw_tag(path)
+                if tag is None:
+                    stats["untagged"] += 1
+                    continue
+                batch.append((path, st, tag))
+                if len(batch) >= 500:
+                    stats["indexed"] += index.put_many(batch)
+                    batch = []
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"[Usgromana::NSFWGuard] Error indexing {path}: {e}")
+    if batch:
+        stats["indexed"] += index.put_many(batch)
+
+    print(
+        f"[Usgromana::NSFWGuard] Tag index rebuilt: {stats['indexed']} tagged, "
+        f"{stats['untagged']} untagged, {stats['errors']} errors"
+    )
+    return stats
+
+
+def export_nsfw_tags_to_images(directory: Optional[str] = None) -> Dict:
+    """
+    Embed indexed tags into the images they belong to.
+
+    Meant for nsfw_tag_store = "index", where tags are only kept in the
+    sidecar index: this writes them into the files (e.g. before moving
+    the images elsewhere). Images already carrying the same tag are left
+    alone; rewritten ones are re-indexed against their new signature.
+    
+    Returns:
+        dict with stats: {"exported": int, "unchanged": int, "errors": int}
+    """
+    stats = {"exported": 0, "unchanged": 0, "errors": 0}
+    index = _get_tag_index()
+    if index is None:
+        print("[Usgromana::NSFWGuard] Tag index is disabled (nsfw_tag_index_db), nothing to export")
+        return stats
+
+    if directory is None:
+        directory = folder_paths.get_output_directory()
+
+    print(f"[Usgromana::NSFWGuard] Embedding indexed tags into images in: {directory}")
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if not file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                continue
+            path = os.path.join(root, file)
+            try:
+                tag = index.get(path)
+                if tag is None:
+                    continue
+                embedded = _read_embedded_nsfw_tag(path)
+                if embedded is not None and embedded.get("is_nsfw") == tag["is_nsfw"]:
+                    stats["unchanged"] += 1
+                    continue
+                _write_embedded_nsfw_tag(path, tag["is_nsfw"], tag["score"], tag["label"])
+                _index_nsfw_tag(path, tag["is_nsfw"], tag["score"], tag["label"])
+                stats["exported"] += 1
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"[Usgromana::NSFWGuard] Error exporting tag for {path}: {e}")
+
+    print(
+        f"[Usgromana::NSFWGuard] Tag export complete: {stats['exported']} written, "
+        f"{stats['unchanged']} already embedded, {stats['errors']} errors"
+    )
+    return stats
+
+
 def scan_all_images_in_output_directory(force_rescan: bool = False):
     """
     Scan all images in the output directory for NSFW content.
     Useful for batch scanning or forcing a rescan of all images.
     
     Args:
-        force_rescan: If True, clear existing tags and rescan all images.
+        force_rescan: If True, rescan all images and overwrite existing tags.
                      If False, only scan images without tags.
     
     Returns:
@@ -910,10 +1382,6 @@ def scan_all_images_in_output_directory(force_rescan: bool = False):
             if file.lower().endswith(('.png', '.jpg', '.jpeg')):
                 path = os.path.join(root, file)
                 try:
-                    # If force_rescan, clear existing tag first
-                    if force_rescan:
-                        clear_nsfw_tag(path)
-                    
                     # Check if already tagged (skip if not forcing rescan)
                     if not force_rescan:
                         tag = _get_nsfw_tag(path)
@@ -923,12 +1391,15 @@ def scan_all_images_in_output_directory(force_rescan: bool = False):
                                 nsfw_count += 1
                             continue
                     
-                    # Scan the image
-                    cls = _classify_image_path(path, use_cache=True)
+                    # Scan the image; the new tag replaces any old one in a
+                    # single write (no separate clear pass)
+                    cls = _classify_image_path(path, use_cache=False)
                     if cls:
                         label, score = cls
                         scanned_count += 1
-                        if label == "nsfw" and score > 0.5:
+                        is_nsfw = label == "nsfw" and score > 0.5
+                        _set_nsfw_tag(path, is_nsfw, score, label)
+                        if is_nsfw:
                             nsfw_count += 1
                 except Exception as e:
                     error_count += 1
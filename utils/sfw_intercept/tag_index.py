@@ -0,0 +1,152 @@
+# utils/sfw_intercept/tag_index.py
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class NSFWTagIndex:
+    """
+    Sidecar index of NSFW tags (SQLite, WAL mode).
+
+    Rows are keyed by absolute path and remember the file's
+    (mtime_ns, size, inode) at the time it was tagged, so a lookup is one
+    os.stat() and one primary-key query instead of opening the image. A
+    row whose signature no longer matches the file is treated as missing:
+    the image was replaced or rewritten and has to be looked at again.
+
+    The metadata embedded in the images stays the source of truth; the
+    index can be thrown away and rebuilt from it at any time.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS nsfw_tags (
+            path       TEXT PRIMARY KEY,
+            mtime_ns   INTEGER NOT NULL,
+            size       INTEGER NOT NULL,
+            inode      INTEGER NOT NULL,
+            is_nsfw    INTEGER NOT NULL,
+            score      REAL NOT NULL,
+            label      TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    # --- helpers ---
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> tuple:
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    # --- lookups / updates ---
+
+    def get(self, path: str, st: Optional[os.stat_result] = None) -> Optional[Dict]:
+        """Tag of the file as indexed, or None if unknown or the file changed since."""
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size, inode, is_nsfw, score, label FROM nsfw_tags WHERE path = ?",
+                (self._key(path),),
+            ).fetchone()
+
+        if row is None or row[:3] != self._signature(st):
+            return None
+        return {"is_nsfw": bool(row[3]), "score": row[4], "label": row[5]}
+
+    def put(
+        self,
+        path: str,
+        is_nsfw: bool,
+        score: float,
+        label: str,
+        st: Optional[os.stat_result] = None,
+    ) -> bool:
+        """Index a tag against the file's current signature; False if the file is gone."""
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO nsfw_tags "
+                "(path, mtime_ns, size, inode, is_nsfw, score, label, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._key(path),
+                    *self._signature(st),
+                    int(bool(is_nsfw)),
+                    float(score),
+                    str(label or ""),
+                    time.time(),
+                ),
+            )
+        return True
+
+    def put_many(self, rows) -> int:
+        """Bulk put of (path, stat_result, tag dict) rows in one transaction."""
+        now = time.time()
+        values = [
+            (
+                self._key(path),
+                *self._signature(st),
+                int(bool(tag.get("is_nsfw", False))),
+                float(tag.get("score", 0.0)),
+                str(tag.get("label", "") or ""),
+                now,
+            )
+            for path, st, tag in rows
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO nsfw_tags "
+                    "(path, mtime_ns, size, inode, is_nsfw, score, label, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    values,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(values)
+
+    def remove(self, path: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM nsfw_tags WHERE path = ?", (self._key(path),))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM nsfw_tags")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM nsfw_tags").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,46 @@
+# utils/sfw_intercept/tensor_preprocess.py
+#
+# Classifier input straight from ComfyUI image tensors, without the
+# tensor -> numpy -> PIL -> processor round trip.
+
+import torch
+import torch.nn.functional as F
+
+# PIL resample filter id -> torch interpolate mode
+_RESAMPLE_MODES = {0: "nearest", 2: "bilinear", 3: "bicubic"}
+
+
+def tensor_pixel_values(images_tensor, processor, device, dtype):
+    """
+    The model input for a [B, H, W, C] 0..1 image tensor, computed on the
+    tensor's own device: resize to the processor's fixed size, rescale and
+    normalize there, then move only the model-sized result to `device`.
+
+    Mirrors what the (Hugging Face) image processor would do with the
+    PIL image. Returns None for processor setups this doesn't reproduce
+    (shortest-edge sizing, center crops, other filters); the caller
+    then goes through the processor itself.
+    """
+    size = getattr(processor, "size", None) or {}
+    height, width = size.get("height"), size.get("width")
+    mode = _RESAMPLE_MODES.get(int(getattr(processor, "resample", 2)))
+    if not height or not width or mode is None or getattr(processor, "do_center_crop", False):
+        return None
+
+    x = images_tensor[..., :3].movedim(-1, 1).float().clamp(0, 1)
+    if getattr(processor, "do_resize", True) and tuple(x.shape[-2:]) != (height, width):
+        if mode == "nearest":
+            x = F.interpolate(x, size=(height, width), mode=mode)
+        else:
+            x = F.interpolate(x, size=(height, width), mode=mode, align_corners=False, antialias=True)
+            x = x.clamp(0, 1)
+    # The tensor is already pixel/255; the processor would rescale 0..255 values
+    if getattr(processor, "do_rescale", True):
+        x = x * (255.0 * float(getattr(processor, "rescale_factor", 1 / 255)))
+    else:
+        x = x * 255.0
+    if getattr(processor, "do_normalize", False):
+        mean = torch.tensor(processor.image_mean, dtype=x.dtype, device=x.device).view(1, -1, 1, 1)
+        std = torch.tensor(processor.image_std, dtype=x.dtype, device=x.device).view(1, -1, 1, 1)
+        x = (x - mean) / std
+    return x.to(device=device, dtype=dtype)
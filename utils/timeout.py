@@ -1,68 +1,205 @@
+import time
+from collections import OrderedDict, deque
 from typing import Optional
 from aiohttp import web
 from datetime import datetime, timezone, timedelta
 
 from .ip_filter import IPFilter, get_ip
 
+
+class AttemptTracker:
+    """
+    Sliding-window failure counter with TTL eviction and a hard size cap.
+
+    Each key keeps the timestamps of its recent failures (at most
+    `max_attempts`, older ones no longer matter) and an optional lockout
+    deadline. Entries are kept in last-activity order, so expired ones
+    collect at the front; every call sweeps a few of them, and the oldest
+    entry is evicted when `max_entries` is exceeded.
+    """
+
+    SWEEP_BATCH = 32
+
+    def __init__(self, window: float, max_entries: int, max_attempts: int):
+        self.window = window
+        self.max_entries = max(1, int(max_entries))
+        self.max_attempts = max(1, int(max_attempts))
+
+        # key -> [deque of failure times, lockout deadline]
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: list, now: float) -> bool:
+        times, locked_until = entry
+        return (not times or times[-1] + self.window <= now) and locked_until <= now
+
+    def _sweep(self, now: float) -> None:
+        entries = self._entries
+        for _ in range(self.SWEEP_BATCH):
+            if not entries:
+                return
+            key = next(iter(entries))
+            if not self._expired(entries[key], now):
+                return
+            del entries[key]
+
+    def _get(self, key, now: float) -> Optional[list]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry, now):
+            del self._entries[key]
+            return None
+        times = entry[0]
+        while times and times[0] + self.window <= now:
+            times.popleft()
+        return entry
+
+    def add(self, key, now: float) -> int:
+        """Record a failure and return the number of failures in the window."""
+        self._sweep(now)
+        entry = self._get(key, now)
+        if entry is None:
+            entry = [deque(maxlen=self.max_attempts), 0.0]
+            self._entries[key] = entry
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        entry[0].append(now)
+        return len(entry[0])
+
+    def count(self, key, now: float) -> int:
+        entry = self._get(key, now)
+        return len(entry[0]) if entry else 0
+
+    def lock(self, key, until: float) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] = max(entry[1], until)
+
+    def locked_for(self, key, now: float) -> float:
+        """Seconds left on the key's lockout (0 if none)."""
+        entry = self._get(key, now)
+        if entry is None:
+            return 0.0
+        return max(0.0, entry[1] - now)
+
+    def remove(self, key) -> None:
+        self._entries.pop(key, None)
+
+
 class Timeout:
-    def __init__(self, ip_filter: IPFilter, blacklist_after_attempts: int = 0):
+    # Failures of one IP (across usernames) get the same lockout ladder,
+    # scaled by this factor, so username spraying can't dodge lockouts
+    IP_THRESHOLD_FACTOR = 3
+
+    def __init__(
+        self,
+        ip_filter: IPFilter,
+        blacklist_after_attempts: int = 0,
+        window: float = 900,
+        max_entries: int = 10000,
+    ):
         self.ip_filter = ip_filter
         self.blacklist_after_attempts = blacklist_after_attempts
 
-        self._failed_attempts_ip = {}
-        self._timeout_end_time_ip = {}
+        # Lockouts are tracked per (ip, username) ...
+        self._user_attempts = AttemptTracker(window, max_entries, 9)
+        # ... and per ip for spraying lockouts and auto-blacklisting
+        self._ip_attempts = AttemptTracker(
+            window, max_entries, max(9 * self.IP_THRESHOLD_FACTOR, blacklist_after_attempts)
+        )
 
-    def get_failed_attempts(self, ip: str) -> int:
-        """Get the number of failed attempts for a given IP."""
-        return self._failed_attempts_ip.get(ip, 0)
+    @staticmethod
+    def _timeout_duration(failed_attempts: int) -> int:
+        if failed_attempts >= 9:
+            return 300
+        elif failed_attempts >= 6:
+            return 90
+        elif failed_attempts >= 3:
+            return 60
+        return 0
 
-    def add_failed_attempt(self, ip: str) -> None:
-        """Add a failed attempt for a given IP and set timeout or blacklist IP if necessary."""
-        whitelist, _ = self.ip_filter.load_filter_list()
+    def get_failed_attempts(self, ip: str, username: Optional[str] = None) -> int:
+        """Get the number of recent failed attempts for a given IP and username."""
+        return self._user_attempts.count((ip, username), time.monotonic())
 
-        if ip in whitelist:
+    def add_failed_attempt(self, ip: str, username: Optional[str] = None) -> None:
+        """Add a failed attempt for a given IP/username and set timeout or blacklist IP if necessary."""
+        if self.ip_filter.is_whitelisted(ip):
             return
 
-        self._failed_attempts_ip[ip] = self._failed_attempts_ip.get(ip, 0) + 1
-        failed_attempts = self._failed_attempts_ip[ip]
+        now = time.monotonic()
+        failed_attempts = self._user_attempts.add((ip, username), now)
+        ip_failed_attempts = self._ip_attempts.add(ip, now)
 
         if not self.blacklist_after_attempts == 0:
-            if failed_attempts >= self.blacklist_after_attempts:
+            if ip_failed_attempts >= self.blacklist_after_attempts:
                 self.ip_filter.add_to_blacklist(ip)
 
-        timeout_duration = 0
-        if failed_attempts >= 9:
-            timeout_duration = 300
-        elif failed_attempts >= 6:
-            timeout_duration = 90
-        elif failed_attempts >= 3:
-            timeout_duration = 60
-
+        timeout_duration = self._timeout_duration(failed_attempts)
         if timeout_duration > 0:
-            self._timeout_end_time_ip[ip] = datetime.now(timezone.utc) + timedelta(
-                seconds=timeout_duration
-            )
-
-    def remove_failed_attempts(self, ip: str) -> None:
-        """Remove failed attempts and timeout for a given IP."""
-        self._failed_attempts_ip.pop(ip, None)
-        self._timeout_end_time_ip.pop(ip, None)
-
-    def get_timeout_end_time(self, ip: str) -> Optional[datetime]:
-        """Get the timeout end time for a given IP."""
-        return self._timeout_end_time_ip.get(ip)
-
-    def check_is_timed_out(self, ip: str) -> tuple[bool, int, int]:
-        """Check if a given IP is currently timed out."""
-        timeout_end_time = self.get_timeout_end_time(ip)
-
-        if timeout_end_time and datetime.now(timezone.utc) < timeout_end_time:
-            remaining_seconds = round(
-                (timeout_end_time - datetime.now(timezone.utc)).total_seconds()
-            )
-            return True, self.get_failed_attempts(ip), remaining_seconds
-
-        return False, self.get_failed_attempts(ip), 0
+            self._user_attempts.lock((ip, username), now + timeout_duration)
+
+        ip_timeout_duration = self._timeout_duration(ip_failed_attempts // self.IP_THRESHOLD_FACTOR)
+        if ip_timeout_duration > 0:
+            self._ip_attempts.lock(ip, now + ip_timeout_duration)
+
+    def remove_failed_attempts(self, ip: str, username: Optional[str] = None) -> None:
+        """Remove failed attempts and timeout for a given IP and username."""
+        self._user_attempts.remove((ip, username))
+
+    def _remaining_seconds(self, ip: str, username: Optional[str]) -> float:
+        now = time.monotonic()
+        return max(
+            self._user_attempts.locked_for((ip, username), now),
+            self._ip_attempts.locked_for(ip, now),
+        )
+
+    def get_timeout_end_time(self, ip: str, username: Optional[str] = None) -> Optional[datetime]:
+        """Get the timeout end time for a given IP and username."""
+        remaining = self._remaining_seconds(ip, username)
+        if remaining <= 0:
+            return None
+        return datetime.now(timezone.utc) + timedelta(seconds=remaining)
+
+    def check_is_timed_out(self, ip: str, username: Optional[str] = None) -> tuple[bool, int, int]:
+        """Check if a given IP/username is currently timed out."""
+        remaining = self._remaining_seconds(ip, username)
+
+        if remaining > 0:
+            return True, self.get_failed_attempts(ip, username), round(remaining)
+
+        return False, self.get_failed_attempts(ip, username), 0
+
+    def check_request(self, request: web.Request) -> web.Response | None:
+        """Return a "too many attempts" response if the request's IP/username is timed out."""
+        username = request.get("_sanitized_data", {}).get("username")
+        is_timed_out, failed_attempts, remaining_seconds = (
+            self.check_is_timed_out(get_ip(request), username)
+        )
+
+        if not is_timed_out:
+            return None
+
+        minutes, seconds = divmod(int(remaining_seconds), 60)
+
+        if minutes > 0:
+            remaining_time = f"{minutes} minute{'s' if minutes > 1 else ''} and {seconds} second{'s' if seconds > 1 else ''}"
+        else:
+            remaining_time = f"{seconds} second{'s' if seconds > 1 else ''}"
+
+        return web.json_response(
+            {
+                "error": f"Too many failed attempts. Please wait {remaining_time}",
+                "failed_attempts": failed_attempts,
+                "remaining_seconds": remaining_seconds,
+            },
+            status=403,
+        )
 
     def create_time_out_middleware(self, limited: tuple = ()) -> web.middleware:
         """Create middleware for handling timeouts."""
@@ -71,26 +208,9 @@ class Timeout:
         async def time_out_middleware(request: web.Request, handler) -> web.Response:
             """Middleware to handle request timeouts."""
             if request.path in limited and request.method == "POST":
-                is_timed_out, failed_attempts, remaining_seconds = (
-                    self.check_is_timed_out(get_ip(request))
-                )
-
-                if is_timed_out:
-                    minutes, seconds = divmod(int(remaining_seconds), 60)
-
-                    if minutes > 0:
-                        remaining_time = f"{minutes} minute{'s' if minutes > 1 else ''} and {seconds} second{'s' if seconds > 1 else ''}"
-                    else:
-                        remaining_time = f"{seconds} second{'s' if seconds > 1 else ''}"
-
-                    return web.json_response(
-                        {
-                            "error": f"Too many failed attempts. Please wait {remaining_time}",
-                            "failed_attempts": failed_attempts,
-                            "remaining_seconds": remaining_seconds,
-                        },
-                        status=403,
-                    )
+                timed_out = self.check_request(request)
+                if timed_out is not None:
+                    return timed_out
 
             return await handler(request)
 
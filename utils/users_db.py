@@ -1,65 +1,179 @@
-import bcrypt
-import json
-import os
-import hashlib
+import time
 from pathlib import Path
 
+from .password_hasher import PasswordHasher
+from .users_storage import UsersStorage, JsonUsersStorage
+
+
+class UsernameTaken(ValueError):
+    """Raised when inserting a user whose username already exists."""
+
+    def __init__(self, username: str):
+        super().__init__(f"Username {username!r} already exists")
+        self.username = username
+
 
 class UsersDB:
-    def __init__(self, database: str | Path):
+    def __init__(
+        self,
+        database: str | Path,
+        recheck_interval: float = 0.0,
+        storage: UsersStorage | None = None,
+        hasher: PasswordHasher | None = None,
+    ):
         self.database = database
+        # Persistence backend (users.json by default, or SQLite)
+        self.storage = storage if storage is not None else JsonUsersStorage(database)
+
+        # Bounded executor for bcrypt work done on behalf of async routes
+        self.hasher = hasher if hasher is not None else PasswordHasher()
+
+        # Minimum seconds between two change checks of the backing store
+        self.recheck_interval = recheck_interval
 
         # Stored as: { user_id: { username, password, admin?, groups? } }
         self.users: dict = {}
         self.admin_user: tuple[str | None, dict] = (None, {})
 
-        self._database_hash: str | None = None
+        # Secondary indexes, rebuilt whenever self.users is replaced
+        self._username_index: dict[str, str] = {}
+        self._admin_ids: tuple[str, ...] = ()
+        self._group_index: dict[str, tuple[str, ...]] = {}
+
+        self._last_check: float | None = None
+
+        # Callbacks (event, user_id, username) fired after the store changes.
+        # event is "added", "updated", "deleted" or "reloaded" (ids are None then).
+        self._change_listeners: list = []
 
         self.load_users()
 
     # ----------------------------
-    # Password + file helpers
+    # Password helpers
     # ----------------------------
 
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash a password using bcrypt."""
-        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-    def calculate_file_hash(self) -> str:
-        """Calculate the SHA256 hash of the database file."""
-        if os.path.exists(self.database):
-            with open(self.database, "rb") as f:
-                file_data = f.read()
-                return hashlib.sha256(file_data).hexdigest()
-        return ""
+        return PasswordHasher.hash_sync(password)
 
     # ----------------------------
     # Load / save
     # ----------------------------
 
     def load_users(self) -> dict:
-        """Load users from the database if it has changed."""
-        current_hash = self.calculate_file_hash()
-        if current_hash != self._database_hash:
-            if os.path.exists(self.database):
-                with open(self.database, "r", encoding="utf-8") as f:
-                    try:
-                        self.users = json.load(f)
-                    except json.JSONDecodeError:
-                        self.users = {}
-                # 🔧 Migration / safety: ensure groups exist for all users
-                self._ensure_groups_schema()
-                self._database_hash = self.calculate_file_hash()
-            else:
-                self.users = {}
+        """Load users from the storage backend if it has changed."""
+        now = time.monotonic()
+        if (
+            self.recheck_interval
+            and self._last_check is not None
+            and now - self._last_check < self.recheck_interval
+        ):
+            return self.users
+        self._last_check = now
+
+        users = self.storage.load()
+        if users is not None:
+            self._set_users(users)
+            # 🔧 Migration / safety: ensure groups exist for all users
+            self._ensure_groups_schema()
+            self._notify_change("reloaded", None, None)
         return self.users
 
     def save_users(self, users: dict) -> None:
-        """Save users to the database and update the hash."""
-        with open(self.database, "w", encoding="utf-8") as f:
-            json.dump(users, f)
-        self._database_hash = self.calculate_file_hash()
+        """Save all users to the storage backend and refresh the indexes."""
+        self.storage.save_all(users)
+        self._set_users(users)
+
+    # ----------------------------
+    # Change listeners
+    # ----------------------------
+
+    def add_change_listener(self, callback) -> None:
+        """
+        Register callback(event, user_id, username), called after users are
+        added, updated, deleted or reloaded from the store. Used to invalidate
+        dependent caches (token cache, SFW cache, ...).
+        """
+        self._change_listeners.append(callback)
+
+    def _notify_change(self, event: str, user_id: str | None, username: str | None) -> None:
+        for callback in list(self._change_listeners):
+            try:
+                callback(event, user_id, username)
+            except Exception as e:
+                print(f"[Usgromana] users_db change listener error: {e}")
+
+    # ----------------------------
+    # Indexes
+    # ----------------------------
+
+    @staticmethod
+    def _is_admin_record(user: dict) -> bool:
+        """True if the record has the admin flag or is in the admin group."""
+        if user.get("admin"):
+            return True
+        return "admin" in [g.lower() for g in user.get("groups", [])]
+
+    @classmethod
+    def _build_indexes(cls, users: dict) -> tuple[dict, tuple, dict]:
+        """Build (username -> id, admin ids, group -> ids) for a users dict."""
+        username_index: dict[str, str] = {}
+        admin_ids: list[str] = []
+        group_index: dict[str, list[str]] = {}
+        for uid, user in users.items():
+            username = user.get("username")
+            # First match wins, like the old linear scan
+            if username is not None and username not in username_index:
+                username_index[username] = uid
+            if cls._is_admin_record(user):
+                admin_ids.append(uid)
+            for group in {str(g).lower() for g in user.get("groups", [])}:
+                group_index.setdefault(group, []).append(uid)
+        return (
+            username_index,
+            tuple(admin_ids),
+            {g: tuple(ids) for g, ids in group_index.items()},
+        )
+
+    def _set_users(self, users: dict) -> None:
+        """Swap in a new users dict together with freshly built indexes."""
+        username_index, admin_ids, group_index = self._build_indexes(users)
+        self.users = users
+        self._username_index = username_index
+        self._admin_ids = admin_ids
+        self._group_index = group_index
+
+    def _index_user(self, uid: str, user: dict) -> None:
+        """Add a single new record to the indexes."""
+        username = user.get("username")
+        if username is not None and username not in self._username_index:
+            self._username_index = {**self._username_index, username: uid}
+        if self._is_admin_record(user) and uid not in self._admin_ids:
+            self._admin_ids = self._admin_ids + (uid,)
+        group_index = dict(self._group_index)
+        for group in {str(g).lower() for g in user.get("groups", [])}:
+            if uid not in group_index.get(group, ()):
+                group_index[group] = group_index.get(group, ()) + (uid,)
+        self._group_index = group_index
+
+    def _unindex_user(self, uid: str, user: dict, keep_username: bool = False) -> None:
+        """Remove a single record from the indexes."""
+        username = user.get("username")
+        if not keep_username and self._username_index.get(username) == uid:
+            username_index = dict(self._username_index)
+            del username_index[username]
+            self._username_index = username_index
+        if uid in self._admin_ids:
+            self._admin_ids = tuple(a for a in self._admin_ids if a != uid)
+        group_index = dict(self._group_index)
+        for group in {str(g).lower() for g in user.get("groups", [])}:
+            ids = tuple(i for i in group_index.get(group, ()) if i != uid)
+            if ids:
+                group_index[group] = ids
+            else:
+                group_index.pop(group, None)
+        self._group_index = group_index
 
     # ----------------------------
     # Schema helpers
@@ -87,13 +201,7 @@ class UsersDB:
     def _has_admin(self) -> bool:
         """Return True if any user has admin rights (admin flag OR admin group)."""
         self.load_users()
-        for _uid, user in self.users.items():
-            if user.get("admin"):
-                return True
-            groups = [g.lower() for g in user.get("groups", [])]
-            if "admin" in groups:
-                return True
-        return False
+        return bool(self._admin_ids)
 
     # ----------------------------
     # Public API
@@ -105,18 +213,43 @@ class UsersDB:
 
         Rules:
         - If this is the very first user and no admin exists → force admin + groups=["admin"]
-        - Otherwise:
-          - if admin=True → groups=["admin"]
-          - else → groups=["user"]
+        - admin=True is only honored while no admin exists yet (bootstrap);
+          later users are promoted with update_user
+        - admin → groups=["admin"], otherwise groups=["user"]
+
+        Raises UsernameTaken if the username already exists.
+        """
+        self._insert_user(id, username, self.hash_password(password), admin)
+
+    async def add_user_async(self, id: str, username: str, password: str, admin: bool) -> None:
+        """
+        Same as add_user, but bcrypt runs on the bounded hasher pool.
+        Raises PasswordHasherBusy when the pool is saturated.
+        """
+        password_hash = await self.hasher.hash(password)
+        self._insert_user(id, username, password_hash, admin)
+
+    def _insert_user(self, id: str, username: str, password_hash: str, admin: bool) -> None:
+        """
+        Insert a user whose password is already hashed (see add_user for the rules).
+
+        The checks are repeated here, after hashing: add_user_async awaits
+        bcrypt, so a concurrent registration may have landed meanwhile.
         """
         self.load_users()
 
+        if username in self._username_index:
+            raise UsernameTaken(username)
+
         # Determine if we already have an admin
         has_admin = self._has_admin()
 
         # First user and no admin yet? Force admin.
         if not has_admin and len(self.users) == 0:
             admin = True
+        # Someone else became the first admin meanwhile
+        elif has_admin:
+            admin = False
 
         # Assign groups based on admin flag
         if admin:
@@ -126,13 +259,61 @@ class UsersDB:
 
         user = {
             "username": username,
-            "password": self.hash_password(password),
+            "password": password_hash,
             "admin": bool(admin),
             "groups": groups,
         }
 
         self.users[id] = user
-        self.save_users(self.users)
+        self._index_user(id, user)
+        self.storage.save_user(self.users, id)
+        self._notify_change("added", id, username)
+
+    def update_user(
+        self,
+        username: str,
+        groups: list[str],
+        admin: bool,
+        sfw_check: bool | None = None,
+    ) -> bool:
+        """
+        Set a user's groups, admin flag and (optionally) SFW flag.
+        Updates memory and indexes in place and persists the single record.
+        Returns False if the user does not exist.
+        """
+        uid, user = self.get_user(username)
+        if uid is None:
+            return False
+
+        self._unindex_user(uid, user, keep_username=True)
+        user["groups"] = [g.lower() for g in groups]
+        user["admin"] = bool(admin)
+        if sfw_check is not None:
+            user["sfw_check"] = bool(sfw_check)
+        self._index_user(uid, user)
+
+        self.storage.save_user(self.users, uid)
+        self._notify_change("updated", uid, username)
+        return True
+
+    def delete_user(self, username: str) -> bool | str:
+        """
+        Delete a user. Returns True on success, False if the user does not
+        exist, or "last_admin" if it would remove the only admin.
+        """
+        uid, user = self.get_user(username)
+        if uid is None:
+            return False
+
+        if uid in self._admin_ids and len(self._admin_ids) <= 1:
+            return "last_admin"
+
+        self._unindex_user(uid, user)
+        del self.users[uid]
+
+        self.storage.delete_user(self.users, uid)
+        self._notify_change("deleted", uid, username)
+        return True
 
     def get_user(self, username: str = "", user_id: str = "") -> tuple[str | None, dict]:
         """Retrieve a user by username or user_id. Always returns (id, user_dict_or_empty)."""
@@ -144,21 +325,42 @@ class UsersDB:
                 return user_id, user
             return None, {}
 
-        for uid, user_data in self.users.items():
-            if user_data.get("username") == username:
+        uid = self._username_index.get(username)
+        if uid is not None:
+            user_data = self.users.get(uid)
+            if user_data is not None and user_data.get("username") == username:
                 return uid, user_data
 
         return None, {}
 
+    def get_users_in_group(self, group: str) -> list[tuple[str, dict]]:
+        """Return [(id, user_dict)] for every user in the given group."""
+        self.load_users()
+        result = []
+        for uid in self._group_index.get(group.lower(), ()):
+            user_data = self.users.get(uid)
+            if user_data is not None:
+                result.append((uid, user_data))
+        return result
+
     def check_username_password(self, username: str, password: str) -> bool:
         """Check if the username and password match."""
         user_id, user_data = self.get_user(username)
         if not user_id or not user_data:
             return False
 
-        return bcrypt.checkpw(
-            password.encode("utf-8"), user_data["password"].encode("utf-8")
-        )
+        return PasswordHasher.verify_sync(password, user_data["password"])
+
+    async def check_username_password_async(self, username: str, password: str) -> bool:
+        """
+        Same as check_username_password, but bcrypt runs on the bounded hasher
+        pool. Raises PasswordHasherBusy when the pool is saturated.
+        """
+        user_id, user_data = self.get_user(username)
+        if not user_id or not user_data:
+            return False
+
+        return await self.hasher.verify(password, user_data["password"])
 
     def get_admin_user(self) -> tuple[str | None, dict] | None:
         """
@@ -168,9 +370,9 @@ class UsersDB:
         self.load_users()
         self.admin_user = (None, {})
 
-        for uid, user_data in self.users.items():
-            groups = [g.lower() for g in user_data.get("groups", [])]
-            if user_data.get("admin") or "admin" in groups:
+        for uid in self._admin_ids:
+            user_data = self.users.get(uid)
+            if user_data is not None:
                 self.admin_user = (uid, user_data)
                 break
 
@@ -0,0 +1,286 @@
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# A file modified this close to the moment we stat'ed it may change again
+# without its mtime moving (coarse filesystem timestamps), so stat data that
+# recent is treated as ambiguous and confirmed with a content hash.
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+class UsersStorage(ABC):
+    """
+    Persistence backend for UsersDB.
+
+    Records are plain dicts keyed by user id:
+        { user_id: { username, password, admin?, groups?, sfw_check? } }
+    UsersDB keeps the authoritative in-memory copy; a backend only loads it
+    and persists changes.
+    """
+
+    @abstractmethod
+    def load(self) -> dict | None:
+        """Return all users, or None if nothing changed since the last load/save."""
+
+    @abstractmethod
+    def save_all(self, users: dict) -> None:
+        """Persist the full users dict."""
+
+    def save_user(self, users: dict, user_id: str) -> None:
+        """Persist a single inserted/updated record (users is the full dict)."""
+        self.save_all(users)
+
+    def delete_user(self, users: dict, user_id: str) -> None:
+        """Persist the removal of a record (users no longer contains it)."""
+        self.save_all(users)
+
+
+class JsonUsersStorage(UsersStorage):
+    """
+    users.json backend.
+
+    Change detection uses stat() (mtime_ns, size, inode) and only falls back
+    to a SHA-256 of the content when the stat data is ambiguous.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = path
+
+        self._hash: str | None = None
+        # (mtime_ns, size, inode) of the file when it was last loaded/saved
+        self._stat: tuple[int, int, int] | None = None
+        self._stat_time_ns: int = 0
+
+    def _stat_signature(self) -> tuple[int, int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _remember_stat(self, signature: tuple[int, int, int] | None) -> None:
+        self._stat = signature
+        self._stat_time_ns = time.time_ns()
+
+    def _stat_unchanged(self, signature: tuple[int, int, int] | None) -> bool:
+        """True if the stat data proves the file is unchanged since the last load."""
+        if signature is None or signature != self._stat:
+            return False
+        # Modified within the racy window of our last stat: can't tell from stat alone
+        return signature[0] + _RACY_WINDOW_NS < self._stat_time_ns
+
+    def load(self) -> dict | None:
+        signature = self._stat_signature()
+        if self._stat_unchanged(signature):
+            return None
+
+        if signature is None:
+            self._remember_stat(None)
+            if self._hash == "":
+                return None
+            self._hash = ""
+            return {}
+
+        with open(self.path, "rb") as f:
+            file_data = f.read()
+        current_hash = hashlib.sha256(file_data).hexdigest()
+        self._remember_stat(signature)
+
+        if current_hash == self._hash:
+            return None
+        self._hash = current_hash
+
+        try:
+            return json.loads(file_data.decode("utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return {}
+
+    def save_all(self, users: dict) -> None:
+        file_data = json.dumps(users).encode("utf-8")
+        with open(self.path, "wb") as f:
+            f.write(file_data)
+        self._hash = hashlib.sha256(file_data).hexdigest()
+        self._remember_stat(self._stat_signature())
+
+
+class SqliteUsersStorage(UsersStorage):
+    """
+    SQLite (WAL mode) backend.
+
+    Users are stored one row per id, so single-user edits are a row write
+    instead of a full-file rewrite. Lookups are answered by UsersDB's
+    in-memory indexes, not by queries.
+    On first use the database is filled once from an existing users.json.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id       TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            data     TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+        CREATE TABLE IF NOT EXISTS user_groups (
+            user_id    TEXT NOT NULL,
+            group_name TEXT NOT NULL,
+            PRIMARY KEY (user_id, group_name)
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_groups_group ON user_groups(group_name);
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str | Path, migrate_from: str | Path | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+        # PRAGMA data_version only moves when *another* connection commits,
+        # which is exactly the "someone else changed the store" signal we need.
+        self._data_version: int | None = None
+
+        if migrate_from:
+            self.migrate_from_json(migrate_from)
+
+    # --- helpers ---
+
+    def _current_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @staticmethod
+    def _groups_of(user: dict) -> set[str]:
+        groups = user.get("groups", [])
+        if not isinstance(groups, list):
+            return set()
+        return {str(g).lower() for g in groups}
+
+    def _write_user(self, user_id: str, user: dict) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO users (id, username, data) VALUES (?, ?, ?)",
+            (user_id, user.get("username", ""), json.dumps(user)),
+        )
+        self._conn.execute("DELETE FROM user_groups WHERE user_id = ?", (user_id,))
+        self._conn.executemany(
+            "INSERT INTO user_groups (user_id, group_name) VALUES (?, ?)",
+            [(user_id, g) for g in self._groups_of(user)],
+        )
+
+    # --- migration ---
+
+    def migrate_from_json(self, json_path: str | Path) -> int:
+        """
+        One-shot import of users.json. Runs only while the store has never
+        been migrated and is empty; returns the number of imported users.
+        """
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'migrated_from_json'"
+            ).fetchone()
+            if done:
+                return 0
+            count = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+            users = {}
+            if count == 0 and os.path.exists(json_path):
+                try:
+                    with open(json_path, "r", encoding="utf-8") as f:
+                        users = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    users = {}
+                if not isinstance(users, dict):
+                    users = {}
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for user_id, user in users.items():
+                    self._write_user(user_id, user)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                    (str(json_path),),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if users:
+            print(f"[Usgromana] Migrated {len(users)} users from {json_path} to SQLite.")
+        return len(users)
+
+    # --- UsersStorage API ---
+
+    def load(self) -> dict | None:
+        with self._lock:
+            version = self._current_data_version()
+            if self._data_version is not None and version == self._data_version:
+                return None
+            self._data_version = version
+            rows = self._conn.execute("SELECT id, data FROM users ORDER BY rowid").fetchall()
+
+        users = {}
+        for user_id, data in rows:
+            try:
+                users[user_id] = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+        return users
+
+    def save_all(self, users: dict) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM user_groups")
+                self._conn.execute("DELETE FROM users")
+                for user_id, user in users.items():
+                    self._write_user(user_id, user)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._data_version = self._current_data_version()
+
+    def save_user(self, users: dict, user_id: str) -> None:
+        user = users.get(user_id)
+        if user is None:
+            self.delete_user(users, user_id)
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_user(user_id, user)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._data_version = self._current_data_version()
+
+    def delete_user(self, users: dict, user_id: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM user_groups WHERE user_id = ?", (user_id,))
+                self._conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._data_version = self._current_data_version()
+
+
+def create_users_storage(backend: str, json_path: str | Path, sqlite_path: str | Path) -> UsersStorage:
+    """Build the configured storage backend ("json" or "sqlite")."""
+    if (backend or "json").lower() == "sqlite":
+        return SqliteUsersStorage(sqlite_path, migrate_from=json_path)
+    return JsonUsersStorage(json_path)
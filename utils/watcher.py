@@ -8,6 +8,26 @@ LOG = logging.getLogger("usgromana.watcher")
 WORKFLOW_DENY_CODE = "WORKFLOW_SAVE_DENIED"
 
 
+def tag_workflow_denial(request: web.Request, resp):
+    """If resp is a 403 on /api/userdata/workflows*, tag it so the UI can react."""
+    # Only care about 403s
+    if not isinstance(resp, web.Response) or resp.status != 403:
+        return resp
+
+    path = request.path or ""
+
+    # Only touch workflow userdata endpoints
+    if path.startswith("/api/userdata/workflows"):
+        resp.headers["X-Usgromana-Error"] = WORKFLOW_DENY_CODE
+        LOG.info(
+            "[Watcher] Tagged workflow save denial: path=%s method=%s",
+            path,
+            request.method,
+        )
+
+    return resp
+
+
 def create_error_watcher_middleware():
     """
     Middleware that:
@@ -18,23 +38,7 @@ def create_error_watcher_middleware():
     @web.middleware
     async def middleware(request: web.Request, handler):
         resp = await handler(request)
-
-        # Only care about 403s
-        if not isinstance(resp, web.Response) or resp.status != 403:
-            return resp
-
-        path = request.path or ""
-
-        # Only touch workflow userdata endpoints
-        if path.startswith("/api/userdata/workflows"):
-            resp.headers["X-Usgromana-Error"] = WORKFLOW_DENY_CODE
-            LOG.info(
-                "[Watcher] Tagged workflow save denial: path=%s method=%s",
-                path,
-                request.method,
-            )
-
-        return resp
+        return tag_workflow_denial(request, resp)
 
     return middleware
 
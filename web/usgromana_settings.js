@@ -1462,6 +1462,14 @@ renderNsfwManagement(container) {
                 Use these tools to scan, fix, or clear NSFW tags from images.
             </p>
 
+            <div class="usgromana-row" style="margin-top:12px; gap:8px; align-items:center; flex-wrap:wrap;">
+                <label class="usgromana-field-label" style="margin:0;">Classifier</label>
+                <span id="usgromana-nsfw-model-state" style="font-size:13px; opacity:0.9;">checking...</span>
+                <button class="usgromana-btn secondary" id="usgromana-nsfw-warmup" disabled>
+                    Load Model
+                </button>
+            </div>
+
             <div class="usgromana-row" style="margin-top:16px; gap:8px; flex-wrap:wrap;">
                 <button class="usgromana-btn" id="usgromana-nsfw-scan-new">
                     Scan New Images
@@ -1472,6 +1480,12 @@ renderNsfwManagement(container) {
                 <button class="usgromana-btn secondary" id="usgromana-nsfw-fix">
                     Fix Incorrect Tags
                 </button>
+                <button class="usgromana-btn secondary" id="usgromana-nsfw-reindex">
+                    Rebuild Tag Index
+                </button>
+                <button class="usgromana-btn secondary" id="usgromana-nsfw-export">
+                    Embed Tags in Images
+                </button>
                 <button class="usgromana-btn danger" id="usgromana-nsfw-clear">
                     Clear All Tags
                 </button>
@@ -1486,8 +1500,10 @@ renderNsfwManagement(container) {
                 <h4 style="margin:0 0 8px 0; font-size:14px;">About NSFW Scanning</h4>
                 <ul style="margin:0; padding-left:20px; font-size:13px; opacity:0.9;">
                     <li><strong>Scan New Images:</strong> Only scans images that don't have NSFW tags yet.</li>
-                    <li><strong>Force Rescan All:</strong> Clears all tags and rescans every image (slow, but thorough).</li>
+                    <li><strong>Force Rescan All:</strong> Rescans every image and overwrites its tag (slow, but thorough).</li>
                     <li><strong>Fix Incorrect Tags:</strong> Removes tags from images incorrectly marked as NSFW.</li>
+                    <li><strong>Rebuild Tag Index:</strong> Re-reads the tags embedded in every image into the lookup index used by /view.</li>
+                    <li><strong>Embed Tags in Images:</strong> Writes tags that only exist in the index (<code>nsfw_tag_store: "index"</code>) into the image files' metadata.</li>
                     <li><strong>Clear All Tags:</strong> Removes all NSFW metadata from images (forces rescan on next access).</li>
                 </ul>
             </div>
@@ -1498,13 +1514,47 @@ renderNsfwManagement(container) {
     const scanAllBtn = container.querySelector("#usgromana-nsfw-scan-all");
     const fixBtn = container.querySelector("#usgromana-nsfw-fix");
     const clearBtn = container.querySelector("#usgromana-nsfw-clear");
+    const reindexBtn = container.querySelector("#usgromana-nsfw-reindex");
+    const exportBtn = container.querySelector("#usgromana-nsfw-export");
     const output = container.querySelector("#usgromana-nsfw-output");
+    const modelState = container.querySelector("#usgromana-nsfw-model-state");
+    const warmupBtn = container.querySelector("#usgromana-nsfw-warmup");
+    let modelPoll = null;
+
+    async function refreshModelStatus() {
+        clearTimeout(modelPoll);
+        if (!container.isConnected) return;
+        try {
+            const res = await api.fetchApi("/usgromana/api/nsfw-model");
+            if (res.status !== 200) {
+                modelState.textContent = `unavailable (HTTP ${res.status})`;
+                return;
+            }
+            const s = await res.json();
+            let text = s.state;
+            if (s.state === "loading" && s.loading_seconds !== undefined) text += ` (${s.loading_seconds}s)`;
+            if (s.state === "ready") text += s.warmed_up ? " (warmed up)" : "";
+            if (s.state === "failed" && s.error) text += `: ${s.error}`;
+            text += ` | untagged images while loading: ${s.loading_policy}`;
+            modelState.textContent = text;
+            warmupBtn.disabled = s.state !== "idle";
+            if (s.state === "loading" || s.warmup_running) {
+                modelPoll = setTimeout(refreshModelStatus, 2000);
+            }
+        } catch (e) {
+            console.error("[usgromana] NSFW model status error:", e);
+            modelState.textContent = "unavailable";
+        }
+    }
 
     async function executeAction(action, params = {}) {
         const btnMap = {
             "scan_all": scanAllBtn,
             "fix_incorrect": fixBtn,
-            "clear_all_tags": clearBtn
+            "clear_all_tags": clearBtn,
+            "rebuild_index": reindexBtn,
+            "export_tags": exportBtn,
+            "warmup_model": warmupBtn
         };
         const btn = btnMap[action] || scanNewBtn;
         
@@ -1553,11 +1603,19 @@ renderNsfwManagement(container) {
     scanNewBtn.onclick = () => executeAction("scan_all", { force_rescan: false });
     scanAllBtn.onclick = () => executeAction("scan_all", { force_rescan: true });
     fixBtn.onclick = () => executeAction("fix_incorrect");
+    reindexBtn.onclick = () => executeAction("rebuild_index");
+    exportBtn.onclick = () => executeAction("export_tags");
+    warmupBtn.onclick = async () => {
+        await executeAction("warmup_model");
+        refreshModelStatus();
+    };
     clearBtn.onclick = () => {
         if (window.confirm("Are you sure you want to clear ALL NSFW tags from all images? This cannot be undone.")) {
             executeAction("clear_all_tags");
         }
     };
+
+    refreshModelStatus();
 }
 
     renderPerms(container) {
@@ -1621,6 +1679,16 @@ renderNsfwManagement(container) {
             return row + `</tr>`;
         };
 
+        // Numeric rows (requests per minute, 0 / empty = unlimited)
+        const drawLimitRow = (label, id) => {
+            let row = `<tr><td>${label}</td>`;
+            GROUPS.forEach(g => {
+                const val = Number(groupsConfig[g]?.[id]) || 0;
+                row += `<td class="usgromana-check-cell"><input type="number" min="0" step="1" style="width:60px" class="perm-num" data-group="${g}" data-key="${id}" value="${val}"></td>`;
+            });
+            return row + `</tr>`;
+        };
+
         // Section 1: Backend Security
         html += drawRow("Core API Permissions", null, true);
         html += drawRow("Access ComfyUI-Manager", "can_access_manager");
@@ -1631,6 +1699,19 @@ renderNsfwManagement(container) {
         html += drawRow("SettingsExtension", "settings_extension");
         html += drawRow("See Restricted Settings", "can_see_restricted_settings");
 
+        // Section 1b: Rate Limits
+        html += drawRow("Rate Limits (requests / minute, 0 = unlimited)", null, true);
+        [
+            ["Queue Prompts", "prompt"],
+            ["View Images", "view"],
+            ["Upload Files", "upload"],
+            ["User Data (Workflows)", "userdata"],
+            ["NSFW Actions", "nsfw"],
+        ].forEach(([label, cat]) => {
+            html += drawLimitRow(`${label}: per user`, `rate_limit_${cat}`);
+            html += drawLimitRow(`${label}: whole group`, `group_rate_limit_${cat}`);
+        });
+
         // Section 2: Global UI
         html += drawRow("Interface Elements", null, true);
         html += drawRow("Allow Workflow Breadcrumb", "ui_workflow_breadcrumb");
@@ -1690,6 +1771,21 @@ renderNsfwManagement(container) {
                 updateEnforcementStyles();
             };
         });
+
+        // Bind Rate Limit Inputs
+        container.querySelectorAll(".perm-num").forEach(inp => {
+            inp.onchange = async () => {
+                const g = inp.dataset.group;
+                const k = inp.dataset.key;
+                const v = Math.max(0, parseInt(inp.value, 10) || 0);
+                inp.value = v;
+
+                if(!groupsConfig[g]) groupsConfig[g] = {};
+                groupsConfig[g][k] = v;
+
+                await api.fetchApi("/usgromana/api/groups", { method: "PUT", body: JSON.stringify({ groups: { [g]: { [k]: v } } }) });
+            };
+        });
     }
 }
 